@@ -0,0 +1,303 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+"""
+import copy
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from AeroMix.AeroMix_main import (validate_input, _layersettings,
+                                  _profilefactor, _componentsum, unit_dict,
+                                  n_layers)
+from AeroMix.HumidityTensor import _humidityoptics, _humiditytensor
+from AeroMix.AeroMix_exceptions import (InputError, RelativeHumidityError,
+                                        ComponentError, ComponentDataError)
+
+# Function to collect optical arrays and mean particle volume and mass for
+# each layer. Layers with the same relative humidity share the arrays.
+# Relative humidities between the levels of the component files are
+# interpolated.
+
+
+def _layeroptics(var, RH_list):
+    loaded = {RH: _humidityoptics(var, RH) for RH in set(RH_list)}
+    optarray = np.stack([loaded[RH][0] for RH in RH_list])
+    available = np.stack([loaded[RH][1] for RH in RH_list])
+    mean_vol = np.stack([loaded[RH][2] for RH in RH_list])
+    mean_mass = np.stack([loaded[RH][3] for RH in RH_list])
+    return optarray, available, mean_vol, mean_mass
+
+
+def run_batch(input_dict, concentrations, relative_humidity=None):
+    """
+    Calculate the optical and physical properties of many aerosol mixtures
+    sharing the same wavelengths and vertical profiles.
+
+    Parameters
+    ----------
+    input_dict : A dictionary containing the input parameters for the AeroMix,
+        in the same format as for AeroMix.run. The component concentrations of
+        the layers in the dictionary are ignored.
+    concentrations : Array of shape (scenarios x 6 x components) holding the
+        number or mass concentrations (see input_dict['Input unit']) of the
+        components in each layer. Component n is stored at index n-1 of the
+        last axis. Concentrations should be finite and not negative.
+    relative_humidity : Optional array of shape (scenarios x 6) holding the
+        relative humidity (%) of each layer of each scenario, between 0 and
+        99. The RH brackets of all scenarios are found in one array
+        operation and the component data of the two bracketing levels are
+        added one component at a time, so the memory used grows with
+        scenarios x wavelengths and not with the number of components. The
+        default is None, which uses the relative humidities of
+        the layers in input_dict for all scenarios.
+
+    Returns
+    -------
+    Dictionary of output arrays. 'Number concentration', 'Mass concentration'
+    and 'Volume concentration' have the shape (scenarios x 6 x components).
+    'Extinction coefficient', 'Scattering coefficient',
+    'Absorption coefficient', 'SSA', 'g' and 'AOD' have the shape
+    (scenarios x 6 x wavelengths) and 'Total column AOD' has the shape
+    (scenarios x wavelengths). 'Relative humidity' has the shape (6) or, if
+    relative_humidity is given, (scenarios x 6). Results for layers with zero
+    thickness are set to NaN, as in AeroMix.run.
+
+    """
+    var = copy.deepcopy(input_dict)
+    validate_input(var)
+    conc = np.asarray(concentrations, dtype=float)
+    C = var['Maximum number of components']
+    if conc.ndim != 3 or conc.shape[1:] != (n_layers, C):
+        raise InputError("Concentration array should be of shape "
+                         "(scenarios, "+str(n_layers)+", "+str(C)+")")
+    if not np.all(np.isfinite(conc)) or np.any(conc < 0):
+        raise ComponentError("Concentrations should be finite and not "
+                             "negative")
+    RH_list, profile_type, profile_params = _layersettings(var)
+    thin = np.array([profile_params[k][1]-profile_params[k][0] == 0
+                     for k in range(n_layers)])
+    if relative_humidity is None:
+        optarray, available, mean_vol, mean_mass = _layeroptics(var, RH_list)
+        # Conversion of mass concentration to number concentration
+        if var['Input unit'] == 1:
+            inv_mass = np.divide(1.0, mean_mass,
+                                 out=np.zeros_like(mean_mass),
+                                 where=mean_mass != 0)
+            NumDens = conc*inv_mass
+        else:
+            NumDens = conc
+        if np.any((NumDens != 0) & ~available & ~thin[:, np.newaxis]):
+            raise ComponentDataError("Component file not found for a "
+                                     "component with non-zero concentration")
+        # Mixing of component optical properties
+        subscripts = 'slc,lcw->slw'
+        ext = np.einsum(subscripts, NumDens, optarray[..., 0])
+        sca = np.einsum(subscripts, NumDens, optarray[..., 1])
+        absc = np.einsum(subscripts, NumDens, optarray[..., 2])
+        ssa_num = np.einsum(subscripts, NumDens,
+                            optarray[..., 0]*optarray[..., 3])
+        g_num = np.einsum(subscripts, NumDens,
+                          optarray[..., 1]*optarray[..., 4])
+    else:
+        RH_list = np.asarray(relative_humidity, dtype=float)
+        if RH_list.shape != (conc.shape[0], n_layers):
+            raise RelativeHumidityError("Relative humidity array should be of "
+                                        "shape (scenarios, "+str(n_layers)+")")
+        # Only the RH brackets are interpolated for all scenarios, the
+        # component data are added one component at a time
+        NumDens, mean_vol, mean_mass, sums = _humiditytensor(var)._mixsums(
+            conc, RH_list, var['Input unit'],
+            np.broadcast_to(~thin, RH_list.shape))
+        ext, sca, absc, ssa_num, g_num = sums
+    mass_calc = NumDens*mean_mass
+    vol_calc = NumDens*mean_vol
+
+    empty = (NumDens.sum(axis=2) == 0)[..., np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ssa = np.where(empty, np.nan, ssa_num/ext)
+        g = np.where(empty, np.nan, g_num/sca)
+    ext = np.where(empty, np.nan, ext)
+    sca = np.where(empty, np.nan, sca)
+    absc = np.where(empty, np.nan, absc)
+
+    factor = np.array([_profilefactor(profile_type[k], profile_params[k])
+                       for k in range(n_layers)])
+    AOD = ext*factor[np.newaxis, :, np.newaxis]
+
+    # Layers with zero thickness
+    NumDens = np.where(thin[np.newaxis, :, np.newaxis], np.nan, NumDens)
+    mass_calc = np.where(thin[np.newaxis, :, np.newaxis], np.nan, mass_calc)
+    vol_calc = np.where(thin[np.newaxis, :, np.newaxis], np.nan, vol_calc)
+    ext, sca, absc, ssa, g, AOD = [
+        np.where(thin[np.newaxis, :, np.newaxis], np.nan, array)
+        for array in (ext, sca, absc, ssa, g, AOD)]
+    TotalAOD = np.nansum(AOD, axis=1)
+
+    output = {'AeroMix version': '1.0.1',
+              'Wavelengths': np.array(var['Wavelengths'], dtype=float),
+              'Relative humidity': np.array(RH_list),
+              'Number concentration': NumDens,
+              'Mass concentration': mass_calc,
+              'Volume concentration': vol_calc,
+              'Extinction coefficient': ext,
+              'Scattering coefficient': sca,
+              'Absorption coefficient': absc,
+              'SSA': ssa, 'g': g, 'AOD': AOD,
+              'Total column AOD': TotalAOD,
+              'Units': dict(unit_dict)}
+    return output
+
+# Function to group input dictionaries into run_batch calls. Dictionaries
+# differing only in the relative humidities and concentrations of the layers
+# are evaluated together.
+
+
+def _groupkey(var):
+    layer_keys = ['Layer'+str(k)+' '+name for k in range(1, n_layers+1)
+                  for name in ('relative humidity', 'component concentration')]
+    return repr([(key, value) for key, value in var.items()
+                 if key not in layer_keys])
+
+
+def _batchgroups(inputs):
+    groups = {}
+    for i, var in enumerate(inputs):
+        groups.setdefault(_groupkey(var), []).append(i)
+    return list(groups.values())
+
+# Function to run the input dictionaries of one group in one run_batch call,
+# with the concentrations and relative humidities of each dictionary
+
+
+def _rungroup(inputs, members):
+    var = inputs[members[0]]
+    C = var['Maximum number of components']
+    conc = [[[inputs[i]['Layer'+str(k)+' component concentration'][c]
+              for c in range(1, C+1)] for k in range(1, n_layers+1)]
+            for i in members]
+    RH = [[inputs[i]['Layer'+str(k)+' relative humidity']
+           for k in range(1, n_layers+1)] for i in members]
+    return run_batch(var, conc, RH)
+
+# Function to convert an array to lists with None for NaN, e.g. for JSON
+
+
+def _jsonvalue(array):
+    array = np.asarray(array, dtype=float)
+    return np.where(np.isnan(array), None, array).tolist()
+
+
+# Output arrays of run_batch kept for each scenario, of shape
+# (6 x components) or (6 x wavelengths), and the mixing ratios calculated
+# from them
+scenario_fields = ['Number concentration', 'Mass concentration',
+                   'Volume concentration', 'Extinction coefficient',
+                   'Scattering coefficient', 'Absorption coefficient', 'SSA',
+                   'g', 'AOD']
+_ratio_fields = {'Number mixing ratio': 'Number concentration',
+                 'Mass mixing ratio': 'Mass concentration',
+                 'Volume mixing ratio': 'Volume concentration'}
+
+# Function to return the output arrays of scenario s of a run_batch output,
+# with the mixing ratios and the total column AOD, as used by AeroMixResult
+
+
+def _scenarioarrays(output, s):
+    arrays = {field: output[field][s] for field in scenario_fields}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total = _componentsum(output['Number concentration'][s])
+        for ratio, field in _ratio_fields.items():
+            array = output[field][s]
+            arrays[ratio] = np.where((total != 0)[:, np.newaxis],
+                                     array/_componentsum(array)[:, np.newaxis],
+                                     0.0)
+    arrays['Total column AOD'] = output['Total column AOD'][s]
+    return arrays
+
+# Function to run the input dictionaries of one group, splitting the group
+# in halves when it fails, so that an error is recorded only for the
+# dictionaries causing it while the others are still evaluated together.
+# Returns the output arrays of each dictionary or the exception raised.
+
+
+def _rungroupisolated(inputs, members):
+    try:
+        output = _rungroup(inputs, members)
+    except Exception as error:
+        if len(members) == 1:
+            return [error]
+        half = len(members)//2
+        return _rungroupisolated(inputs, members[:half]) + \
+            _rungroupisolated(inputs, members[half:])
+    return [_scenarioarrays(output, s) for s in range(len(members))]
+
+# Function to validate and evaluate input dictionaries in run_batch calls.
+# Returns the output arrays of each dictionary or the exception raised for
+# it.
+
+
+def _evaluatescenarios(inputs):
+    results = [None]*len(inputs)
+    valid = []
+    for i, var in enumerate(inputs):
+        try:
+            validate_input(var)
+        except Exception as error:
+            results[i] = error
+        else:
+            valid.append(i)
+    for members in _batchgroups([inputs[i] for i in valid]):
+        members = [valid[m] for m in members]
+        for i, result in zip(members, _rungroupisolated(inputs, members)):
+            results[i] = result
+    return results
+
+
+def run_scenarios(inputs, workers=None, executor=None, chunk_size=256):
+    """
+    Run AeroMix for many input dictionaries, recording the error of each
+    invalid dictionary instead of stopping.
+
+    The dictionaries are validated with validate_input before any
+    calculation and evaluated in chunks, each in run_batch calls for the
+    dictionaries sharing the same wavelengths, component settings and
+    vertical profiles. A run_batch call that fails is split until the
+    dictionaries causing the error are found, so the remaining dictionaries
+    are still evaluated together.
+
+    Parameters
+    ----------
+    inputs : List of input dictionaries for the AeroMix, in the same format
+        as for AeroMix.run.
+    workers : Number of worker processes evaluating the chunks in parallel.
+        The default is None, which runs serially.
+    executor : Executor (concurrent.futures.Executor) evaluating the chunks
+        instead of a new process pool. Takes precedence over workers. The
+        default is None.
+    chunk_size : Number of dictionaries evaluated together. The default is
+        256.
+
+    Returns
+    -------
+    List with, for each input dictionary, an AeroMixResult as returned by
+    AeroMix.run, or the exception raised for the dictionary, e.g. an
+    AeroMix.InputError for an invalid input.
+
+    """
+    from AeroMix.AeroMix_result import AeroMixResult
+    inputs = list(inputs)
+    chunks = [inputs[i:i+chunk_size] for i in range(0, len(inputs),
+                                                    chunk_size)]
+    if executor is not None:
+        outputs = list(executor.map(_evaluatescenarios, chunks))
+    elif workers is not None and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(_evaluatescenarios, chunks))
+    else:
+        outputs = map(_evaluatescenarios, chunks)
+    results = []
+    for chunk, output in zip(chunks, outputs):
+        for var, arrays in zip(chunk, output):
+            results.append(arrays if isinstance(arrays, BaseException) else
+                           AeroMixResult(var, arrays=arrays))
+    return results
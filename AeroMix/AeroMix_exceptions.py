@@ -0,0 +1,54 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+
+Exceptions raised by AeroMix. All derive from AeroMixError, and errors of
+the inputs also from ValueError, e.g.
+
+    try:
+        output = AeroMix.run(input_dict)
+    except AeroMix.RelativeHumidityError as error:
+        print(error.key, error)
+"""
+
+
+class AeroMixError(Exception):
+    """
+    Base class of the errors raised by AeroMix.
+
+    Parameters
+    ----------
+    message : Description of the error.
+    key : Optional key of the input dictionary, or name of the argument,
+        that caused the error. The default is None.
+
+    """
+
+    def __init__(self, message, key=None):
+        super().__init__(message)
+        self.key = key
+
+
+class InputError(AeroMixError, ValueError):
+    """Invalid input dictionary or argument."""
+
+
+class WavelengthError(InputError):
+    """Wavelength outside the range of the component data."""
+
+
+class RelativeHumidityError(InputError):
+    """Relative humidity outside the range of the component data."""
+
+
+class ComponentError(InputError):
+    """Invalid number of components or component concentrations."""
+
+
+class ProfileError(InputError):
+    """Invalid profile type or profile params of a layer."""
+
+
+class ComponentDataError(AeroMixError, FileNotFoundError):
+    """Component file, directory or library not found or not readable."""
@@ -0,0 +1,382 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+"""
+
+import os
+import json
+import struct
+import numpy as np
+from AeroMix.AeroMix_main import layer_outputs, unit_dict
+from AeroMix.AeroMix_grid import grid_files
+from AeroMix.AeroMix_result import AeroMixResult, _component_outputs
+from AeroMix.AeroMix_exceptions import InputError
+
+# Output fields that can be exported and the files of the fields in a store
+# directory
+export_fields = ['Relative humidity']+layer_outputs+['Total column AOD']
+export_files = dict(grid_files, **{
+    'Relative humidity': 'rh.npy',
+    'Number concentration': 'number_conc.npy',
+    'Mass concentration': 'mass_conc.npy',
+    'Volume concentration': 'volume_conc.npy',
+    'Number mixing ratio': 'number_ratio.npy',
+    'Mass mixing ratio': 'mass_ratio.npy',
+    'Volume mixing ratio': 'volume_ratio.npy'})
+metadata_file = 'metadata.json'
+id_file = 'id.jsonl'
+
+# Length of the headers of the .npy files of a store, leaving room for the
+# number of scenarios to grow as results are appended
+_header_length = 128
+
+# Function to return the dimensions of a field
+
+
+def _dimensions(field):
+    if field == 'Total column AOD':
+        return ['scenario', 'wavelength']
+    if field == 'Relative humidity':
+        return ['scenario', 'layer']
+    if field in _component_outputs:
+        return ['scenario', 'layer', 'component']
+    return ['scenario', 'layer', 'wavelength']
+
+# Function to collect the output arrays of a result of run, run_layers or
+# run_batch (or a dictionary of such arrays) with the scenarios along the
+# first axis, and the coordinates of their dimensions
+
+
+def _resultarrays(output, fields):
+    value = output.array if isinstance(output, AeroMixResult) else \
+        output.__getitem__
+    if fields is None:
+        fields = [field for field in export_fields
+                  if isinstance(output, AeroMixResult) or field in output]
+    for field in fields:
+        if field not in export_fields:
+            raise InputError("Unknown output field "+field)
+    if not isinstance(output, AeroMixResult):
+        for field in list(fields)+['Wavelengths']:
+            if field not in output:
+                raise InputError("Output field "+field+" is missing from "
+                                 "the results")
+    # Results of a single scenario have no scenario axis. The relative
+    # humidities of run_batch have one if given for each scenario.
+    field = ([field for field in fields if field != 'Relative humidity'] +
+             list(fields))[0]
+    single = np.ndim(value(field)) < len(_dimensions(field))
+    S = 1 if single else len(value(field))
+    wavelengths = np.asarray(value('Wavelengths'), dtype=float)
+    arrays = {}
+    for field in fields:
+        array = np.asarray(value(field), dtype=float)
+        if single:
+            array = array[np.newaxis]
+        elif field == 'Relative humidity' and array.ndim == 1:
+            # Relative humidities of the layers shared by all scenarios
+            array = np.broadcast_to(array, (S,)+array.shape)
+        arrays[field] = array
+    coordinates = {'wavelength': wavelengths.tolist()}
+    for field, array in arrays.items():
+        if array.shape[0] != S:
+            raise InputError("Output fields should have the same number of "
+                             "scenarios")
+        dims = _dimensions(field)
+        if 'layer' in dims:
+            coordinates['layer'] = list(range(1, array.shape[1]+1))
+        if 'component' in dims:
+            coordinates['component'] = list(range(1, array.shape[2]+1))
+    return arrays, coordinates
+
+# Function to return the metadata of a store of the given fields
+
+
+def _metadata(arrays, coordinates, dtype):
+    return {'AeroMix version': '1.0.1', 'Number of scenarios': 0,
+            'dtype': np.dtype(dtype).str, 'Coordinates': coordinates,
+            'Variables': {field: {'file': export_files[field],
+                                  'dimensions': _dimensions(field),
+                                  'units': unit_dict.get(field, '')}
+                          for field in arrays}}
+
+# Function to check that appended results match the metadata of a store
+
+
+def _checkresults(metadata, arrays, coordinates):
+    if list(arrays) != list(metadata['Variables']) or \
+            coordinates != metadata['Coordinates']:
+        raise InputError("Appended results should have the same fields, "
+                         "wavelengths, layers and components as the stored "
+                         "results")
+
+# Function to write the header of a .npy file of a store, padded to
+# _header_length bytes
+
+
+def _writeheader(stream, dtype, shape):
+    header = repr({'descr': np.lib.format.dtype_to_descr(dtype),
+                   'fortran_order': False, 'shape': tuple(shape)})
+    header = header.ljust(_header_length-11)+'\n'
+    stream.seek(0)
+    stream.write(np.lib.format.magic(1, 0)+struct.pack('<H', len(header)) +
+                 header.encode('latin1'))
+
+# Function to label the values of a field of one scenario as in the CSV
+# output of the command line interface, e.g. 'SSA L1 0.55' for the SSA of
+# layer 1 at 0.55 µm
+
+
+def _columnlabels(field, coordinates):
+    dims = _dimensions(field)[1:]
+    if dims == ['wavelength']:
+        return [field+' '+str(w) for w in coordinates['wavelength']]
+    if dims == ['layer']:
+        return [field+' L'+str(k) for k in coordinates['layer']]
+    return [field+' L'+str(k)+' '+str(label) for k in coordinates['layer']
+            for label in coordinates[dims[1]]]
+
+# Function to import pyarrow for Parquet files
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet files need the pyarrow package")
+    return pyarrow
+
+
+class ResultWriter:
+    """
+    Columnar store of AeroMix results to which results are appended in
+    chunks, so that long sweeps are written to disk as they are calculated.
+
+    A store is a directory with one .npy file per output field, holding the
+    values of all scenarios along the first axis, a metadata.json file with
+    the dimensions (scenario, layer, component, wavelength), their
+    coordinates and the units of the fields, and an id.jsonl file with the id
+    of each scenario. Appending writes the new values at the end of the
+    files. The files can be memory-mapped by load_results or numpy.load.
+    Paths ending with .parquet are written as one Parquet table instead,
+    with one column per value as in the CSV output of the command line
+    interface and one row group per append. This needs the pyarrow package.
+
+    Parameters
+    ----------
+    path : Directory of the store, created if it does not exist, or a
+        .parquet file. Results are appended to an existing store, while an
+        existing Parquet file is replaced.
+    fields : List of the output fields written, from export_fields. The
+        default is None, which writes all fields of the first results.
+    dtype : Data type of the stored values, e.g. np.float32 to halve the
+        size of the files. The default is np.float64.
+
+    """
+
+    def __init__(self, path, fields=None, dtype=np.float64):
+        self.path = os.path.abspath(path)
+        self.fields = None if fields is None else list(fields)
+        self.dtype = np.dtype(dtype)
+        self.metadata = None
+        self._parquet = self.path.endswith('.parquet')
+        self._table_writer = None
+        metadata_path = os.path.join(self.path, metadata_file)
+        if not self._parquet and os.path.exists(metadata_path):
+            with open(metadata_path, 'r') as f:
+                self.metadata = json.load(f)
+            self.fields = list(self.metadata['Variables'])
+            self.dtype = np.dtype(self.metadata['dtype'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def append(self, output, ids=None):
+        """
+        Append results to the store.
+
+        Parameters
+        ----------
+        output : Output of AeroMix.run, AeroMix.run_layers or
+            AeroMix.run_batch, or a dictionary of output arrays with the
+            scenarios along the first axis and 'Wavelengths'.
+        ids : Optional list of one JSON value per scenario identifying the
+            scenarios. The default is None.
+
+        """
+        arrays, coordinates = _resultarrays(output, self.fields)
+        S = len(next(iter(arrays.values())))
+        if S == 0:
+            return
+        ids = [None]*S if ids is None else list(ids)
+        if len(ids) != S:
+            raise InputError("One id per scenario is needed")
+        if self.metadata is None:
+            self.fields = list(arrays)
+            self.metadata = _metadata(arrays, coordinates, self.dtype)
+        _checkresults(self.metadata, arrays, coordinates)
+        if self._parquet:
+            self._appendparquet(arrays, ids)
+        else:
+            self._appendnpy(arrays, ids)
+        self.metadata['Number of scenarios'] += S
+
+    def _appendnpy(self, arrays, ids):
+        os.makedirs(self.path, exist_ok=True)
+        count = self.metadata['Number of scenarios']
+        for field, array in arrays.items():
+            values = np.ascontiguousarray(array, dtype=self.dtype)
+            path = os.path.join(self.path, export_files[field])
+            row = int(np.prod(values.shape[1:]))*self.dtype.itemsize
+            with open(path, 'r+b' if os.path.exists(path) else 'w+b') as f:
+                # Values beyond the stored scenarios, e.g. of an append that
+                # did not finish, are overwritten
+                f.seek(_header_length+count*row)
+                f.write(values.tobytes())
+                f.truncate()
+                _writeheader(f, self.dtype,
+                             (count+len(values),)+values.shape[1:])
+        path = os.path.join(self.path, id_file)
+        lines = []
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                lines = f.readlines()[:count]
+        lines += [json.dumps(ident)+'\n' for ident in ids]
+        with open(path, 'w') as f:
+            f.writelines(lines)
+        # The metadata are written last, so that the stored scenarios are
+        # complete
+        metadata = dict(self.metadata)
+        metadata['Number of scenarios'] = count+len(ids)
+        temporary = os.path.join(self.path, metadata_file+'.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(metadata, f, indent=1, ensure_ascii=False)
+        os.replace(temporary, os.path.join(self.path, metadata_file))
+
+    def _appendparquet(self, arrays, ids):
+        pyarrow = _pyarrow()
+        coordinates = self.metadata['Coordinates']
+        columns = {'id': pyarrow.array([json.dumps(ident) for ident in ids])}
+        for field, array in arrays.items():
+            values = np.asarray(array, dtype=self.dtype).reshape(len(ids), -1)
+            for label, column in zip(_columnlabels(field, coordinates),
+                                     values.T):
+                columns[label] = pyarrow.array(column)
+        table = pyarrow.table(columns)
+        if self._table_writer is None:
+            metadata = {key: value for key, value in self.metadata.items()
+                        if key != 'Number of scenarios'}
+            schema = table.schema.with_metadata(
+                {'AeroMix': json.dumps(metadata, ensure_ascii=False)})
+            self._table_writer = pyarrow.parquet.ParquetWriter(self.path,
+                                                               schema)
+        self._table_writer.write_table(table.cast(self._table_writer.schema))
+
+    def close(self):
+        """Close the Parquet file of the store."""
+        if self._table_writer is not None:
+            self._table_writer.close()
+            self._table_writer = None
+
+
+def save_results(path, output, fields=None, ids=None, dtype=np.float64):
+    """
+    Save results as typed columnar arrays.
+
+    Parameters
+    ----------
+    path : Location of the results. Paths ending with .npz are written as one
+        NumPy archive with one array per field and the metadata, paths ending
+        with .parquet as a Parquet table (see ResultWriter) and other paths as
+        a store directory (see ResultWriter), to which the results are
+        appended if it exists.
+    output : Output of AeroMix.run, AeroMix.run_layers or AeroMix.run_batch.
+    fields : List of the output fields saved, from export_fields. The default
+        is None, which saves all fields of the output.
+    ids : Optional list of one JSON value per scenario identifying the
+        scenarios. The default is None.
+    dtype : Data type of the saved values. The default is np.float64.
+
+    """
+    if not str(path).endswith('.npz'):
+        with ResultWriter(path, fields, dtype) as writer:
+            writer.append(output, ids)
+        return
+    arrays, coordinates = _resultarrays(output, fields)
+    metadata = _metadata(arrays, coordinates, dtype)
+    S = len(next(iter(arrays.values())))
+    metadata['Number of scenarios'] = S
+    ids = [None]*S if ids is None else list(ids)
+    np.savez(path, metadata=np.array(json.dumps(metadata,
+                                                ensure_ascii=False)),
+             id=np.array([json.dumps(ident) for ident in ids]),
+             **{field: np.asarray(array, dtype=dtype)
+                for field, array in arrays.items()})
+
+
+def load_results(path, mmap=True):
+    """
+    Load results saved by ResultWriter or save_results.
+
+    Parameters
+    ----------
+    path : Location of the results, a store directory, a .npz file or a
+        .parquet file.
+    mmap : Whether the arrays of a store directory are memory-mapped, so
+        that only the values used are read from disk. The default is True.
+
+    Returns
+    -------
+    Dictionary with 'Number of scenarios', 'Wavelengths', 'Layers' and
+    'Components' (the coordinates of the dimensions), 'id', a list of the id
+    of each scenario, the output fields with the scenarios along the first
+    axis, e.g. 'AOD' of shape (scenarios x layers x wavelengths), 'Units' and
+    'Dimensions', holding the units and the dimensions of each field.
+
+    """
+    path = os.fspath(path)
+    if path.endswith('.parquet'):
+        pyarrow = _pyarrow()
+        table = pyarrow.parquet.read_table(path, memory_map=True)
+        metadata = json.loads(table.schema.metadata[b'AeroMix'])
+        ids = table.column('id').to_pylist()
+        arrays = {}
+        for field in metadata['Variables']:
+            labels = _columnlabels(field, metadata['Coordinates'])
+            values = np.column_stack([table.column(label).to_numpy()
+                                      for label in labels])
+            arrays[field] = values.reshape((len(ids),)+tuple(
+                len(metadata['Coordinates'][dim])
+                for dim in _dimensions(field)[1:]))
+    elif path.endswith('.npz'):
+        with np.load(path) as data:
+            metadata = json.loads(str(data['metadata']))
+            ids = data['id'].tolist()
+            arrays = {field: data[field] for field in metadata['Variables']}
+    else:
+        with open(os.path.join(path, metadata_file), 'r') as f:
+            metadata = json.load(f)
+        S = metadata['Number of scenarios']
+        with open(os.path.join(path, id_file), 'r') as f:
+            ids = [line for line, _ in zip(f, range(S))]
+        arrays = {field: np.load(os.path.join(path, variable['file']),
+                                 mmap_mode='r' if mmap else None)[:S]
+                  for field, variable in metadata['Variables'].items()}
+    coordinates = metadata['Coordinates']
+    output = {'AeroMix version': metadata['AeroMix version'],
+              'Number of scenarios': len(ids),
+              'Wavelengths': np.array(coordinates['wavelength'], dtype=float),
+              'Layers': coordinates.get('layer'),
+              'Components': coordinates.get('component'),
+              'id': [json.loads(ident) for ident in ids]}
+    output.update(arrays)
+    output['Units'] = {field: variable['units'] for field, variable
+                       in metadata['Variables'].items()}
+    output['Dimensions'] = {field: variable['dimensions'] for field, variable
+                            in metadata['Variables'].items()}
+    return output
@@ -0,0 +1,188 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+"""
+
+import os
+import numpy as np
+from AeroMix.AeroMix_main import _ValidateSettings, rh_levels
+from AeroMix.HumidityTensor import _humiditytensor
+from AeroMix.AeroMix_exceptions import (InputError, RelativeHumidityError,
+                                        ComponentError)
+
+# File names of the output fields written by run_grid
+grid_files = {'Extinction coefficient': 'ext.npy',
+              'Scattering coefficient': 'sca.npy',
+              'Absorption coefficient': 'abs.npy',
+              'SSA': 'ssa.npy', 'g': 'g.npy', 'AOD': 'aod.npy',
+              'Total column AOD': 'column_aod.npy'}
+
+# Function to open an input field. Paths to .npy files are memory-mapped.
+
+
+def _gridinput(field):
+    if isinstance(field, (str, os.PathLike)):
+        return np.load(field, mmap_mode='r')
+    return np.asarray(field)
+
+# Function to return the values of a grid field for the grid cells start to
+# stop (in C order). Scalars are repeated.
+
+
+def _gridchunk(field, start, stop):
+    if field.ndim == 0:
+        return np.full(stop-start, float(field))
+    return np.asarray(field.reshape(-1)[start:stop], dtype=float)
+
+# Function to return the index of the first grid cell of the chunk starting
+# at cell start whose values are not all valid, or None. valid has one row
+# per grid cell of the chunk.
+
+
+def _invalidcell(valid, start, grid):
+    invalid = ~valid.reshape(len(valid), -1).all(axis=1)
+    if not np.any(invalid):
+        return None
+    return tuple(int(i) for i in np.unravel_index(
+        start+int(np.argmax(invalid)), grid))
+
+# Function to allocate an output field, in memory or as a memory-mapped .npy
+# file in output_dir
+
+
+def _gridoutput(output_dir, name, shape, dtype):
+    if output_dir is None:
+        return np.full(shape, np.nan, dtype=dtype)
+    return np.lib.format.open_memmap(
+        os.path.join(output_dir, grid_files[name]), mode='w+', dtype=dtype,
+        shape=shape)
+
+
+def run_grid(input_dict, concentrations, relative_humidity, thickness=None,
+             output_dir=None, chunk_size=65536, dtype=np.float64):
+    """
+    Calculate the optical properties of gridded aerosol fields, e.g. the
+    lat x lon x level output of a chemistry-transport model, in chunks of
+    bounded size.
+
+    The inputs are read and the outputs are written one chunk of grid cells
+    at a time, so the memory used is set by chunk_size and not by the size
+    of the grid when the inputs are memory-mapped and output_dir is given.
+
+    Parameters
+    ----------
+    input_dict : A dictionary containing the input parameters for the AeroMix,
+        in the same format as for AeroMix.run. Only the wavelengths, the
+        input unit, the maximum number of components, the component file
+        directory and the maximum radius are used.
+    concentrations : Array of shape (grid shape x components), or the path
+        to such an array saved with numpy.save, holding the number or mass
+        concentrations (see input_dict['Input unit']) of the components in
+        each grid cell. Component n is stored at index n-1 of the last axis.
+        Files are memory-mapped.
+    relative_humidity : Array of the grid shape, the path to such an array
+        or a single value, holding the relative humidity (%) of each grid
+        cell, between 0 and 99.
+    thickness : Array of the grid shape, the path to such an array or a
+        single value, holding the thickness (km) of each grid cell. When
+        given, the AOD of each cell and, for grids with two or more axes, the
+        total column AOD summed over the last grid axis (the levels) are
+        calculated. The default is None.
+    output_dir : Directory in which the output fields are created as
+        memory-mapped .npy files (see grid_files). The default is None, which
+        returns arrays in memory.
+    chunk_size : Number of grid cells evaluated at a time. With thickness
+        given, chunks hold whole columns. The default is 65536.
+    dtype : Data type of the output fields. The default is numpy.float64.
+
+    Returns
+    -------
+    Dictionary of output fields. 'Extinction coefficient',
+    'Scattering coefficient', 'Absorption coefficient', 'SSA', 'g' and 'AOD'
+    have the shape (grid shape x wavelengths) and 'Total column AOD' has the
+    shape (grid shape without the last axis x wavelengths). Cells without
+    aerosol are NaN, as in AeroMix.run.
+
+    Raises
+    ------
+    ComponentError, RelativeHumidityError or InputError naming the index of
+    the first grid cell with concentrations or a thickness that are not
+    finite and not negative, or a relative humidity outside 0-99. Each chunk
+    is checked before it is evaluated, so the cells of earlier chunks may
+    already be written.
+
+    """
+    var = input_dict
+    _ValidateSettings(var)
+    conc = _gridinput(concentrations)
+    RH = _gridinput(relative_humidity)
+    C = var['Maximum number of components']
+    if conc.ndim < 2 or conc.shape[-1] != C:
+        raise InputError("Concentration array should be of shape (grid "
+                         "shape, "+str(C)+")")
+    grid = conc.shape[:-1]
+    fields = {'Relative humidity': RH}
+    if thickness is not None:
+        fields['Thickness'] = _gridinput(thickness)
+    for name, field in fields.items():
+        if field.ndim != 0 and field.shape != grid:
+            raise InputError(name+" should be a single value or an array "
+                             "of shape "+str(grid))
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    W = len(var['Wavelengths'])
+    names = ['Extinction coefficient', 'Scattering coefficient',
+             'Absorption coefficient', 'SSA', 'g']
+    column = thickness is not None and len(grid) >= 2
+    if thickness is not None:
+        names.append('AOD')
+    output = {name: _gridoutput(output_dir, name, grid+(W,), dtype)
+              for name in names}
+    if column:
+        output['Total column AOD'] = _gridoutput(
+            output_dir, 'Total column AOD', grid[:-1]+(W,), dtype)
+    flat = {name: field.reshape(-1, W) for name, field in output.items()}
+
+    # Chunks of whole columns when the column AOD is summed
+    levels = grid[-1] if column else 1
+    step = max(1, chunk_size//levels)*levels
+    cells = int(np.prod(grid))
+    conc_flat = conc.reshape(-1, C)
+    tensor = _humiditytensor(var)
+    for start in range(0, cells, step):
+        stop = min(start+step, cells)
+        conc_chunk = np.asarray(conc_flat[start:stop], dtype=float)
+        cell = _invalidcell(np.isfinite(conc_chunk) & (conc_chunk >= 0),
+                            start, grid)
+        if cell is not None:
+            raise ComponentError("Concentrations of grid cell "+str(cell) +
+                                 " should be finite and not negative",
+                                 'concentrations')
+        RH_chunk = _gridchunk(RH, start, stop)
+        cell = _invalidcell((RH_chunk >= rh_levels[0]) &
+                            (RH_chunk <= rh_levels[-1]), start, grid)
+        if cell is not None:
+            raise RelativeHumidityError("Invalid relative humidity value of "
+                                        "grid cell "+str(cell),
+                                        'relative_humidity')
+        if thickness is not None:
+            dz = _gridchunk(fields['Thickness'], start, stop)
+            cell = _invalidcell(np.isfinite(dz) & (dz >= 0), start, grid)
+            if cell is not None:
+                raise InputError("Thickness of grid cell "+str(cell) +
+                                 " should be finite and not negative",
+                                 'thickness')
+        result = tensor.mix(conc_chunk, RH_chunk, var['Input unit'])
+        if thickness is not None:
+            result['AOD'] = result['Extinction coefficient']*dz[:, np.newaxis]
+        for name in names:
+            flat[name][start:stop] = result[name]
+        if column:
+            flat['Total column AOD'][start//levels:stop//levels] = np.nansum(
+                result['AOD'].reshape(-1, levels, W), axis=1)
+    for field in output.values():
+        if isinstance(field, np.memmap):
+            field.flush()
+    return output
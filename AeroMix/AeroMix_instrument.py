@@ -0,0 +1,236 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+
+Opt-in timing and counters of the stages of AeroMix, e.g.
+
+    with AeroMix.instrument() as stats:
+        output = AeroMix.run(input_dict)
+    logging.info(stats.report())
+
+Each stage calls the recorders registered with instrument or add_callback
+with the stage name, the layers it was computed for, its wall time and its
+counters. Without recorders a stage only checks that the list of recorders
+is empty. Stages evaluated in worker processes are not recorded.
+"""
+
+import threading
+import contextlib
+from time import perf_counter
+
+# Stages and what they time. The time of a stage includes the stages it
+# calls, e.g. 'Component data' includes 'Component files'.
+stage_names = {
+    'Validation': 'validation of the input dictionary by run',
+    'Component data': 'optical data and mean particle mass of the '
+    'components at the relative humidity of a group of layers',
+    'Component files': 'reading a component file, text, binary or library',
+    'Spectral interpolation': 'component data at the input wavelengths',
+    'Mass calculation': 'mean particle volume and mass of all components',
+    'Size distribution': 'integration of the volume size distribution of '
+    'one component (_vlogn)',
+    'Humidity tensor': 'component data of all RH levels',
+    'Mixing': 'mixing the components of a group of layers',
+    'Output arrays': 'one output array of all layers',
+    'Result dictionaries': 'output dictionaries of an AeroMixResult',
+    'Mie': 'Mie efficiencies of the radii of one wavelength, by ext_aerosol '
+    'and cs_aerosol'}
+# Counters of each stage. 'Time' is the wall time (s).
+counter_names = ['Calls', 'Time', 'Files', 'Bytes', 'Mie evaluations']
+
+_recorders = []
+_lock = threading.Lock()
+
+# Function to return the start time of a stage, or None when nothing is
+# recorded. Stages are written as
+#     start = _start()
+#     ...
+#     if start is not None:
+#         _record('Mixing', start, layers)
+
+
+def _start():
+    return perf_counter() if _recorders else None
+
+# Function to pass a finished stage to the recorders. layers is None, a
+# layer number or a tuple of layer numbers (from 1). files, nbytes and mie
+# are the files opened, the bytes read and the Mie evaluations.
+
+
+def _record(stage, start, layers=None, files=0, nbytes=0, mie=0):
+    elapsed = perf_counter()-start
+    counters = {'Files': files, 'Bytes': nbytes, 'Mie evaluations': mie}
+    for recorder in list(_recorders):
+        recorder(stage, layers, elapsed, counters)
+
+
+def add_callback(callback):
+    """
+    Register a function called at the end of every stage.
+
+    Parameters
+    ----------
+    callback : Function called as callback(stage, layers, elapsed, counters)
+        with the stage name (see stage_names), None, a layer number or a
+        tuple of layer numbers, the wall time (s) and a dictionary of the
+        counters 'Files', 'Bytes' and 'Mie evaluations' given by the stage.
+
+    """
+    with _lock:
+        _recorders.append(callback)
+
+
+def remove_callback(callback):
+    """
+    Remove a function registered with add_callback.
+
+    Parameters
+    ----------
+    callback : The registered function.
+
+    """
+    with _lock:
+        _recorders.remove(callback)
+
+
+class InstrumentStats:
+    """
+    Aggregated counters of the stages by stage and layers.
+
+    An InstrumentStats is a callback for add_callback. instrument() creates
+    and registers one for the duration of a with block.
+    """
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, stage, layers, elapsed, counters):
+        key = (stage, layers)
+        with self._lock:
+            entry = self._stages.get(key)
+            if entry is None:
+                entry = self._stages[key] = dict.fromkeys(counter_names, 0)
+            entry['Calls'] += 1
+            entry['Time'] += elapsed
+            for name in ('Files', 'Bytes', 'Mie evaluations'):
+                entry[name] += counters[name]
+
+    def stages(self, by_layer=False):
+        """
+        Counters of the stages.
+
+        Parameters
+        ----------
+        by_layer : If True, the counters are kept apart for the layers the
+            stages were computed for. The default is False.
+
+        Returns
+        -------
+        Dictionary of the counters (see counter_names) by stage name or, if
+        by_layer, by (stage name, layers), in the order of stage_names.
+
+        """
+        with self._lock:
+            items = [(key, dict(entry)) for key, entry in
+                     self._stages.items()]
+        order = list(stage_names)
+        items.sort(key=lambda item: (
+            order.index(item[0][0]) if item[0][0] in order else len(order),
+            item[0][0], str(item[0][1])))
+        if by_layer:
+            return dict(items)
+        stages = {}
+        for (stage, layers), entry in items:
+            if stage in stages:
+                for name in counter_names:
+                    stages[stage][name] += entry[name]
+            else:
+                stages[stage] = entry
+        return stages
+
+    def to_dict(self):
+        """
+        Counters as a dictionary that can be written as JSON.
+
+        Returns
+        -------
+        Dictionary of the counters by stage name, with the counters of each
+        group of layers under 'Layers' keyed by the layer numbers, e.g. '1'
+        or '2,3'.
+
+        """
+        output = self.stages()
+        for (stage, layers), entry in self.stages(by_layer=True).items():
+            if layers is not None:
+                key = (','.join(str(k) for k in layers)
+                       if isinstance(layers, tuple) else str(layers))
+                output[stage].setdefault('Layers', {})[key] = entry
+        return output
+
+    def report(self, by_layer=False):
+        """
+        Counters as a text table, e.g. for a log file.
+
+        Parameters
+        ----------
+        by_layer : If True, each group of layers has its own line. The
+            default is False.
+
+        Returns
+        -------
+        The table as a string.
+
+        """
+        lines = ['%-32s %8s %12s %6s %12s %16s' % (
+            'Stage', 'Calls', 'Time [ms]', 'Files', 'Bytes',
+            'Mie evaluations')]
+        for key, entry in self.stages(by_layer).items():
+            if by_layer:
+                stage, layers = key
+                if layers is not None:
+                    stage += ' (layer '+(','.join(str(k) for k in layers)
+                                         if isinstance(layers, tuple)
+                                         else str(layers))+')'
+            else:
+                stage = key
+            lines.append('%-32s %8d %12.3f %6d %12d %16d' % (
+                stage, entry['Calls'], 1e3*entry['Time'], entry['Files'],
+                entry['Bytes'], entry['Mie evaluations']))
+        return '\n'.join(lines)
+
+    def clear(self):
+        """Reset all counters."""
+        with self._lock:
+            self._stages.clear()
+
+    def __repr__(self):
+        return self.report()
+
+
+@contextlib.contextmanager
+def instrument(stats=None):
+    """
+    Record the stages of AeroMix evaluated in the with block, e.g.
+
+        with AeroMix.instrument() as stats:
+            output = AeroMix.run(input_dict)
+        print(stats.report(by_layer=True))
+
+    Parameters
+    ----------
+    stats : Optional InstrumentStats to which the counters are added. The
+        default is None, which creates a new one.
+
+    Returns
+    -------
+    Context manager giving the InstrumentStats.
+
+    """
+    stats = InstrumentStats() if stats is None else stats
+    add_callback(stats)
+    try:
+        yield stats
+    finally:
+        remove_callback(stats)
@@ -18,13 +18,22 @@ This program is free software: you can redistribute it and/or modify
 """
 import os
 import copy
+import functools
 import math
 import sys
-from math import exp as exp
 import numpy as np
 from numpy import log as ln
 from numpy import log10 as log
-from scipy.integrate import trapezoid as trap
+try:
+    from numpy import trapezoid as trap
+except ImportError:
+    # numpy < 2.0
+    from numpy import trapz as trap
+from AeroMix.ComponentDatabase import component_db
+from AeroMix.AeroMix_instrument import _start, _record
+from AeroMix.AeroMix_exceptions import (InputError, WavelengthError,
+                                        RelativeHumidityError, ComponentError,
+                                        ProfileError, ComponentDataError)
 
 
 comp_names = {1: 'IS', 2: 'WS',
@@ -32,18 +41,47 @@ comp_names = {1: 'IS', 2: 'WS',
               5: 'SScm', 6: 'MDnm',
               7: 'MDam', 8: 'MDcm',
               9: 'SUSO', 10: 'custom'}
-# Create radius array
+# Relative humidities (%) of the component files
+rh_levels = [0, 50, 70, 80, 90, 95, 98, 99]
+# Range of wavelengths (µm) of the component files
+wavelength_range = (0.25, 40.0)
+# Number of vertical layers of the input dictionary of run
+n_layers = 6
+unit_dict = {'Relative humidity': '%', 'Number concentration': '(1/cm³)',
+             'Mass concentration': '(ug/m³)',
+             'Volume concentration': '(um³/m³)', 'Number mixing ratio': '',
+             'Mass mixing ratio': '', 'Volume mixing ratio': '',
+             'Extinction coefficient': '(1/km)',
+             'Scattering coefficient': '(1/km)',
+             'Absorption coefficient': '(1/km)', 'SSA': '', 'g': '',
+             'AOD': ''}
+# Settings of the radius array
 xrmin = 0.01
 xrmax = 10
 deltar = 0.015
-xr = np.zeros(220)
-xr[0] = xrmin
-ix = 1
-xranf = log(xrmin)
-while xr[ix-1] < xrmax:
-    xrl = xranf+deltar*(ix-1)
-    xr[ix] = 10**(xrl)
-    ix = ix+1
+
+# Function to create the radius array on first use
+
+
+@functools.lru_cache(maxsize=None)
+def _radiusgrid():
+    xr = np.zeros(220)
+    xr[0] = xrmin
+    ix = 1
+    xranf = log(xrmin)
+    while xr[ix-1] < xrmax:
+        xrl = xranf+deltar*(ix-1)
+        xr[ix] = 10**(xrl)
+        ix = ix+1
+    xr.flags.writeable = False
+    return xr
+
+
+def __getattr__(name):
+    # The radius array xr is only created when used
+    if name == 'xr':
+        return _radiusgrid()
+    raise AttributeError("module "+__name__+" has no attribute "+name)
 
 # Function to a create lookup dictionary for aerosol component data
 
@@ -64,8 +102,8 @@ def _ReadOpticalData(var, RH):
     elif comp_dir[-1] != '\\' and sys.platform == 'Windows':
         comp_dir = comp_dir+'\\'
     if not os.path.exists(comp_dir):
-        print("Error: Component file directory "+comp_dir+" not found\nExiting program")
-        raise SystemExit
+        raise ComponentDataError("Component file directory "+comp_dir +
+                                 " not found", 'Component file directory')
     for i in OptdataFiles.keys():
         if i < 10 and i not in [1, 3, 6, 7, 8]:
             filename = comp_dir+comp_names[i]+RH
@@ -76,45 +114,52 @@ def _ReadOpticalData(var, RH):
         OptdataFiles[i] = filename
     return OptdataFiles
 
-# Function to read size and mass of aerosols from optdata file
-
-
-def _ReadSizeMassData(file, comp_no):
-    global min_rad, max_rad, sigma, rho, Rmod, var_name
-    for line in file:
-        if "minimum radius" in line:
-            var_name, min_rad = line.split(':')
-        if "maximum radius" in line:
-            var_name, max_rad = line.split(':')
-        if "sigma" in line:
-            var_name, sigma = line.split(':')
-        if "rho[g/cm**3]" in line:
-            var_name, rho = line.split(':')
-        if "Rmod" and "wet" in line:
-            var_name, Rmod = line.split(':')
-        if "Rmod [um]:" in line:
-            var_name, Rmod = line.split(':')
-    result = {'Rmin': float(min_rad), 'Rmax': float(max_rad),
-              'sigma': float(sigma), 'rho': float(rho), 'Rmod': float(Rmod)}
-    return result
+# Function to calculate the volume size distribution (um³) of a lognormal
+# mode at the radii r
 
 
 def _vlogn(sig, ro, n, r):
     a = (n/(math.sqrt(2*math.pi)*log(sig)))
     b = log(ro)
     c = -2*(log(sig))**2
-    rlogn = a*exp((log(r)-b)**2/c)
+    rlogn = a*np.exp((log(r)-b)**2/c)
     vlogn = (4/3)*math.pi*(r**3)*rlogn
     return vlogn
 
+# Function to calculate the mean volume (um³) and mass (ug) of one particle.
+# Results depend only on the size distribution, so they are memoized.
+# correction is the non-sphericity correction factor of mineral dust.
+
+
+@functools.lru_cache(maxsize=1024)
+def _meanvolmass(sigma, rm, rho, rmin, rmax, max_radius, correction):
+    start = _start()
+    xr = _radiusgrid()
+    rad_array = xr[1:np.argmax(xr)+1]
+    if rmax > rad_array[-1] or rmax not in rad_array:
+        rad_array = np.append(rad_array, rmax)
+    if rmin < rad_array[0] or rmin not in rad_array:
+        rad_array = np.append(rad_array, rmin)
+    if max_radius not in rad_array:
+        rad_array = np.append(rad_array, max_radius)
+    rad_array = np.sort(rad_array)
+    dv = _vlogn(sigma, rm, 1, rad_array)*10**6
+    vol_array = np.where(rad_array <= max_radius,
+                         dv/(rad_array*ln(10)), 0)
+    vol = trap(vol_array, rad_array)*correction
+    mass = vol*rho*10**-6
+    if start is not None:
+        _record('Size distribution', start)
+    return vol, mass
+
 
 def _CalculateMass(var, RH):
+    start = _start()
     mass_data = {}
+    OptdataFiles = _ReadOpticalData(var, RH)
     for i in range(1, var['Maximum number of components']+1):
-        OptdataFiles = _ReadOpticalData(var, RH)
         if os.path.exists(OptdataFiles[i]):
-            OptDataFile = open(OptdataFiles[i], 'r')
-            mass_data[i] = _ReadSizeMassData(OptDataFile, i)
+            mass_data[i] = dict(component_db.size_mass_data(OptdataFiles[i]))
     masscalc = dict(
         zip(np.arange(1, var['Maximum number of components']+1), np.zeros(
             var['Maximum number of components'])))
@@ -122,220 +167,420 @@ def _CalculateMass(var, RH):
         zip(np.arange(1, var['Maximum number of components']+1), np.zeros(
             var['Maximum number of components'])))
     for i in list(mass_data.keys()):
-        rmin = mass_data[i]['Rmin']
-        rmax = mass_data[i]['Rmax']
-        sigma = mass_data[i]['sigma']
-        rho = mass_data[i]['rho']
-        rm = mass_data[i]['Rmod']
-        n = 1
-
-        rad_array = xr[1:np.argmax(xr)+1]
-        if rmax > rad_array[-1] or rmax not in rad_array:
-            rad_array = np.append(rad_array, rmax)
-        if rmin < rad_array[0] or rmin not in rad_array:
-            rad_array = np.append(rad_array, rmin)
-        if var['Maximum radius'] not in rad_array:
-            rad_array = np.append(rad_array, var['Maximum radius'])
-        rad_array = np.sort(rad_array)
-
         if i == 6:
-            dv = [_vlogn(sigma, rm, n, r)*10**6 for r in rad_array]
-            vol_array = np.zeros(len(rad_array))
-            for idx in range(len(rad_array)):
-                if rad_array[idx] <= var['Maximum radius']:
-                    vol_array[idx] = dv[idx]/(rad_array[idx]*ln(10))
-                else:
-                    vol_array[idx] = 0
-            volcalc[i] = trap(vol_array, rad_array)*0.9754
-            masscalc[i] = volcalc[i]*rho*10**-6
-        elif i in (7,8):
-            dv = [_vlogn(sigma, rm, n, r)*10**6 for r in rad_array]
-            vol_array = np.zeros(len(rad_array))
-            for idx in range(len(rad_array)):
-                if rad_array[idx] <= var['Maximum radius']:
-                    vol_array[idx] = dv[idx]/(rad_array[idx]*ln(10))
-                else:
-                    vol_array[idx] = 0
-            volcalc[i] = trap(vol_array, rad_array)*0.9273
-            masscalc[i] = volcalc[i]*rho*10**-6
+            correction = 0.9754
+        elif i in (7, 8):
+            correction = 0.9273
         else:
-            dv = [_vlogn(sigma, rm, n, r)*10**6 for r in rad_array]
-            vol_array = np.zeros(len(rad_array))
-            for idx in range(len(rad_array)):
-                if rad_array[idx] <= var['Maximum radius']:
-                    vol_array[idx] = dv[idx]/(rad_array[idx]*ln(10))
-                else:
-                    vol_array[idx] = 0
-            volcalc[i] = trap(vol_array, rad_array)
-            masscalc[i] = volcalc[i]*rho*10**-6
+            correction = 1
+        volcalc[i], masscalc[i] = _meanvolmass(
+            mass_data[i]['sigma'], mass_data[i]['Rmod'], mass_data[i]['rho'],
+            mass_data[i]['Rmin'], mass_data[i]['Rmax'],
+            var['Maximum radius'], correction)
+    if start is not None:
+        _record('Mass calculation', start)
     return volcalc, masscalc, mass_data
 
-# Function to convert mass concentration to number concentration
-# if Input unit = 1
-
-
-def _numdenscalc(var, conc_dict, mean_mass):
-    NumDens = dict(
-        zip(np.arange(1, var['Maximum number of components']+1), np.zeros(
-            var['Maximum number of components'])))
-    if var['Input unit'] == 1:
-        input_mass = conc_dict
-        for i in list(mean_mass.keys()):
-            if mean_mass[i] != 0:
-                NumDens[i] = input_mass[i]/mean_mass[i]
-            else:
-                NumDens[i] = 0
-    elif var['Input unit'] == 0:
-        NumDens = conc_dict
-    return NumDens
-
-# Function to retrive spectral optical data of aerosol components
-
-
-def _storeoptdata(var, NumDens, RH):
-    OptdataFiles = _ReadOpticalData(var, RH)
-    optdata = {}
-    empty_optdata = {}
-    for i in [0.25, 0.3, 0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8,
-              0.9, 1.0, 1.25, 1.5, 1.75, 2.0, 2.5, 3.0, 3.2, 3.39, 3.5, 3.75,
-              4.0, 4.5, 5.0, 5.5, 6.0, 6.2, 6.5, 7.2, 7.9, 8.2, 8.5, 8.7, 9.0,
-              9.2, 9.5, 9.8, 10.0, 10.6, 11.0, 11.5, 12.5, 13.0, 14.0, 14.8,
-              15.0, 16.4, 17.2, 18.0, 18.5, 20.0, 21.3, 22.5, 25.0, 27.9, 30.0,
-              35.0, 40.0]:
-        empty_optdata[i] = np.zeros(8)
-    for i in NumDens.keys():
-        optdata[i] = {}
-        if NumDens[i] != 0:
-            OptdataFileLoc = OptdataFiles[i]
-            OptDataFile = open(OptdataFileLoc, 'r')
-            for line in OptDataFile:
-                if "," in line:
-                    wavelength, extc, scac, absc, ssa, g, extn, real, img = line.split(",")
-                    optdata[i][float(wavelength)] = [float(extc), float(scac),
-                                                     float(absc), float(ssa),
-                                                     float(g), float(extn),
-                                                     float(real), float(img)]
-        else:
-            optdata[i] = empty_optdata
-    return optdata
-
-
-# Function to calculate mie params
-
-
-def _mieparamcalc(optdata, NumDens, wavelength_i, param_index_no):
-    if sum(NumDens.values()) != 0:
-        result = 0
-        for i in NumDens.keys():
-            result = result+(
-                NumDens[i]*optdata[i][wavelength_i][param_index_no])
-    else:
-        result = np.nan
-    return result
-
-# Function to calculate SSA and g
-
-
-def _ssaandgcalc(optdata, NumDens, wavelength_i, ext_i, sca_i, ssa_i, g_i):
-    if sum(NumDens.values()) != 0:
-        # ssa
-        ssa_num = 0
-        ssa_denom = 0
-        for i in NumDens.keys():
-            ssa_num = ssa_num+(
-                NumDens[i]*optdata[i][wavelength_i][ext_i]*optdata[i][
-                    wavelength_i][ssa_i])
-            ssa_denom = ssa_denom+(NumDens[i]*optdata[i][wavelength_i][ext_i])
-        ssa = ssa_num/ssa_denom
-        # g
-        g_num = 0
-        g_denom = 0
-        for i in NumDens.keys():
-            g_num = g_num+(
-                NumDens[i]*optdata[i][wavelength_i][sca_i]*optdata[i][
-                    wavelength_i][g_i])
-            g_denom = g_denom+(NumDens[i]*optdata[i][wavelength_i][sca_i])
-        g = g_num/g_denom
-    else:
-        ssa = np.nan
-        g = np.nan
-    return ssa, g
-
 # Function to calculate AOD
 
 
-def _AODcalc(extcalc, profile_type, profile_params, wavelength_i):
+def _profilefactor(profile_type, profile_params):
     # exponential profile
     if profile_type == 0:
-        AOD = (
-            extcalc[wavelength_i]*profile_params[2]*(
-                math.exp(-profile_params[0]/profile_params[2])-math.exp(
-                    -profile_params[1]/profile_params[2])))
+        factor = profile_params[2]*(
+            math.exp(-profile_params[0]/profile_params[2])-math.exp(
+                -profile_params[1]/profile_params[2]))
     # Homogenous layer
     elif profile_type == 1:
-        AOD = (extcalc[wavelength_i]*(profile_params[1]-profile_params[0]))
+        factor = profile_params[1]-profile_params[0]
     # Cubic function profile
     elif profile_type == 2:
-        AOD = extcalc[wavelength_i]*(
+        factor = (
             ((profile_params[2]/4)*((profile_params[1]**4)-(
                 profile_params[0]**4)))+((profile_params[3]/3)*(
                     (profile_params[1]**3)-(profile_params[0]**3)))+(
                         (profile_params[4]/2)*((profile_params[1]**2)-(
                             profile_params[0]**2)))+((profile_params[5])*(
                                 (profile_params[1])-(profile_params[0]))))
-    return AOD
+    return factor
+
+
+# Function to add up the components (last axis) of an array one after the
+# other, in the same order as a sum over the components of one layer
+
+
+def _componentsum(array):
+    total = np.zeros(array.shape[:-1])
+    for c in range(array.shape[-1]):
+        total = total+array[..., c]
+    return total
+
+# Function to calculate the concentrations and mixed optical properties of
+# the layers sharing one relative humidity. Components are added one after
+# the other over all layers and wavelengths at once. layers holds the layer
+# numbers for the instrumentation and optics the component data of
+# _humidityoptics, if already loaded.
 
 
-def _layerparams(var, RH, Concentration, Max_components, wavelengths,
-                 profile_type, profile_params):
-    if profile_params[1]-profile_params[0] == 0:
-        NumDens = mass_calc = vol_calc = no_mix_ratio = mass_mix_ratio = vol_mix_ratio = extcalc = scacalc = abscalc = ssacalc = gcalc = np.nan
-        AOD = {k: np.nan for k in wavelengths}
+def _mixlayers(var, RH, conc, layers=None, optics=None):
+    from AeroMix.HumidityTensor import _humidityoptics
+    start = _start()
+    optarray, available, mean_vol, mean_mass = _humidityoptics(var, RH) \
+        if optics is None else optics
+    if start is not None:
+        _record('Component data', start, layers)
+        start = _start()
+    # Conversion of mass concentration to number concentration
+    if var['Input unit'] == 1:
+        NumDens = np.divide(conc, mean_mass, out=np.zeros_like(conc),
+                            where=mean_mass != 0)
     else:
-        mean_vol, mean_mass, mass_data = _CalculateMass(var, RH)
-        NumDens = _numdenscalc(var, Concentration, mean_mass)
-        TotalNumDens = sum(NumDens.values())
-        mass_calc = dict(
-            zip(np.arange(1, var['Maximum number of components']+1), np.zeros(
-                var['Maximum number of components'])))
-        vol_calc = dict(
-            zip(np.arange(1, var['Maximum number of components']+1), np.zeros(
-                var['Maximum number of components'])))
-        no_mix_ratio = {}
-        mass_mix_ratio = {}
-        vol_mix_ratio = {}
-        for i in range(1, var['Maximum number of components']+1):
-            mass_calc[i] = mean_mass[i]*NumDens[i]
-            vol_calc[i] = mean_vol[i]*NumDens[i]
-        if TotalNumDens != 0:
-            for i in list(mass_calc.keys()):
-                no_mix_ratio[i] = NumDens[i]/sum(NumDens.values())
-                mass_mix_ratio[i] = mass_calc[i]/sum(mass_calc.values())
-                vol_mix_ratio[i] = vol_calc[i]/sum(vol_calc.values())
+        NumDens = conc
+    if np.any((NumDens != 0) & ~available):
+        raise ComponentDataError("Component file not found for a component "
+                                 "with non-zero concentration")
+    L = conc.shape[0]
+    W = optarray.shape[1]
+    ext = np.zeros((L, W))
+    sca = np.zeros((L, W))
+    absc = np.zeros((L, W))
+    ssa_num = np.zeros((L, W))
+    g_num = np.zeros((L, W))
+    for c in range(conc.shape[1]):
+        n = NumDens[:, c:c+1]
+        ext = ext+n*optarray[c, :, 0]
+        sca = sca+n*optarray[c, :, 1]
+        absc = absc+n*optarray[c, :, 2]
+        ssa_num = ssa_num+n*optarray[c, :, 0]*optarray[c, :, 3]
+        g_num = g_num+n*optarray[c, :, 1]*optarray[c, :, 4]
+    if start is not None:
+        _record('Mixing', start, layers)
+    return (NumDens, mean_mass*NumDens, mean_vol*NumDens, ext, sca, absc,
+            ssa_num, g_num)
+
+
+# Keys of the input dictionary shared by the layers and of each layer
+input_keys = ['Wavelengths', 'Maximum radius', 'Maximum number of components',
+              'Component file directory', 'Input unit']
+layer_keys = ['profile type', 'relative humidity', 'profile params',
+              'component concentration']
+_layer_key_names = [['Layer'+str(k)+' '+name for name in layer_keys]
+                    for k in range(1, n_layers+1)]
+# Number of profile params used by each profile type
+profile_param_count = {0: 3, 1: 2, 2: 6}
+
+_number_types = (int, float, np.integer, np.floating)
+
+# Function to check for a real number
+
+
+def _isnumber(value):
+    return isinstance(value, _number_types)
+
+# Function to validate the settings shared by the layers: the wavelengths,
+# the input unit, the number of components, the maximum radius and the
+# component file directory
+
+
+def _ValidateSettings(var):
+    for key in input_keys:
+        if key not in var:
+            raise InputError("Missing input "+key, key)
+    # Wavelengths between those of the component files are interpolated
+    if isinstance(var['Wavelengths'], (str, bytes)) or \
+            not hasattr(var['Wavelengths'], '__len__') or \
+            len(var['Wavelengths']) == 0:
+        raise WavelengthError("Invalid wavelength selection", 'Wavelengths')
+    for i in var['Wavelengths']:
+        if not _isnumber(i) or \
+                not wavelength_range[0] <= i <= wavelength_range[1]:
+            raise WavelengthError("Invalid wavelength selection",
+                                  'Wavelengths')
+    if var['Input unit'] != 1 and var['Input unit'] != 0:
+        raise InputError("Invalid input unit", 'Input unit')
+    C = var['Maximum number of components']
+    if not isinstance(C, (int, np.integer)) or isinstance(C, bool) or C < 1:
+        raise ComponentError("Invalid maximum number of components",
+                             'Maximum number of components')
+    if not _isnumber(var['Maximum radius']) or \
+            not var['Maximum radius'] > 0:
+        raise InputError("Invalid maximum radius", 'Maximum radius')
+    comp_dir = var['Component file directory']
+    if not isinstance(comp_dir, (str, os.PathLike)):
+        raise InputError("Invalid component file directory",
+                         'Component file directory')
+    if comp_dir != 'def' and not os.path.exists(comp_dir):
+        raise ComponentDataError("Component file directory "+str(comp_dir) +
+                                 " not found", 'Component file directory')
+
+# Function to validate the relative humidity of a layer. Relative humidities
+# between the levels of the component files are interpolated.
+
+
+def _ValidateRH(RH, key=None):
+    if not _isnumber(RH) or not rh_levels[0] <= RH <= rh_levels[-1]:
+        raise RelativeHumidityError("Invalid relative humidity value", key)
+
+# Function to validate the profile type and profile params of a layer
+
+
+def _ValidateProfile(profile_type, profile_params, key=None):
+    if profile_type not in profile_param_count:
+        raise ProfileError("Invalid profile type", key)
+    if isinstance(profile_params, (str, bytes)) or \
+            not hasattr(profile_params, '__len__') or \
+            len(profile_params) < profile_param_count[profile_type] or \
+            not all(map(_isnumber, profile_params)) or \
+            not math.isfinite(sum(profile_params)):
+        raise ProfileError("Profile type "+str(profile_type)+" needs "
+                           + str(profile_param_count[profile_type]) +
+                           " profile params", key)
+    if profile_params[1] < profile_params[0]:
+        raise ProfileError("Top of the layer below its bottom", key)
+    if profile_type == 0 and not profile_params[2] > 0:
+        raise ProfileError("Invalid scale height", key)
+
+# Function to validate the layer arrays of run_layers
+
+
+def _ValidateLayers(var, conc, RH, profile_type, profile_params):
+    _ValidateSettings(var)
+    L = len(RH)
+    if conc.ndim != 2 or conc.shape != (L, var[
+            'Maximum number of components']):
+        raise ComponentError("Concentration array should be of shape "
+                             "(layers, "+str(var['Maximum number of '
+                                                 'components'])+")")
+    if not np.all(np.isfinite(conc)) or np.any(conc < 0):
+        raise ComponentError("Concentrations should be finite and not "
+                             "negative")
+    if len(profile_type) != L or len(profile_params) != L:
+        raise ProfileError("Number of profile types and profile params "
+                           "should be the number of layers")
+    for k in range(L):
+        _ValidateRH(RH[k])
+        _ValidateProfile(profile_type[k], profile_params[k])
+
+
+def validate_input(input_dict):
+    """
+    Check an input dictionary before running AeroMix.
+
+    The wavelengths, the input unit, the maximum number of components and
+    radius, the component file directory and the relative humidity, profile
+    and component concentrations of each of the six layers are checked, so
+    that invalid inputs are found before any calculation.
+
+    Parameters
+    ----------
+    input_dict : A dictionary containing the input parameters for the AeroMix,
+        in the same format as for AeroMix.run.
+
+    Raises
+    ------
+    InputError, or one of its subclasses WavelengthError,
+    RelativeHumidityError, ComponentError and ProfileError, for an invalid
+    input, with the key of the input in the attribute key, and
+    ComponentDataError if the component file directory does not exist.
+
+    """
+    var = input_dict
+    if not isinstance(var, dict):
+        raise InputError("Input should be a dictionary")
+    _ValidateSettings(var)
+    C = var['Maximum number of components']
+    for keys in _layer_key_names:
+        for key in keys:
+            if key not in var:
+                raise InputError("Missing input "+key, key)
+        type_key, rh_key, params_key, key = keys
+        _ValidateRH(var[rh_key], rh_key)
+        _ValidateProfile(var[type_key], var[params_key], params_key)
+        conc = var[key]
+        if not isinstance(conc, dict) or len(conc) != C:
+            raise ComponentError("Number of components specified and "
+                                 "maximum number of components are not "
+                                 "matching", key)
+        values = [conc.get(i) for i in range(1, C+1)]
+        # The components are only checked one by one if the values are not
+        # all valid
+        if all(map(_isnumber, values)) and math.isfinite(sum(values)) and \
+                min(values) >= 0:
+            continue
+        for i, value in enumerate(values, 1):
+            if i not in conc:
+                raise ComponentError("Concentration of component "+str(i) +
+                                     " missing", key)
+            if not _isnumber(value) or not math.isfinite(value) or value < 0:
+                raise ComponentError("Concentration of component "+str(i) +
+                                     " should be finite and not negative",
+                                     key)
+
+# Function to collect the shared settings of each vertical layer
+
+
+def _layersettings(var):
+    RH = [var['Layer'+str(k)+' relative humidity']
+          for k in range(1, n_layers+1)]
+    profile_type = [var['Layer'+str(k)+' profile type']
+                    for k in range(1, n_layers+1)]
+    profile_params = [var['Layer'+str(k)+' profile params']
+                      for k in range(1, n_layers+1)]
+    return RH, profile_type, profile_params
+
+
+# Output arrays of the layers, of shape (layers x components) or
+# (layers x wavelengths)
+layer_outputs = ['Number concentration', 'Mass concentration',
+                 'Volume concentration', 'Number mixing ratio',
+                 'Mass mixing ratio', 'Volume mixing ratio',
+                 'Extinction coefficient', 'Scattering coefficient',
+                 'Absorption coefficient', 'SSA', 'g', 'AOD']
+_mixing_ratios = {'Number mixing ratio': 'Number concentration',
+                  'Mass mixing ratio': 'Mass concentration',
+                  'Volume mixing ratio': 'Volume concentration'}
+
+# Function to calculate the concentrations and the component sums of the
+# optical properties of any number of layers. Layers with the same relative
+# humidity share the component data and layers without aerosol or with zero
+# thickness are not computed. optics optionally holds the component data of
+# _humidityoptics by relative humidity.
+
+
+def _layersums(var, concentrations, relative_humidity, profile_type,
+               profile_params, optics=None):
+    conc = np.asarray(concentrations, dtype=float)
+    RH = list(relative_humidity)
+    profile_type = list(profile_type)
+    profile_params = list(profile_params)
+    _ValidateLayers(var, conc, RH, profile_type, profile_params)
+    L, C = conc.shape
+    W = len(var['Wavelengths'])
+    thin = np.array([profile_params[k][1]-profile_params[k][0] == 0
+                     for k in range(L)], dtype=bool)
+    active = ~thin & np.any(conc != 0, axis=1)
+
+    NumDens = np.zeros((L, C))
+    mass_calc = np.zeros((L, C))
+    vol_calc = np.zeros((L, C))
+    ext = np.zeros((L, W))
+    sca = np.zeros((L, W))
+    absc = np.zeros((L, W))
+    ssa_num = np.zeros((L, W))
+    g_num = np.zeros((L, W))
+    for rh in set(RH[k] for k in np.flatnonzero(active)):
+        layers = [k for k in np.flatnonzero(active) if RH[k] == rh]
+        (NumDens[layers], mass_calc[layers], vol_calc[layers], ext[layers],
+         sca[layers], absc[layers], ssa_num[layers],
+         g_num[layers]) = _mixlayers(var, rh, conc[layers],
+                                     tuple(int(k)+1 for k in layers),
+                                     None if optics is None else optics[rh])
+    factor = np.array([np.nan if thin[k] else _profilefactor(
+        profile_type[k], profile_params[k]) for k in range(L)])
+    return {'Number concentration': NumDens,
+            'Mass concentration': mass_calc,
+            'Volume concentration': vol_calc,
+            'Extinction coefficient': ext, 'Scattering coefficient': sca,
+            'Absorption coefficient': absc, 'ext x SSA': ssa_num,
+            'sca x g': g_num, 'empty': (_componentsum(NumDens) == 0),
+            'thin': thin, 'factor': factor}
+
+# Function to calculate an output array of the layers from their component
+# sums. As in AeroMix.run, layers without aerosol have zero mixing ratios
+# and NaN optical properties and all results of layers with zero thickness
+# are NaN. Arrays are kept in cache, so that each is computed once.
+
+
+def _layerfield(sums, key, cache):
+    if key in cache:
+        return cache[key]
+    start = _start()
+    empty = sums['empty'][:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if key in _mixing_ratios:
+            array = sums[_mixing_ratios[key]]
+            value = np.where(~empty, array/_componentsum(array)[:, np.newaxis],
+                             0.0)
+        elif key == 'SSA':
+            value = np.where(empty, np.nan, sums['ext x SSA'] /
+                             sums['Extinction coefficient'])
+        elif key == 'g':
+            value = np.where(empty, np.nan, sums['sca x g'] /
+                             sums['Scattering coefficient'])
+        elif key == 'AOD':
+            value = _layerfield(sums, 'Extinction coefficient', cache) * \
+                sums['factor'][:, np.newaxis]
+        elif key == 'Total column AOD':
+            cache[key] = np.nansum(_layerfield(sums, 'AOD', cache), axis=0)
+            if start is not None:
+                _record('Output arrays', start)
+            return cache[key]
+        elif key in ('Extinction coefficient', 'Scattering coefficient',
+                     'Absorption coefficient'):
+            value = np.where(empty, np.nan, sums[key])
         else:
-            for i in list(mass_calc.keys()):
-                no_mix_ratio[i] = 0
-                mass_mix_ratio[i] = 0
-                vol_mix_ratio[i] = 0
-        optdata = _storeoptdata(var, NumDens, RH)
-        extcalc = {}                # Calculation of ext. coeff.
-        for i in wavelengths:
-            extcalc[i] = _mieparamcalc(optdata, NumDens, i, 0)
-        scacalc = {}                # Calculation of sca. coeff.
-        for i in wavelengths:
-            scacalc[i] = _mieparamcalc(optdata, NumDens, i, 1)
-        abscalc = {}                # Calculation of abs. coeff.
-        for i in wavelengths:
-            abscalc[i] = _mieparamcalc(optdata, NumDens, i, 2)
-        ssacalc = {}
-        gcalc = {}
-        for i in wavelengths:
-            ssacalc[i], gcalc[i] = _ssaandgcalc(
-                optdata, NumDens, i, 0, 1, 3, 4)
-        AOD = {}
-        for i in wavelengths:
-            AOD[i] = _AODcalc(extcalc, profile_type, profile_params, i)
-    return NumDens, mass_calc, vol_calc, no_mix_ratio, mass_mix_ratio, vol_mix_ratio, extcalc, scacalc, abscalc, ssacalc, gcalc, AOD
+            value = sums[key]
+    # Layers with zero thickness
+    cache[key] = np.where(sums['thin'][:, np.newaxis], np.nan, value)
+    if start is not None:
+        _record('Output arrays', start)
+    return cache[key]
+
+
+def run_layers(input_dict, concentrations, relative_humidity, profile_type,
+               profile_params):
+    """
+    Calculate the optical and physical properties of aerosols in any number
+    of vertical layers.
+
+    Layers with the same relative humidity share the component data, each
+    property is computed for all layers and wavelengths in one array
+    operation and layers without aerosol or with zero thickness are not
+    computed.
+
+    Parameters
+    ----------
+    input_dict : A dictionary containing the input parameters for the AeroMix,
+        in the same format as for AeroMix.run. Only the wavelengths, the
+        input unit, the maximum number of components, the component file
+        directory and the maximum radius are used. The layer entries are
+        ignored.
+    concentrations : Array of shape (layers x components) holding the number
+        or mass concentrations (see input_dict['Input unit']) of the
+        components in each layer. Component n is stored at index n-1 of the
+        last axis.
+    relative_humidity : List of the relative humidity (%) of each layer,
+        between 0 and 99.
+    profile_type : List of the profile type of each layer (0: exponential,
+        1: homogeneous, 2: cubic function), as 'Layerx profile type' of
+        input_dict.
+    profile_params : List of the profile parameters of each layer, as
+        'Layerx profile params' of input_dict.
+
+    Returns
+    -------
+    Dictionary of output arrays. 'Number concentration', 'Mass concentration',
+    'Volume concentration', 'Number mixing ratio', 'Mass mixing ratio' and
+    'Volume mixing ratio' have the shape (layers x components).
+    'Extinction coefficient', 'Scattering coefficient',
+    'Absorption coefficient', 'SSA', 'g' and 'AOD' have the shape
+    (layers x wavelengths) and 'Total column AOD' has the shape
+    (wavelengths). As in AeroMix.run, layers without aerosol have zero
+    concentrations and mixing ratios and NaN optical properties, and all
+    results of layers with zero thickness are NaN.
+
+    """
+    var = input_dict
+    sums = _layersums(var, concentrations, relative_humidity, profile_type,
+                      profile_params)
+    cache = {}
+    output = {'AeroMix version': '1.0.1',
+              'Wavelengths': np.array(var['Wavelengths'], dtype=float),
+              'Relative humidity': np.array(relative_humidity, dtype=float)}
+    for key in layer_outputs+['Total column AOD']:
+        output[key] = _layerfield(sums, key, cache)
+    output['Units'] = dict(unit_dict)
+    return output
 
 
 def run(input_dict):
@@ -351,201 +596,21 @@ def run(input_dict):
 
     Returns
     -------
-    Dictionary of output parameters.
+    AeroMixResult, a mapping of the output parameters with the same keys and
+    values as a dictionary, computed from arrays on first access.
     See documentation(www.github.com/sampr7/AeroMix/blob/main/Documentation.md)
     for more info.
     """
+    from AeroMix.AeroMix_result import AeroMixResult
+    start = _start()
     var = copy.deepcopy(input_dict)
-    # Validation of input
-    for i in var['Wavelengths']:
-        if i not in [0.25, 0.3, 0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65,
-                     0.7, 0.75, 0.8, 0.9, 1.0, 1.25, 1.5, 1.75, 2.0,
-                     2.5, 3.0, 3.2, 3.39, 3.5, 3.75, 4.0, 4.5, 5.0,
-                     5.5, 6.0, 6.2, 6.5, 7.2, 7.9, 8.2, 8.5, 8.7, 9.0,
-                     9.2, 9.5, 9.8, 10.0, 10.6, 11.0, 11.5, 12.5, 13.0,
-                     14.0, 14.8, 15.0, 16.4, 17.2, 18.0, 18.5, 20.0,
-                     21.3, 22.5, 25.0, 27.9, 30.0, 35.0, 40.0]:
-            print("Error: Invalid wavelength selection\nExiting program")
-            raise SystemExit
-    if var['Layer1 relative humidity'] not in [0, 50, 70, 80, 90, 95, 98, 99]:
-        print("Error: Invalid relative humidity value\nExiting program")
-        raise SystemExit
-    if var['Layer2 relative humidity'] not in [0, 50, 70, 80, 90, 95, 98, 99]:
-        print("Error: Invalid relative humidity value\nExiting program")
-        raise SystemExit
-    if var['Layer3 relative humidity'] not in [0, 50, 70, 80, 90, 95, 98, 99]:
-        print("Error: Invalid relative humidity value\nExiting program")
-        raise SystemExit
-    if var['Layer4 relative humidity'] not in [0, 50, 70, 80, 90, 95, 98, 99]:
-        print("Error: Invalid relative humidity value\nExiting program")
-        raise SystemExit
-    if var['Layer5 relative humidity'] not in [0, 50, 70, 80, 90, 95, 98, 99]:
-        print("Error: Invalid relative humidity value\nExiting program")
-        raise SystemExit
-    if var['Layer6 relative humidity'] not in [0, 50, 70, 80, 90, 95, 98, 99]:
-        print("Error: Invalid relative humidity value\nExiting program")
-        raise SystemExit
-    if len(var['Layer1 component concentration'].keys()) != var[
-            'Maximum number of components'] or len(var[
-            'Layer2 component concentration'].keys()) != var[
-            'Maximum number of components'] or len(var[
-            'Layer3 component concentration'].keys()) != var[
-            'Maximum number of components'] or len(var[
-            'Layer4 component concentration'].keys()) != var[
-            'Maximum number of components'] or len(var[
-            'Layer5 component concentration'].keys()) != var[
-            'Maximum number of components'] or len(var[
-            'Layer6 component concentration'].keys()) != var[
-            'Maximum number of components']:
-        print("Error: Number of components specified and maximum number of components are not matching")
-        raise SystemExit
-    if var['Input unit'] != 1 and var['Input unit'] != 0:
-        print("Error: Invalid input unit\nExiting program")
-        raise SystemExit
-    # Layer1
-    NumDens1, mass_calc1, vol_calc1, no_mix_ratio1, mass_mix_ratio1, vol_mix_ratio1, extcalc1, scacalc1, abscalc1, ssacalc1, gcalc1, AOD1 = _layerparams(
-        var, var['Layer1 relative humidity'],
-        var['Layer1 component concentration'],
-        var['Maximum number of components'],
-        var['Wavelengths'], var['Layer1 profile type'],
-        var['Layer1 profile params'])
-    # Layer2
-    NumDens2, mass_calc2, vol_calc2, no_mix_ratio2, mass_mix_ratio2, vol_mix_ratio2, extcalc2, scacalc2, abscalc2, ssacalc2, gcalc2, AOD2 = _layerparams(
-        var, var['Layer2 relative humidity'],
-        var['Layer2 component concentration'],
-        var['Maximum number of components'],
-        var['Wavelengths'], var['Layer2 profile type'],
-        var['Layer2 profile params'])
-    # Layer3
-    NumDens3, mass_calc3, vol_calc3, no_mix_ratio3, mass_mix_ratio3, vol_mix_ratio3, extcalc3, scacalc3, abscalc3, ssacalc3, gcalc3, AOD3 = _layerparams(
-        var, var['Layer3 relative humidity'],
-        var['Layer3 component concentration'],
-        var['Maximum number of components'],
-        var['Wavelengths'], var['Layer3 profile type'],
-        var['Layer3 profile params'])
-    # Layer4
-    NumDens4, mass_calc4, vol_calc4, no_mix_ratio4, mass_mix_ratio4, vol_mix_ratio4, extcalc4, scacalc4, abscalc4, ssacalc4, gcalc4, AOD4 = _layerparams(
-        var, var['Layer4 relative humidity'],
-        var['Layer4 component concentration'],
-        var['Maximum number of components'],
-        var['Wavelengths'], var['Layer4 profile type'],
-        var['Layer4 profile params'])
-    # Layer5
-    NumDens5, mass_calc5, vol_calc5, no_mix_ratio5, mass_mix_ratio5, vol_mix_ratio5, extcalc5, scacalc5, abscalc5, ssacalc5, gcalc5, AOD5 = _layerparams(
-        var, var['Layer5 relative humidity'],
-        var['Layer5 component concentration'],
-        var['Maximum number of components'],
-        var['Wavelengths'], var['Layer5 profile type'],
-        var['Layer5 profile params'])
-    # Layer6
-    NumDens6, mass_calc6, vol_calc6, no_mix_ratio6, mass_mix_ratio6, vol_mix_ratio6, extcalc6, scacalc6, abscalc6, ssacalc6, gcalc6, AOD6 = _layerparams(
-        var, var['Layer6 relative humidity'],
-        var['Layer6 component concentration'],
-        var['Maximum number of components'],
-        var['Wavelengths'], var['Layer6 profile type'],
-        var['Layer6 profile params'])
-    TotalAOD = {}
-    for i in var['Wavelengths']:
-        TotalAOD[i] = np.nansum([AOD1[i], AOD2[i], AOD3[i], AOD4[i], AOD5[i],
-                                 AOD6[i]])
-    layer1_params = {'Layer': 1,
-                     'Relative humidity': var['Layer1 relative humidity'],
-                     'Number concentration': NumDens1,
-                     'Mass concentration': mass_calc1,
-                     'Volume concentration': vol_calc1,
-                     'Number mixing ratio': no_mix_ratio1,
-                     'Mass mixing ratio': mass_mix_ratio1,
-                     'Volume mixing ratio': vol_mix_ratio1,
-                     'Extinction coefficient': extcalc1,
-                     'Scattering coefficient': scacalc1,
-                     'Absorption coefficient': abscalc1, 'SSA': ssacalc1,
-                     'g': gcalc1, 'AOD': AOD1}
-    layer2_params = {'Layer': 2,
-                     'Relative humidity': var['Layer2 relative humidity'],
-                     'Number concentration': NumDens2,
-                     'Mass concentration': mass_calc2,
-                     'Volume concentration': vol_calc2,
-                     'Number mixing ratio': no_mix_ratio2,
-                     'Mass mixing ratio': mass_mix_ratio2,
-                     'Volume mixing ratio': vol_mix_ratio2,
-                     'Extinction coefficient': extcalc2,
-                     'Scattering coefficient': scacalc2,
-                     'Absorption coefficient': abscalc2, 'SSA': ssacalc2,
-                     'g': gcalc2, 'AOD': AOD2}
-    layer3_params = {'Layer': 3,
-                     'Relative humidity': var['Layer3 relative humidity'],
-                     'Number concentration': NumDens3,
-                     'Mass concentration': mass_calc3,
-                     'Volume concentration': vol_calc3,
-                     'Number mixing ratio': no_mix_ratio3,
-                     'Mass mixing ratio': mass_mix_ratio3,
-                     'Volume mixing ratio': vol_mix_ratio3,
-                     'Extinction coefficient': extcalc3,
-                     'Scattering coefficient': scacalc3,
-                     'Absorption coefficient': abscalc3, 'SSA': ssacalc3,
-                     'g': gcalc3, 'AOD': AOD3}
-    layer4_params = {'Layer': 4,
-                     'Relative humidity': var['Layer4 relative humidity'],
-                     'Number concentration': NumDens4,
-                     'Mass concentration': mass_calc4,
-                     'Volume concentration': vol_calc4,
-                     'Number mixing ratio': no_mix_ratio4,
-                     'Mass mixing ratio': mass_mix_ratio4,
-                     'Volume mixing ratio': vol_mix_ratio4,
-                     'Extinction coefficient': extcalc4,
-                     'Scattering coefficient': scacalc4,
-                     'Absorption coefficient': abscalc4, 'SSA': ssacalc4,
-                     'g': gcalc4, 'AOD': AOD4}
-    layer5_params = {'Layer': 5,
-                     'Relative humidity': var['Layer5 relative humidity'],
-                     'Number concentration': NumDens5,
-                     'Mass concentration': mass_calc5,
-                     'Volume concentration': vol_calc5,
-                     'Number mixing ratio': no_mix_ratio5,
-                     'Mass mixing ratio': mass_mix_ratio5,
-                     'Volume mixing ratio': vol_mix_ratio5,
-                     'Extinction coefficient': extcalc5,
-                     'Scattering coefficient': scacalc5,
-                     'Absorption coefficient': abscalc5, 'SSA': ssacalc5,
-                     'g': gcalc5, 'AOD': AOD5}
-    layer6_params = {'Layer': 6,
-                     'Relative humidity': var['Layer6 relative humidity'],
-                     'Number concentration': NumDens6,
-                     'Mass concentration': mass_calc6,
-                     'Volume concentration': vol_calc6,
-                     'Number mixing ratio': no_mix_ratio6,
-                     'Mass mixing ratio': mass_mix_ratio6,
-                     'Volume mixing ratio': vol_mix_ratio6,
-                     'Extinction coefficient': extcalc6,
-                     'Scattering coefficient': scacalc6,
-                     'Absorption coefficient': abscalc6,
-                     'SSA': ssacalc6, 'g': gcalc6, 'AOD': AOD6}
-    unit_dict = {'Relative humidity': '%', 'Number concentration': '(1/cm³)',
-                 'Mass concentration': '(ug/m³)',
-                 'Volume concentration': '(um³/m³)', 'Number mixing ratio': '',
-                 'Mass mixing ratio': '', 'Volume mixing ratio': '',
-                 'Extinction coefficient': '(1/km)',
-                 'Scattering coefficient': '(1/km)',
-                 'Absorption coefficient': '(1/km)', 'SSA': '', 'g': '',
-                 'AOD': ''}
-    output = {'AeroMix version': '1.0.1',
-              'Relative humidity': var['Layer1 relative humidity'],
-              'Number concentration': NumDens1,
-              'Mass concentration': mass_calc1,
-              'Volume concentration': vol_calc1,
-              'Number mixing ratio': no_mix_ratio1,
-              'Mass mixing ratio': mass_mix_ratio1,
-              'Volume mixing ratio': vol_mix_ratio1,
-              'Extinction coefficient': extcalc1,
-              'Scattering coefficient': scacalc1,
-              'Absorption coefficient': abscalc1,
-              'SSA': ssacalc1, 'g': gcalc1,
-              'Total column AOD': TotalAOD,
-              'Layer1': layer1_params,
-              'Layer2': layer2_params,
-              'Layer3': layer3_params,
-              'Layer4': layer4_params,
-              'Layer5': layer5_params,
-              'Layer6': layer6_params,
-              'Units': unit_dict}
-    return output
+    validate_input(var)
+    if start is not None:
+        _record('Validation', start)
+    C = var['Maximum number of components']
+    components = list(range(1, C+1))
+    RH, profile_type, profile_params = _layersettings(var)
+    conc = [[var['Layer'+str(k)+' component concentration'][i]
+             for i in components] for k in range(1, n_layers+1)]
+    return AeroMixResult(var, sums=_layersums(var, conc, RH, profile_type,
+                                              profile_params))
@@ -0,0 +1,174 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+"""
+
+from collections.abc import MutableMapping
+import numpy as np
+from AeroMix.AeroMix_main import (_layersettings, _layerfield, layer_outputs,
+                                  unit_dict, n_layers)
+from AeroMix.AeroMix_instrument import _start, _record
+
+# Outputs of a layer by component number and by wavelength
+_component_outputs = ['Number concentration', 'Mass concentration',
+                      'Volume concentration', 'Number mixing ratio',
+                      'Mass mixing ratio', 'Volume mixing ratio']
+_wavelength_outputs = ['Extinction coefficient', 'Scattering coefficient',
+                       'Absorption coefficient', 'SSA', 'g', 'AOD']
+# Outputs of layer 1 which are also given at the top level
+_top_outputs = ['Relative humidity']+_component_outputs + \
+    _wavelength_outputs[:-1]
+
+
+class _LazyMapping(MutableMapping):
+    """
+    Mapping whose values are created by _value on first access and kept,
+    so that it behaves as a dictionary with the given keys.
+    """
+
+    def __init__(self, keys):
+        self._keys = list(keys)
+        self._items = {}
+
+    def __getitem__(self, key):
+        if key not in self._items:
+            if key not in self._keys:
+                raise KeyError(key)
+            self._items[key] = self._value(key)
+        return self._items[key]
+
+    def __setitem__(self, key, value):
+        if key not in self._keys:
+            self._keys.append(key)
+        self._items[key] = value
+
+    def __delitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        self._keys.remove(key)
+        self._items.pop(key, None)
+
+    def __iter__(self):
+        return iter(list(self._keys))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def to_dict(self):
+        """Return the mapping as nested dictionaries."""
+        return {key: value.to_dict() if isinstance(value, _LazyMapping)
+                else value for key, value in self.items()}
+
+
+class _LayerResult(_LazyMapping):
+    """Output parameters of one layer of an AeroMixResult."""
+
+    def __init__(self, result, layer):
+        super().__init__(['Layer', 'Relative humidity']+layer_outputs)
+        self._result = result
+        self._layer = layer
+
+    def _value(self, key):
+        result = self._result
+        k = self._layer
+        if key == 'Layer':
+            return k
+        if key == 'Relative humidity':
+            return result._RH[k-1]
+        if result._thin[k-1]:
+            if key == 'AOD':
+                return {i: np.nan for i in result._wavelengths}
+            return np.nan
+        start = _start()
+        labels = (result._components if key in _component_outputs else
+                  result._wavelengths)
+        value = dict(zip(labels, result.array(key)[k-1]))
+        if start is not None:
+            _record('Result dictionaries', start, k)
+        return value
+
+
+class AeroMixResult(_LazyMapping):
+    """
+    Output of AeroMix.run.
+
+    The result is a mapping with the keys and values of the output
+    dictionary described in the documentation, e.g.
+    result['Layer1']['AOD'][0.55] or result['Total column AOD'][0.55]. The
+    values are created from arrays of all layers when first accessed, so
+    that outputs which are not used are not computed. array() returns these
+    arrays and to_dict() converts the result to nested dictionaries.
+
+    Parameters
+    ----------
+    input_dict : The input dictionary of the result.
+    arrays : Optional dictionary of the output arrays of the six layers, as
+        returned by AeroMix.run_layers. The default is None.
+    sums : Optional component sums of the layers from which the output
+        arrays are computed, for results of AeroMix.run. The default is None.
+
+    """
+
+    def __init__(self, input_dict, arrays=None, sums=None):
+        super().__init__(['AeroMix version']+_top_outputs +
+                         ['Total column AOD'] +
+                         ['Layer'+str(k) for k in range(1, n_layers+1)] +
+                         ['Units'])
+        var = input_dict
+        self._wavelengths = list(var['Wavelengths'])
+        self._components = list(range(1, var['Maximum number of components']
+                                      + 1))
+        self._RH, profile_type, profile_params = _layersettings(var)
+        self._thin = [params[1]-params[0] == 0 for params in profile_params]
+        self._arrays = {} if arrays is None else dict(arrays)
+        self._sums = sums
+
+    def array(self, key):
+        """
+        Output array of all layers.
+
+        Parameters
+        ----------
+        key : Name of an output parameter of the layers, 'Total column AOD',
+            'Relative humidity' or 'Wavelengths'.
+
+        Returns
+        -------
+        Array of shape (6 x components) for the concentrations and mixing
+        ratios, (6 x wavelengths) for the optical properties,
+        (wavelengths) for 'Total column AOD' and 'Wavelengths' and (6) for
+        'Relative humidity'.
+
+        """
+        if key == 'Wavelengths':
+            return np.array(self._wavelengths, dtype=float)
+        if key == 'Relative humidity':
+            return np.array(self._RH, dtype=float)
+        if key not in self._arrays:
+            if self._sums is None or key not in layer_outputs + \
+                    ['Total column AOD']:
+                raise KeyError(key)
+            _layerfield(self._sums, key, self._arrays)
+        return self._arrays[key]
+
+    def _value(self, key):
+        if key == 'AeroMix version':
+            return '1.0.1'
+        if key == 'Units':
+            return dict(unit_dict)
+        if key == 'Total column AOD':
+            start = _start()
+            value = dict(zip(self._wavelengths, self.array(key)))
+            if start is not None:
+                _record('Result dictionaries', start)
+            return value
+        if key.startswith('Layer'):
+            return _LayerResult(self, int(key[5:]))
+        return self['Layer1'][key]
@@ -0,0 +1,346 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+"""
+
+import numpy as np
+from scipy.optimize import nnls
+from AeroMix.AeroMix_main import (_ValidateSettings, _ValidateRH,
+                                  _ValidateProfile, _profilefactor, n_layers)
+from AeroMix.HumidityTensor import _humidityoptics, _humiditytensor
+from AeroMix.AeroMix_exceptions import (InputError, RelativeHumidityError,
+                                        ComponentError, ProfileError,
+                                        ComponentDataError)
+
+# Observations that can be fitted. The coefficients and the AOD are linear in
+# the concentrations, SSA and g are fitted as the linear constraints
+# ext x SSA - SSA(obs) x ext = 0 and sca x g - g(obs) x sca = 0.
+observables = ['AOD', 'Extinction coefficient', 'Scattering coefficient',
+               'Absorption coefficient', 'SSA', 'g']
+# Default uncertainties of the observations, relative to the observed value
+# for the AOD and the coefficients and absolute for SSA and g
+default_relative_uncertainty = 0.02
+default_uncertainty = {'SSA': 0.03, 'g': 0.03}
+
+# Column of the design array of each linear observation
+_linear_columns = {'AOD': 0, 'Extinction coefficient': 0,
+                   'Scattering coefficient': 1, 'Absorption coefficient': 2}
+
+# Function to return the design array of (observations x components x
+# wavelengths x 5) holding ext., sca. and abs. coeff., ext x SSA and
+# sca x g per unit concentration of each component, in the input unit.
+# Components without data get zero columns and are not fitted.
+
+
+def _designarray(optarray, available, mean_mass, input_unit):
+    design = np.empty(optarray.shape[:-1]+(5,))
+    design[..., :3] = optarray[..., :3]
+    design[..., 3] = optarray[..., 0]*optarray[..., 3]
+    design[..., 4] = optarray[..., 1]*optarray[..., 4]
+    if input_unit == 1:
+        # Conversion of mass concentration to number concentration
+        available = available & (mean_mass > 0)
+        inv_mass = np.divide(1.0, mean_mass, out=np.zeros_like(mean_mass),
+                             where=mean_mass > 0)
+        design = design*inv_mass[..., np.newaxis, np.newaxis]
+    design = np.where(available[..., np.newaxis, np.newaxis], design, 0.0)
+    return design, available
+
+# Function to return the first positive finite value of a list of arrays at
+# each element, NaN where there is none
+
+
+def _firstpositive(arrays, shape):
+    result = np.full(shape, np.nan)
+    for array in arrays:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            array = np.broadcast_to(array, shape)
+            usable = np.isnan(result) & np.isfinite(array) & (array > 0)
+        result = np.where(usable, array, result)
+    return result
+
+# Function to return the reference extinction and scattering coefficients
+# (observations x wavelengths) scaling the SSA and g constraints, taken from
+# the observations. Wavelengths without extinction or scattering
+# observations get the mean of the others.
+
+
+def _references(obs, factor, shape):
+    ext = obs.get('Extinction coefficient')
+    sca = obs.get('Scattering coefficient')
+    absc = obs.get('Absorption coefficient')
+    ssa = obs.get('SSA')
+    candidates = []
+    if ext is not None:
+        candidates.append(ext)
+    if 'AOD' in obs:
+        candidates.append(obs['AOD']/factor)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if sca is not None and absc is not None:
+            candidates.append(sca+absc)
+        if sca is not None and ssa is not None:
+            candidates.append(sca/ssa)
+        if absc is not None and ssa is not None:
+            candidates.append(absc/(1-ssa))
+    ext_ref = _firstpositive(candidates, shape)
+    candidates = [] if sca is None else [sca]
+    if ssa is not None:
+        candidates.append(ext_ref*ssa)
+    candidates.append(ext_ref)
+    sca_ref = _firstpositive(candidates, shape)
+    refs = []
+    for ref in (ext_ref, sca_ref):
+        count = np.sum(~np.isnan(ref), axis=1, keepdims=True)
+        # Observations without any positive extinction have the zero
+        # solution, for which the scaling does not matter
+        mean = np.where(count > 0, np.nansum(ref, axis=1, keepdims=True) /
+                        np.maximum(count, 1), 1.0)
+        refs.append(np.where(np.isnan(ref), mean, ref))
+    return refs
+
+# Function to build the weighted least-squares system of all observations,
+# of shape (observations x rows x components) and (observations x rows).
+# Missing (NaN) observations give zero rows.
+
+
+def _system(design, factor, obs, sigma):
+    shape = next(iter(obs.values())).shape
+    ext_ref, sca_ref = _references(obs, factor, shape)
+    rows = []
+    rhs = []
+    for key in observables:
+        if key not in obs:
+            continue
+        value = obs[key]
+        observed = ~np.isnan(value)
+        if key in _linear_columns:
+            scale = factor if key == 'AOD' else 1.0
+            rows.append(scale*design[..., _linear_columns[key]] /
+                        sigma[key][:, np.newaxis, :])
+            rhs.append(np.where(observed, value/sigma[key], 0.0))
+        elif key == 'SSA':
+            rows.append((design[..., 3]-value[:, np.newaxis, :] *
+                         design[..., 0])/(ext_ref*sigma[key])[:, np.newaxis])
+            rhs.append(np.zeros(shape))
+        else:
+            rows.append((design[..., 4]-value[:, np.newaxis, :] *
+                         design[..., 1])/(sca_ref*sigma[key])[:, np.newaxis])
+            rhs.append(np.zeros(shape))
+        rows[-1] = np.where(observed[:, np.newaxis, :], rows[-1], 0.0)
+    # (observations x components x rows) to (observations x rows x components)
+    A = np.swapaxes(np.concatenate(rows, axis=2), 1, 2)
+    return A, np.concatenate(rhs, axis=1)
+
+# Function to solve the non-negative least-squares problem of one
+# observation for the components in fit. The columns are scaled to unit
+# norm, which also scales the ridge penalty of the regularization.
+
+
+def _solve(A, b, fit, regularization):
+    C = A.shape[1]
+    conc = np.zeros(C)
+    if not np.any(fit):
+        return conc, float(np.sqrt(np.sum(b**2)))
+    A_fit = A[:, fit]
+    norm = np.sqrt(np.sum(A_fit**2, axis=0))
+    norm[norm == 0] = 1.0
+    A_fit = A_fit/norm
+    if regularization > 0:
+        n = A_fit.shape[1]
+        x, rnorm = nnls(np.vstack([A_fit, np.sqrt(regularization)*np.eye(n)]),
+                        np.concatenate([b, np.zeros(n)]))
+    else:
+        x, rnorm = nnls(A_fit, b)
+    conc[fit] = x/norm
+    return conc, float(np.sqrt(np.sum((A_fit@x-b)**2)))
+
+# Function to return the optical properties of the fitted mixtures
+
+
+def _fitted(design, factor, conc):
+    mixed = np.einsum('nc,ncwp->nwp', conc, design)
+    empty = ~np.any(conc != 0, axis=1)[:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ssa = np.where(empty, np.nan, mixed[..., 3]/mixed[..., 0])
+        g = np.where(empty, np.nan, mixed[..., 4]/mixed[..., 1])
+    return {'AOD': mixed[..., 0]*factor,
+            'Extinction coefficient': mixed[..., 0],
+            'Scattering coefficient': mixed[..., 1],
+            'Absorption coefficient': mixed[..., 2], 'SSA': ssa, 'g': g}
+
+
+def retrieve_batch(input_dict, observations, relative_humidity=None, layer=1,
+                   uncertainties=None, regularization=0.0, components=None):
+    """
+    Retrieve the component concentrations of many aerosol mixtures from
+    observed spectral optical properties.
+
+    The optical properties of a mixture are linear in the component
+    concentrations, so the concentrations are fitted by non-negative least
+    squares on a components x wavelengths design matrix built once from the
+    component data, without running AeroMix for trial mixtures.
+
+    Parameters
+    ----------
+    input_dict : A dictionary containing the input parameters for the AeroMix,
+        in the same format as for AeroMix.run. The wavelengths are those of
+        the observations, the concentrations are retrieved in the input unit
+        and the relative humidity and the profile of the layer are used. The
+        component concentrations are ignored.
+    observations : Dictionary with any of 'AOD', 'Extinction coefficient',
+        'Scattering coefficient', 'Absorption coefficient', 'SSA' and 'g', as
+        defined in AeroMix.run, each an array of shape (observations x
+        wavelengths). Missing values are NaN. At least one of the AOD and the
+        coefficients should be given.
+    relative_humidity : Optional array of shape (observations) holding the
+        relative humidity (%) of each observation, between 0 and 99. The
+        default is None, which uses the relative humidity of the layer in
+        input_dict for all observations.
+    layer : Number of the layer (1-6) of input_dict whose mixture is
+        retrieved. The AOD is that of the layer, i.e. the extinction
+        coefficient times the profile factor of the layer. The default is 1.
+    uncertainties : Optional dictionary of the standard deviations of the
+        observations, each a single value or an array of the shape of the
+        observation. The defaults are 2% of the observed value for the AOD
+        and the coefficients and 0.03 for SSA and g.
+    regularization : Weight of a ridge penalty on the concentrations, scaled
+        by the norms of their columns in the weighted design matrix. Values
+        of about 1e-3 to 1e-1 stabilize the retrieval of components with
+        similar spectra. The default is 0.
+    components : Optional list of the numbers of the components to retrieve.
+        The other components are zero. The default is None, which retrieves
+        all components with data at the relative humidity.
+
+    Returns
+    -------
+    Dictionary with 'Component concentration' of shape (observations x
+    components), in the input unit, with component n at index n-1,
+    'Residual norm' of shape (observations), the norm of the residuals
+    divided by the uncertainties, and 'Fitted', a dictionary of the
+    optical properties of the retrieved mixtures for all observables, of
+    shape (observations x wavelengths).
+
+    """
+    var = input_dict
+    _ValidateSettings(var)
+    if layer not in range(1, n_layers+1):
+        raise InputError("Invalid layer number")
+    unknown = [key for key in observations if key not in observables]
+    if unknown:
+        raise InputError("Unknown observation "+unknown[0])
+    W = len(var['Wavelengths'])
+    obs = {key: np.atleast_2d(np.asarray(value, dtype=float))
+           for key, value in observations.items()}
+    shapes = set(value.shape for value in obs.values())
+    if len(shapes) != 1 or next(iter(shapes))[1] != W:
+        raise InputError("Observations should be arrays of shape "
+                         "(observations, "+str(W)+")")
+    N = next(iter(shapes))[0]
+    if not any(key in _linear_columns for key in obs):
+        raise InputError("At least one of the AOD, extinction, scattering and "
+                         "absorption coefficients should be observed")
+
+    prefix = 'Layer'+str(layer)+' '
+    _ValidateProfile(var[prefix+'profile type'], var[prefix+'profile params'],
+                     prefix+'profile params')
+    factor = _profilefactor(var[prefix+'profile type'],
+                            var[prefix+'profile params'])
+    if 'AOD' in obs and not factor > 0:
+        raise ProfileError("AOD observed for a layer with zero thickness")
+    if relative_humidity is None:
+        RH = var[prefix+'relative humidity']
+        _ValidateRH(RH)
+        optarray, available, mean_vol, mean_mass = _humidityoptics(var, RH)
+        optarray, available, mean_mass = (optarray[np.newaxis],
+                                          available[np.newaxis],
+                                          mean_mass[np.newaxis])
+    else:
+        RH = np.asarray(relative_humidity, dtype=float)
+        if RH.shape != (N,):
+            raise RelativeHumidityError("Relative humidity array should be of "
+                                        "shape (observations)")
+        interpolated = _humiditytensor(var).interpolate(RH)
+        optarray = interpolated['Optical data']
+        available = interpolated['Available']
+        mean_mass = interpolated['Mean mass']
+    design, available = _designarray(optarray, available, mean_mass,
+                                     var['Input unit'])
+
+    C = var['Maximum number of components']
+    selected = np.ones(C, dtype=bool)
+    if components is not None:
+        selected[:] = False
+        for i in components:
+            if i not in range(1, C+1):
+                raise ComponentError("Invalid component number")
+            selected[i-1] = True
+        if not np.all(available[:, selected]):
+            raise ComponentDataError("Component file not found for a "
+                                     "retrieved component")
+    fit = np.broadcast_to(available & selected, (N, C))
+
+    sigma = {}
+    for key, value in obs.items():
+        if uncertainties is not None and key in uncertainties:
+            sigma[key] = np.broadcast_to(np.asarray(
+                uncertainties[key], dtype=float), (N, W))
+        elif key in default_uncertainty:
+            sigma[key] = np.full((N, W), default_uncertainty[key])
+        else:
+            sigma[key] = default_relative_uncertainty*np.abs(value)
+        # Zero uncertainties are replaced by the smallest positive one
+        positive = sigma[key][sigma[key] > 0]
+        sigma[key] = np.where(sigma[key] > 0, sigma[key],
+                              positive.min() if positive.size else 1.0)
+
+    design = np.broadcast_to(design, (N,)+design.shape[1:])
+    A, b = _system(design, factor, obs, sigma)
+    conc = np.zeros((N, C))
+    residual = np.zeros(N)
+    for n in range(N):
+        conc[n], residual[n] = _solve(A[n], b[n], fit[n], regularization)
+    return {'Component concentration': conc, 'Residual norm': residual,
+            'Fitted': _fitted(design, factor, conc)}
+
+
+def retrieve(input_dict, observations, layer=1, uncertainties=None,
+             regularization=0.0, components=None):
+    """
+    Retrieve the component concentrations of an aerosol mixture from
+    observed spectral optical properties.
+
+    Parameters
+    ----------
+    input_dict : A dictionary containing the input parameters for the AeroMix,
+        as for AeroMix.retrieve_batch.
+    observations : Dictionary with any of 'AOD', 'Extinction coefficient',
+        'Scattering coefficient', 'Absorption coefficient', 'SSA' and 'g',
+        each a list of values at the wavelengths of input_dict. Missing
+        values are NaN.
+    layer, uncertainties, regularization, components : As for
+        AeroMix.retrieve_batch.
+
+    Returns
+    -------
+    Dictionary with 'Component concentration', a dictionary of the
+    retrieved concentrations in the input unit by component number as in
+    'Layerx component concentration' of input_dict, 'Residual norm' and
+    'Fitted', a dictionary of the optical properties of the retrieved
+    mixture by wavelength.
+
+    """
+    observations = {key: np.asarray(value, dtype=float)[np.newaxis]
+                    for key, value in observations.items()}
+    if uncertainties is not None:
+        uncertainties = {key: np.asarray(value, dtype=float)
+                         for key, value in uncertainties.items()}
+    result = retrieve_batch(input_dict, observations, None, layer,
+                            uncertainties, regularization, components)
+    C = input_dict['Maximum number of components']
+    wavelengths = input_dict['Wavelengths']
+    return {'Component concentration': dict(zip(
+                range(1, C+1), result['Component concentration'][0])),
+            'Residual norm': result['Residual norm'][0],
+            'Fitted': {key: dict(zip(wavelengths, value[0]))
+                       for key, value in result['Fitted'].items()}}
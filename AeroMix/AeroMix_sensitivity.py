@@ -0,0 +1,128 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+"""
+
+import copy
+import numpy as np
+from AeroMix.AeroMix_main import (validate_input, _layersettings,
+                                  _layersums, _layerfield, unit_dict,
+                                  n_layers)
+from AeroMix.HumidityTensor import _humidityoptics
+
+
+def run_jacobian(input_dict):
+    """
+    Calculate the optical properties of the layers and their derivatives
+    with respect to the component concentrations.
+
+    The extinction, scattering and absorption coefficients and the AOD are
+    linear in the concentrations, so their derivatives are the optical
+    properties of the components per unit concentration. The derivatives of
+    SSA and g follow from the quotient rule, e.g.
+    dSSA/dN = ext(component) x (SSA(component) - SSA)/ext for a number
+    concentration N. Values and derivatives are computed together for all
+    layers, wavelengths and components.
+
+    Parameters
+    ----------
+    input_dict : A dictionary containing the input parameters for the AeroMix,
+        in the same format as for AeroMix.run.
+
+    Returns
+    -------
+    Dictionary with 'Extinction coefficient', 'Scattering coefficient',
+    'Absorption coefficient', 'SSA', 'g' and 'AOD' of shape
+    (6 x wavelengths), 'Total column AOD' of shape (wavelengths), as in
+    AeroMix.run, and 'Jacobian', a dictionary of the derivatives of these
+    outputs with respect to the concentrations in the input unit.
+    The derivatives of the layer outputs have the shape
+    (6 x wavelengths x components), with the derivative of the output of
+    layer k at a wavelength with respect to the concentration of component
+    n in layer k at [k-1, wavelength, n-1]. The derivatives of
+    'Total column AOD' have the shape (wavelengths x 6 x components), with
+    the derivative with respect to the concentration of component n in
+    layer k at [wavelength, k-1, n-1]. Derivatives are NaN for layers with
+    zero thickness, for components without data at the relative humidity of
+    a layer and, for SSA and g, for layers without aerosol.
+
+    """
+    var = copy.deepcopy(input_dict)
+    validate_input(var)
+    C = var['Maximum number of components']
+    W = len(var['Wavelengths'])
+    RH, profile_type, profile_params = _layersettings(var)
+    conc = np.array([[var['Layer'+str(k)+' component concentration'][i]
+                      for i in range(1, C+1)] for k in range(1, n_layers+1)],
+                    dtype=float)
+    thin = np.array([profile_params[k][1]-profile_params[k][0] == 0
+                     for k in range(n_layers)])
+
+    # Optical data of the components in each layer, shared by the layers
+    # with the same relative humidity
+    optics = {rh: _humidityoptics(var, rh)
+              for rh in set(RH[k] for k in range(n_layers) if not thin[k])}
+    optarray = np.zeros((n_layers, C, W, 8))
+    available = np.zeros((n_layers, C), dtype=bool)
+    mean_mass = np.zeros((n_layers, C))
+    for rh, loaded in optics.items():
+        layers = [k for k in range(n_layers) if RH[k] == rh and not thin[k]]
+        optarray[layers] = loaded[0]
+        available[layers] = loaded[1]
+        mean_mass[layers] = loaded[3]
+
+    # Values, as in AeroMix.run
+    sums = _layersums(var, conc, RH, profile_type, profile_params, optics)
+    cache = {}
+    ext, sca, absc, ssa, g, AOD, TotalAOD = [
+        _layerfield(sums, key, cache) for key in (
+            'Extinction coefficient', 'Scattering coefficient',
+            'Absorption coefficient', 'SSA', 'g', 'AOD', 'Total column AOD')]
+
+    # Number concentration per unit input concentration
+    if var['Input unit'] == 1:
+        per_unit = np.divide(1.0, mean_mass, out=np.zeros_like(mean_mass),
+                             where=mean_mass != 0)
+    else:
+        per_unit = np.ones((n_layers, C))
+
+    # Derivatives of the linear sums (layers x wavelengths x components)
+    d_ext = np.moveaxis(optarray[..., 0]*per_unit[..., np.newaxis], 1, 2)
+    d_sca = np.moveaxis(optarray[..., 1]*per_unit[..., np.newaxis], 1, 2)
+    d_abs = np.moveaxis(optarray[..., 2]*per_unit[..., np.newaxis], 1, 2)
+    d_ssa_num = d_ext*np.moveaxis(optarray[..., 3], 1, 2)
+    d_g_num = d_sca*np.moveaxis(optarray[..., 4], 1, 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Quotient rule
+        d_ssa = (d_ssa_num-ssa[..., np.newaxis]*d_ext)/ext[..., np.newaxis]
+        d_g = (d_g_num-g[..., np.newaxis]*d_sca)/sca[..., np.newaxis]
+    d_AOD = d_ext*sums['factor'][:, np.newaxis, np.newaxis]
+
+    # Layers with zero thickness and components without data
+    undefined = thin[:, np.newaxis, np.newaxis] | \
+        ~available[:, np.newaxis, :]
+    if var['Input unit'] == 1:
+        undefined = undefined | (mean_mass == 0)[:, np.newaxis, :]
+    d_ext, d_sca, d_abs, d_ssa, d_g, d_AOD = [
+        np.where(undefined, np.nan, array)
+        for array in (d_ext, d_sca, d_abs, d_ssa, d_g, d_AOD)]
+    # Layers with zero thickness do not change the column AOD
+    d_TotalAOD = np.moveaxis(np.where(thin[:, np.newaxis, np.newaxis], 0.0,
+                                      d_AOD), 0, 1)
+
+    output = {'AeroMix version': '1.0.1',
+              'Wavelengths': np.array(var['Wavelengths'], dtype=float),
+              'Relative humidity': np.array(RH, dtype=float),
+              'Extinction coefficient': ext,
+              'Scattering coefficient': sca,
+              'Absorption coefficient': absc,
+              'SSA': ssa, 'g': g, 'AOD': AOD,
+              'Total column AOD': TotalAOD,
+              'Jacobian': {'Extinction coefficient': d_ext,
+                           'Scattering coefficient': d_sca,
+                           'Absorption coefficient': d_abs,
+                           'SSA': d_ssa, 'g': d_g, 'AOD': d_AOD,
+                           'Total column AOD': d_TotalAOD},
+              'Units': dict(unit_dict)}
+    return output
@@ -0,0 +1,411 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+
+Local AeroMix server keeping the component data warm between requests, e.g.
+
+    python -m AeroMix serve --socket /tmp/aeromix.sock
+
+and its asyncio client
+
+    async with AeroMixClient('/tmp/aeromix.sock') as client:
+        output = await client.run(input_dict)
+
+Requests and results are exchanged as one JSON object per line over a Unix
+socket or a localhost TCP connection. Requests arriving within a short time
+window are evaluated together with run_batch.
+"""
+
+import sys
+import json
+import asyncio
+import argparse
+import contextlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from AeroMix.AeroMix_main import n_layers
+from AeroMix.AeroMix_batch import _evaluatescenarios, _jsonvalue
+from AeroMix import AeroMix_exceptions
+from AeroMix.AeroMix_exceptions import AeroMixError
+from AeroMix.AeroMix_result import AeroMixResult
+from AeroMix.HumidityTensor import _humiditytensor
+from AeroMix.getAerosolType import getAerosolType
+
+default_port = 8750
+# Line length limit of the streams, large enough for many wavelengths
+_stream_limit = 2**26
+
+# Function to return the error response of an exception, with the key of the
+# input that caused it
+
+
+def _errorresponse(error):
+    return {'error': str(error) or type(error).__name__,
+            'type': type(error).__name__, 'key': getattr(error, 'key', None)}
+
+# Function to read the input dictionary of a request, in place. JSON object
+# keys are text, so the component numbers are converted back to integers.
+
+
+def _requestinput(var):
+    for k in range(1, n_layers+1):
+        key = 'Layer'+str(k)+' component concentration'
+        if isinstance(var.get(key), dict):
+            var[key] = {int(i): c for i, c in var[key].items()}
+    return var
+
+# Function to convert arrays and numpy numbers of an input dictionary to
+# JSON values
+
+
+def _jsondefault(value):
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(type(value).__name__+' is not JSON serializable')
+
+# Function to evaluate the input dictionaries of one micro-batch. An
+# invalid request is answered with its error and does not fail the others.
+
+
+def _evaluatebatch(requests):
+    results = [None]*len(requests)
+    inputs = []
+    index = []
+    for i, input_dict in enumerate(requests):
+        try:
+            inputs.append(_requestinput(input_dict))
+            index.append(i)
+        except Exception as error:
+            results[i] = _errorresponse(error)
+    for i, output in zip(index, _evaluatescenarios(inputs)):
+        if isinstance(output, Exception):
+            results[i] = _errorresponse(output)
+        else:
+            results[i] = {'result': {key: _jsonvalue(value)
+                                     for key, value in output.items()}}
+    return results
+
+
+class AeroMixServer:
+    """
+    Local server evaluating AeroMix input dictionaries with the component
+    data kept in memory.
+
+    Requests received within batch_window seconds of each other are
+    evaluated together in one run_batch call per group of requests sharing
+    the same wavelengths, component settings and vertical profiles, in a
+    worker thread, while the next requests are collected.
+
+    Parameters
+    ----------
+    path : Path of the Unix socket to listen on. The default is None, which
+        listens on host and port.
+    host : Host to listen on if path is None. The default is '127.0.0.1'.
+    port : Port to listen on if path is None. The default is 8750.
+    batch_window : Time (s) requests are collected before a batch is
+        evaluated. The default is 0.001.
+    max_batch : Maximum number of requests evaluated together. The default
+        is 1024.
+    warm_wavelengths : Optional list of wavelengths (µm) for which the
+        component data of the default component files are loaded when the
+        server starts. The default is None.
+
+    """
+
+    def __init__(self, path=None, host='127.0.0.1', port=default_port,
+                 batch_window=0.001, max_batch=1024, warm_wavelengths=None):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.warm_wavelengths = warm_wavelengths
+        self._server = None
+        self._batcher = None
+        self._queue = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def start(self):
+        """Load the component data and start listening."""
+        loop = asyncio.get_running_loop()
+        if self.warm_wavelengths is not None:
+            var = getAerosolType('default', list(self.warm_wavelengths), 0)
+            await loop.run_in_executor(self._executor, _humiditytensor, var)
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.ensure_future(self._batchloop())
+        if self.path is not None:
+            self._server = await asyncio.start_unix_server(
+                self._handle, path=self.path, limit=_stream_limit)
+        else:
+            self._server = await asyncio.start_server(
+                self._handle, host=self.host, port=self.port,
+                limit=_stream_limit)
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        """Start the server if needed and serve until cancelled."""
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        """Stop listening and stop the batch evaluation."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._batcher is not None:
+            self._batcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._batcher
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # Reads the requests of one connection. Each request is answered when its
+    # batch has been evaluated, in any order.
+    async def _handle(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(self._answer(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _answer(self, line, writer, lock):
+        try:
+            request = json.loads(line)
+            ident = request.get('id')
+            input_dict = request['input']
+        except (ValueError, KeyError, TypeError, AttributeError):
+            ident = None
+            input_dict = None
+        if not isinstance(input_dict, dict):
+            response = {'error': 'Invalid request', 'type': 'InputError'}
+        else:
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put((input_dict, future))
+            response = await future
+        response['id'] = ident
+        async with lock:
+            writer.write((json.dumps(response)+'\n').encode())
+            await writer.drain()
+
+    # Collects the requests of a time window into micro-batches
+    async def _batchloop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time()+self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline-loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(),
+                                                        timeout))
+                except asyncio.TimeoutError:
+                    break
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, _evaluatebatch,
+                    [var for var, future in batch])
+            except Exception as error:
+                results = [_errorresponse(error)]*len(batch)
+            for (var, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(dict(result))
+
+
+class AeroMixClient:
+    """
+    Asyncio client of an AeroMixServer.
+
+    Any number of requests can be awaited concurrently over one connection,
+    so that they are evaluated in the same batch.
+
+    Parameters
+    ----------
+    path : Path of the Unix socket of the server. The default is None, which
+        connects to host and port.
+    host : Host of the server if path is None. The default is '127.0.0.1'.
+    port : Port of the server if path is None. The default is 8750.
+
+    """
+
+    def __init__(self, path=None, host='127.0.0.1', port=default_port):
+        self.path = path
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+        self._listener = None
+        self._pending = {}
+        self._count = 0
+
+    async def connect(self):
+        """Open the connection to the server."""
+        if self.path is not None:
+            self._reader, self._writer = await asyncio.open_unix_connection(
+                self.path, limit=_stream_limit)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(
+                self.host, self.port, limit=_stream_limit)
+        self._listener = asyncio.ensure_future(self._listen())
+
+    async def close(self):
+        """Close the connection."""
+        if self._writer is not None:
+            self._writer.close()
+            with contextlib.suppress(ConnectionError):
+                await self._writer.wait_closed()
+        if self._listener is not None:
+            await self._listener
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def run(self, input_dict):
+        """
+        Calculate the optical and physical properties of aerosols on the
+        server.
+
+        Parameters
+        ----------
+        input_dict : A dictionary containing the input parameters for the
+            AeroMix, as for AeroMix.run.
+
+        Returns
+        -------
+        AeroMixResult of the output parameters, as returned by AeroMix.run.
+        The results agree with AeroMix.run to rounding.
+
+        Raises
+        ------
+        The error of an invalid input raised on the server, e.g.
+        AeroMix.RelativeHumidityError, or AeroMixError for other errors, with
+        the key of the input that caused it in the attribute key.
+
+        """
+        if self._writer is None:
+            await self.connect()
+        self._count += 1
+        ident = self._count
+        future = asyncio.get_running_loop().create_future()
+        self._pending[ident] = future
+        self._writer.write((json.dumps({'id': ident, 'input': input_dict},
+                                       default=_jsondefault)+'\n').encode())
+        await self._writer.drain()
+        response = await future
+        if 'error' in response:
+            # Errors of AeroMix are raised with their type, others as
+            # AeroMixError
+            error = getattr(AeroMix_exceptions, response.get('type', ''),
+                            None)
+            if not (isinstance(error, type) and
+                    issubclass(error, AeroMixError)):
+                error = AeroMixError
+            raise error(response['error'], response.get('key'))
+        result = {key: np.array(value, dtype=float)
+                  for key, value in response['result'].items()}
+        return AeroMixResult(input_dict, arrays=result)
+
+    # Passes the responses of the server to the waiting requests
+    async def _listen(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self._pending.pop(response['id'], None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except ConnectionError:
+            pass
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_result({'error': 'Error: Connection to the '
+                                       'AeroMix server closed'})
+            self._pending.clear()
+
+
+def serve(path=None, host='127.0.0.1', port=default_port, batch_window=0.001,
+          max_batch=1024, warm_wavelengths=None):
+    """
+    Run an AeroMixServer until interrupted.
+
+    Parameters
+    ----------
+    path, host, port, batch_window, max_batch, warm_wavelengths : As for
+        AeroMixServer.
+
+    """
+    server = AeroMixServer(path, host, port, batch_window, max_batch,
+                           warm_wavelengths)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    """
+    Run an AeroMixServer from the command line.
+
+    Parameters
+    ----------
+    argv : List of command line arguments after 'serve'. The default is
+        sys.argv[2:].
+
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m AeroMix serve',
+        description='Serve AeroMix requests with the component data kept in '
+        'memory.')
+    parser.add_argument('--socket', help='path of a Unix socket to listen on '
+                        '(default: listen on --host and --port)')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='host to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=default_port,
+                        help='port to listen on (default: '
+                        + str(default_port)+')')
+    parser.add_argument('--batch-window', type=float, default=0.001,
+                        help='time (s) requests are collected before a batch '
+                        'is evaluated (default: 0.001)')
+    parser.add_argument('--max-batch', type=int, default=1024,
+                        help='maximum number of requests evaluated together '
+                        '(default: 1024)')
+    parser.add_argument('--warm-wavelengths',
+                        help='comma separated wavelengths (µm) for which the '
+                        'default component data are loaded at start')
+    args = parser.parse_args(sys.argv[2:] if argv is None else argv)
+    warm = (None if args.warm_wavelengths is None else
+            [float(w) for w in args.warm_wavelengths.split(',')])
+    serve(args.socket, args.host, args.port, args.batch_window,
+          args.max_batch, warm)
@@ -0,0 +1,276 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+"""
+
+import copy
+import numpy as np
+from AeroMix.AeroMix_main import (validate_input, _layersettings,
+                                  _profilefactor, n_layers)
+from AeroMix.HumidityTensor import _humiditytensor
+from AeroMix.AeroMix_exceptions import InputError, ProfileError
+
+# Output fields of run_uncertainty. 'Total column AOD' has one value per
+# wavelength and the others one value per layer and wavelength.
+uncertainty_fields = ['Total column AOD', 'AOD', 'Extinction coefficient',
+                      'Scattering coefficient', 'Absorption coefficient',
+                      'SSA', 'g']
+default_fields = ['Total column AOD', 'AOD', 'SSA']
+default_percentiles = [2.5, 16, 50, 84, 97.5]
+
+# Function to draw lognormal samples with the nominal values as mean and
+# standard deviations relative to them. Zero values stay zero.
+
+
+def _lognormal(rng, nominal, relative, samples):
+    sigma = np.sqrt(np.log1p(np.asarray(relative, dtype=float)**2))
+    normal = rng.standard_normal((samples,)+nominal.shape)
+    return nominal*np.exp(sigma*normal-sigma**2/2)
+
+# Function to calculate the profile factor of a layer for arrays of profile
+# params (samples x params), as _profilefactor
+
+
+def _profilefactors(profile_type, params):
+    p = [params[:, i] for i in range(params.shape[1])]
+    if profile_type == 0:
+        return p[2]*(np.exp(-p[0]/p[2])-np.exp(-p[1]/p[2]))
+    if profile_type == 1:
+        return p[1]-p[0]
+    return (p[2]/4)*(p[1]**4-p[0]**4)+(p[3]/3)*(p[1]**3-p[0]**3) + \
+        (p[4]/2)*(p[1]**2-p[0]**2)+p[5]*(p[1]-p[0])
+
+# Function to return the relative standard deviations of the profile params
+# of each layer. A single value applies to the scale heights of the layers
+# with exponential profiles.
+
+
+def _profilesigma(profile_uncertainty, profile_type, profile_params):
+    sigma = [np.zeros(len(params)) for params in profile_params]
+    if profile_uncertainty is None:
+        return sigma
+    if isinstance(profile_uncertainty, dict):
+        for layer, values in profile_uncertainty.items():
+            if layer not in range(1, n_layers+1) or \
+                    len(values) != len(profile_params[layer-1]):
+                raise ProfileError("Profile uncertainty should give one value "
+                                   "per profile param of a layer (1-6)")
+            sigma[layer-1] = np.asarray(values, dtype=float)
+    else:
+        for k in range(n_layers):
+            if profile_type[k] == 0:
+                sigma[k][2] = profile_uncertainty
+    return sigma
+
+
+class _StreamingStatistics:
+    """
+    Mean, covariance and a uniform reservoir sample of vectors added in
+    chunks, with memory independent of the number of vectors.
+    """
+
+    def __init__(self, size, reservoir_size, rng):
+        self.count = 0
+        self.mean = np.zeros(size)
+        self.comoment = np.zeros((size, size))
+        self.reservoir = np.empty((reservoir_size, size))
+        self.rng = rng
+
+    def update(self, chunk):
+        n = chunk.shape[0]
+        mean = chunk.mean(axis=0)
+        centred = chunk-mean
+        # Pairwise merge of the moments (Chan et al.)
+        total = self.count+n
+        delta = mean-self.mean
+        self.comoment += centred.T@centred+np.outer(delta, delta)*(
+            self.count*n/total)
+        self.mean += delta*(n/total)
+        # Reservoir sampling (algorithm R)
+        R = self.reservoir.shape[0]
+        fill = min(max(R-self.count, 0), n)
+        self.reservoir[self.count:self.count+fill] = chunk[:fill]
+        if fill < n:
+            index = self.count+np.arange(fill, n)
+            slot = (self.rng.random(n-fill)*(index+1)).astype(np.int64)
+            keep = slot < R
+            self.reservoir[slot[keep]] = chunk[fill:][keep]
+        self.count = total
+
+    def covariance(self):
+        return self.comoment/max(self.count-1, 1)
+
+    def percentiles(self, levels):
+        return np.percentile(self.reservoir[:min(self.count,
+                                                 len(self.reservoir))],
+                             levels, axis=0)
+
+# Function to calculate the output fields of the samples of one chunk, as
+# arrays of shape (samples x 6 x wavelengths), or (samples x wavelengths) for
+# the total column AOD
+
+
+def _samplefields(tensor, var, conc, RH, factor, thin):
+    S = conc.shape[0]
+    W = len(var['Wavelengths'])
+    active = np.flatnonzero(~thin)
+    mixed = tensor.mix(conc[:, active].reshape(-1, conc.shape[2]),
+                       RH[:, active].reshape(-1), var['Input unit'])
+    fields = {}
+    for key, value in mixed.items():
+        fields[key] = np.full((S, n_layers, W), np.nan)
+        fields[key][:, active] = value.reshape(S, len(active), W)
+    fields['AOD'] = fields['Extinction coefficient']*factor[..., np.newaxis]
+    fields['Total column AOD'] = np.nansum(fields['AOD'], axis=1)
+    return fields
+
+
+def run_uncertainty(input_dict, samples, concentration_uncertainty=0.1,
+                    rh_tolerance=0.0, profile_uncertainty=None, fields=None,
+                    percentiles=None, chunk_size=None, reservoir_size=10000,
+                    seed=None):
+    """
+    Propagate the uncertainties of the concentrations, relative humidities
+    and profiles of the layers to the optical properties by Monte Carlo
+    sampling.
+
+    The samples are evaluated in chunks, each as one array computation over
+    the component data of all relative humidities, and reduced to running
+    means, covariances and a reservoir sample for the percentiles, so the
+    memory used does not grow with the number of samples.
+
+    Parameters
+    ----------
+    input_dict : A dictionary containing the nominal input parameters for the
+        AeroMix, in the same format as for AeroMix.run.
+    samples : Number of Monte Carlo samples, e.g. 10000 to 1000000.
+    concentration_uncertainty : Standard deviation of the concentrations
+        relative to the nominal values, either a single value or an array of
+        shape (6 x components). The concentrations are drawn independently
+        from lognormal distributions with the nominal values as mean. The
+        default is 0.1.
+    rh_tolerance : Tolerance (%) of the relative humidities, either a single
+        value or a list of 6 values. The relative humidities are drawn
+        uniformly within the nominal value +- tolerance, limited to 0-99.
+        The default is 0.
+    profile_uncertainty : Standard deviation of the profile params relative
+        to the nominal values, drawn from lognormal distributions. Either a
+        single value for the scale heights of the layers with exponential
+        profiles (profile type 0) or a dictionary with a list of values for
+        the profile params of a layer by layer number, e.g.
+        {1: [0, 0.05, 0.2]}. The second value applies to the thickness of
+        the layer (top minus bottom) instead of its top. The default is
+        None.
+    fields : List of the output fields of which statistics are calculated,
+        from uncertainty_fields. The default is ['Total column AOD', 'AOD',
+        'SSA'].
+    percentiles : List of the percentiles (0-100) calculated. The default is
+        [2.5, 16, 50, 84, 97.5].
+    chunk_size : Number of samples evaluated at a time. The default is None,
+        which takes about 2**14 samples x wavelengths.
+    reservoir_size : Number of samples kept for the percentiles. The
+        percentiles are exact up to this number of samples and estimated
+        from a uniform random subset beyond. The default is 10000.
+    seed : Seed of the random number generator. The default is None.
+
+    Returns
+    -------
+    Dictionary with 'Number of samples', 'Wavelengths', and 'Nominal',
+    'Mean', 'Standard deviation' and 'Percentiles' holding a dictionary by
+    output field. Fields of the layers have the shape (6 x wavelengths) and
+    'Total column AOD' the shape (wavelengths), with the percentiles along an
+    additional first axis. 'Covariance' is the covariance matrix of all
+    output values, labelled in 'Covariance labels', e.g. 'SSA L1 0.55' for
+    the SSA of layer 1 at 0.55 µm. Layers with zero thickness or without
+    aerosol are NaN, as in AeroMix.run.
+
+    """
+    var = copy.deepcopy(input_dict)
+    validate_input(var)
+    fields = default_fields if fields is None else list(fields)
+    for field in fields:
+        if field not in uncertainty_fields:
+            raise InputError("Unknown output field "+field)
+    levels = default_percentiles if percentiles is None else list(percentiles)
+    if int(samples) < 1:
+        raise InputError("Number of samples should be positive")
+    samples = int(samples)
+    rng = np.random.default_rng(seed)
+
+    C = var['Maximum number of components']
+    wavelengths = list(var['Wavelengths'])
+    W = len(wavelengths)
+    RH, profile_type, profile_params = _layersettings(var)
+    conc = np.array([[var['Layer'+str(k)+' component concentration'][i]
+                      for i in range(1, C+1)] for k in range(1, n_layers+1)],
+                    dtype=float)
+    conc_sigma = np.broadcast_to(np.asarray(concentration_uncertainty,
+                                            dtype=float), conc.shape)
+    RH = np.array(RH, dtype=float)
+    rh_tolerance = np.broadcast_to(np.asarray(rh_tolerance, dtype=float),
+                                   RH.shape)
+    profile_sigma = _profilesigma(profile_uncertainty, profile_type,
+                                  profile_params)
+    thin = np.array([profile_params[k][1]-profile_params[k][0] == 0
+                     for k in range(n_layers)])
+    nominal_factor = np.array([np.nan if thin[k] else _profilefactor(
+        profile_type[k], profile_params[k]) for k in range(n_layers)])
+    tensor = _humiditytensor(var)
+
+    # Labels of the values of each sample, as in the CSV output of the
+    # command line interface
+    labels = []
+    for field in fields:
+        if field == 'Total column AOD':
+            labels += [field+' '+str(w) for w in wavelengths]
+        else:
+            labels += [field+' L'+str(k)+' '+str(w)
+                       for k in range(1, n_layers+1) for w in wavelengths]
+    stats = _StreamingStatistics(len(labels), int(reservoir_size), rng)
+
+    nominal = _samplefields(tensor, var, conc[np.newaxis], RH[np.newaxis],
+                            nominal_factor[np.newaxis], thin)
+    if chunk_size is None:
+        chunk_size = max(16, 2**14//W)
+    for start in range(0, samples, chunk_size):
+        S = min(chunk_size, samples-start)
+        conc_s = _lognormal(rng, conc, conc_sigma, S)
+        RH_s = np.clip(RH+rh_tolerance*rng.uniform(-1, 1, (S, n_layers)),
+                       0, 99)
+        factor = np.tile(nominal_factor, (S, 1))
+        for k in range(n_layers):
+            if not thin[k] and np.any(profile_sigma[k] != 0):
+                # The thickness is drawn instead of the top, so that the top
+                # stays above the bottom
+                params = np.array(profile_params[k], dtype=float)
+                params[1] -= params[0]
+                params = _lognormal(rng, params, profile_sigma[k], S)
+                params[:, 1] += params[:, 0]
+                factor[:, k] = _profilefactors(profile_type[k], params)
+        values = _samplefields(tensor, var, conc_s, RH_s, factor, thin)
+        stats.update(np.concatenate([values[field].reshape(S, -1)
+                                     for field in fields], axis=1))
+
+    # Output arrays of each field from the vectors of all values
+    def unpack(vector):
+        result = {}
+        offset = 0
+        for field in fields:
+            shape = (W,) if field == 'Total column AOD' else (n_layers, W)
+            size = int(np.prod(shape))
+            result[field] = vector[..., offset:offset+size].reshape(
+                vector.shape[:-1]+shape)
+            offset += size
+        return result
+
+    covariance = stats.covariance()
+    return {'Number of samples': samples,
+            'Wavelengths': np.array(wavelengths, dtype=float),
+            'Nominal': {field: nominal[field][0] for field in fields},
+            'Mean': unpack(stats.mean),
+            'Standard deviation': unpack(np.sqrt(np.diag(covariance))),
+            'Percentiles': unpack(stats.percentiles(levels)),
+            'Percentile levels': np.array(levels, dtype=float),
+            'Covariance': covariance,
+            'Covariance labels': labels}
@@ -0,0 +1,342 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+"""
+
+import os
+import sys
+import threading
+import numpy as np
+from AeroMix.SpectralInterpolation import interpolate_spectrum
+from AeroMix.AeroMix_instrument import _start, _record
+
+# Binary component files are stored next to the text file with this suffix.
+# Layout: the 8 byte magic, int64 [rows, columns, mtime_ns and size of the
+# text file], float64 [Rmin, Rmax, sigma, rho, Rmod] and a float64 block of
+# rows x columns holding the wavelength and the 8 optical parameters of each
+# row of the text file. All values are little-endian.
+binary_suffix = '.amc'
+# Suffix of the consolidated libraries written by build_component_library
+library_suffix = '.aml'
+_magic = b'AEROMIX1'
+_header_size = len(_magic)+4*8+5*8
+# Number of lists of wavelengths for which the interpolated spectral data of
+# a component file are kept. The least recently used list is dropped first.
+spectra_per_file = 4
+
+# Function to parse the size distribution header and spectral optical data
+# of an aerosol component file
+
+
+def _ParseComponentFile(path):
+    fields = {}
+    optdata = {}
+    with open(path, 'r') as OptDataFile:
+        for line in OptDataFile:
+            if "minimum radius" in line:
+                var_name, fields['Rmin'] = line.split(':')
+            if "maximum radius" in line:
+                var_name, fields['Rmax'] = line.split(':')
+            if "sigma" in line:
+                var_name, fields['sigma'] = line.split(':')
+            if "rho[g/cm**3]" in line:
+                var_name, fields['rho'] = line.split(':')
+            if "wet" in line:
+                var_name, fields['Rmod'] = line.split(':')
+            if "Rmod [um]:" in line:
+                var_name, fields['Rmod'] = line.split(':')
+            if "," in line:
+                wavelength, extc, scac, absc, ssa, g, extn, real, img = line.split(",")
+                optdata[float(wavelength)] = [float(extc), float(scac),
+                                              float(absc), float(ssa),
+                                              float(g), float(extn),
+                                              float(real), float(img)]
+    sizemassdata = {'Rmin': float(fields['Rmin']),
+                    'Rmax': float(fields['Rmax']),
+                    'sigma': float(fields['sigma']),
+                    'rho': float(fields['rho']),
+                    'Rmod': float(fields['Rmod'])}
+    return sizemassdata, optdata
+
+# Function to read a binary component file. Returns None if the file is
+# missing, damaged or was written from a different version of the text file.
+
+
+def _ReadBinaryComponent(path, signature):
+    try:
+        with open(path, 'rb') as BinFile:
+            data = BinFile.read()
+    except OSError:
+        return None
+    if len(data) < _header_size or data[:len(_magic)] != _magic:
+        return None
+    rows, cols, mtime_ns, size = np.frombuffer(data, dtype='<i8', count=4,
+                                               offset=len(_magic))
+    if ((int(mtime_ns), int(size)) != signature or cols != 9
+            or len(data) != _header_size+rows*cols*8):
+        return None
+    header = np.frombuffer(data, dtype='<f8', count=5,
+                           offset=len(_magic)+4*8)
+    block = np.frombuffer(data, dtype='<f8', count=rows*cols,
+                          offset=_header_size).reshape(rows, cols)
+    sizemassdata = dict(zip(['Rmin', 'Rmax', 'sigma', 'rho', 'Rmod'],
+                            header.tolist()))
+    optdata = {row[0]: row[1:] for row in block.tolist()}
+    return sizemassdata, optdata
+
+
+def write_binary_component(path):
+    """
+    Write the binary version of a text component file.
+
+    The binary file is stored next to the text file with the suffix '.amc'.
+    It records the modification time and size of the text file and is only
+    used while the text file is unchanged.
+
+    Parameters
+    ----------
+    path : Path to the text component file.
+
+    Returns
+    -------
+    Path to the binary component file.
+
+    """
+    st = os.stat(path)
+    sizemassdata, optdata = _ParseComponentFile(path)
+    block = np.array([[wavelength]+values for wavelength, values in
+                      optdata.items()], dtype='<f8').reshape(-1, 9)
+    binary_path = path+binary_suffix
+    with open(binary_path+'.tmp', 'wb') as BinFile:
+        BinFile.write(_magic)
+        BinFile.write(np.array([block.shape[0], block.shape[1],
+                                st.st_mtime_ns, st.st_size],
+                               dtype='<i8').tobytes())
+        BinFile.write(np.array([sizemassdata[key] for key in
+                                ['Rmin', 'Rmax', 'sigma', 'rho', 'Rmod']],
+                               dtype='<f8').tobytes())
+        BinFile.write(block.tobytes())
+    os.replace(binary_path+'.tmp', binary_path)
+    return binary_path
+
+
+def convert_component_library(directory):
+    """
+    Write binary versions of all text component files in a directory.
+
+    Files that are not component files are skipped. Binary files that are
+    already up to date are kept.
+
+    Parameters
+    ----------
+    directory : Location of the component files, e.g. the directory copied
+        by CopyAerosolData or the output directory of ext_aerosol and
+        cs_aerosol.
+
+    Returns
+    -------
+    List of paths to the binary component files.
+
+    """
+    written = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith((binary_suffix, library_suffix, '.tmp')) or \
+                not os.path.isfile(path):
+            continue
+        st = os.stat(path)
+        if _ReadBinaryComponent(path+binary_suffix,
+                                (st.st_mtime_ns, st.st_size)) is not None:
+            written.append(path+binary_suffix)
+            continue
+        try:
+            written.append(write_binary_component(path))
+        except (KeyError, ValueError, UnicodeDecodeError):
+            continue
+    return written
+
+
+class ComponentDatabase:
+    """
+    Process-wide store of parsed aerosol component files.
+
+    Each component file is parsed once and kept in memory. An entry is
+    parsed again when the modification time or the size of the file on disk
+    changes, so components rewritten by ext_aerosol or cs_aerosol are picked
+    up without restarting the process. A binary version of the file written
+    by write_binary_component is read instead of the text when it is up to
+    date, and an attached ComponentLibrary takes precedence over both.
+
+    The dictionaries and arrays returned by the accessors are shared between
+    callers and must be treated as read-only.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._spectra = {}
+        self._lock = threading.Lock()
+        self._library = None
+
+    def attach_library(self, library):
+        """
+        Read components from a memory-mapped library when possible.
+
+        Parameters
+        ----------
+        library : ComponentLibrary or the path to a library file. Use
+            use_component_library as the initializer of a process pool so
+            that every worker maps the same file.
+
+        """
+        if not hasattr(library, 'entry'):
+            from AeroMix.ComponentLibrary import ComponentLibrary
+            library = ComponentLibrary(library)
+        with self._lock:
+            self._library = library
+            self._entries.clear()
+            self._spectra.clear()
+
+    def detach_library(self):
+        """Stop reading components from the attached library."""
+        with self._lock:
+            self._library = None
+            self._entries.clear()
+            self._spectra.clear()
+
+    def _entry(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != signature:
+            start = _start()
+            data = None
+            # File read and its size, for the instrumentation
+            source = None
+            if self._library is not None:
+                data = self._library.entry(path, signature)
+            if data is None:
+                source = path+binary_suffix
+                data = _ReadBinaryComponent(source, signature)
+            if data is None:
+                source = path
+                data = _ParseComponentFile(path)
+            if start is not None:
+                _record('Component files', start,
+                        files=0 if source is None else 1,
+                        nbytes=0 if source is None else os.path.getsize(
+                            source))
+            entry = (signature, data)
+            with self._lock:
+                self._entries[path] = entry
+        return entry[1]
+
+    def size_mass_data(self, path):
+        """
+        Size distribution parameters of a component file.
+
+        Parameters
+        ----------
+        path : Path to the component file.
+
+        Returns
+        -------
+        Dictionary with the keys 'Rmin', 'Rmax', 'sigma', 'rho' and 'Rmod'.
+
+        """
+        return self._entry(path)[0]
+
+    def optical_data(self, path):
+        """
+        Spectral optical data of a component file.
+
+        Parameters
+        ----------
+        path : Path to the component file.
+
+        Returns
+        -------
+        Dictionary keyed by wavelength (µm) holding the list [ext. coeff.,
+        sca. coeff., abs. coeff., SSA, g, normalised ext., real refractive
+        index, imaginary refractive index].
+
+        """
+        return self._entry(path)[1]
+
+    def spectral_data(self, path, wavelengths):
+        """
+        Spectral optical data of a component file at any wavelengths.
+
+        The data are interpolated with interpolate_spectrum once per file and
+        list of wavelengths and kept until the file changes, for the
+        spectra_per_file most recently used lists of wavelengths.
+
+        Parameters
+        ----------
+        path : Path to the component file.
+        wavelengths : List of wavelengths (µm) within the range of the file.
+
+        Returns
+        -------
+        Read-only array of shape (wavelengths x 8) in the column order of
+        optical_data.
+
+        """
+        optdata = self._entry(path)[1]
+        path = os.path.abspath(path)
+        wavelengths = tuple(wavelengths)
+        with self._lock:
+            spectra = self._spectra.get(path)
+            if spectra is not None and spectra[0] is optdata:
+                array = spectra[1].pop(wavelengths, None)
+                if array is not None:
+                    # The most recently used list of wavelengths comes last
+                    spectra[1][wavelengths] = array
+                    return array
+        start = _start()
+        array = interpolate_spectrum(list(optdata.keys()),
+                                     list(optdata.values()), wavelengths)
+        array.flags.writeable = False
+        if start is not None:
+            _record('Spectral interpolation', start)
+        with self._lock:
+            spectra = self._spectra.get(path)
+            if spectra is None or spectra[0] is not optdata:
+                spectra = self._spectra[path] = (optdata, {})
+            spectra[1][wavelengths] = array
+            while len(spectra[1]) > spectra_per_file:
+                del spectra[1][next(iter(spectra[1]))]
+        return array
+
+    def clear(self):
+        """Drop all parsed component files."""
+        with self._lock:
+            self._entries.clear()
+            self._spectra.clear()
+
+
+component_db = ComponentDatabase()
+
+
+def use_component_library(library):
+    """
+    Attach a component library to component_db.
+
+    Pass this function as the initializer of a process pool so that every
+    worker maps the same library file, e.g.
+    ProcessPoolExecutor(initializer=use_component_library, initargs=(path,)).
+
+    Parameters
+    ----------
+    library : ComponentLibrary or the path to a library file.
+
+    """
+    component_db.attach_library(library)
+
+
+# Convert a component library from the command line, e.g.
+# python -m AeroMix.ComponentDatabase ./aerosol_components_AeroMix
+if __name__ == '__main__':
+    for binary_path in convert_component_library(sys.argv[1]):
+        print(binary_path)
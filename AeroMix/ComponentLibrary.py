@@ -0,0 +1,188 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+"""
+
+import os
+import re
+import sys
+import json
+import numpy as np
+from AeroMix.ComponentDatabase import _ParseComponentFile, library_suffix
+from AeroMix.AeroMix_exceptions import ComponentDataError
+
+# Layout of a library file: the magic line, the length of the JSON header as
+# little-endian int64, the JSON header and, starting at the offsets given in
+# the header (aligned to 64 bytes), the float64 arrays 'optical' of shape
+# (components x RH levels x wavelengths x 8) and 'sizemass' of shape
+# (components x RH levels x 5) holding Rmin, Rmax, sigma, rho and Rmod.
+_magic = b'AEROMIXLIB1\n'
+_align = 64
+
+# Component file names end with the two digit relative humidity, e.g. WS50,
+# BC00 or custom1_00
+_name_pattern = re.compile(r'^(.+?)_?(\d{2})$')
+
+
+class ComponentLibrary:
+    """
+    All components of a component directory in one memory-mapped file.
+
+    The optical data of all components and relative humidities are stored as
+    one array that is mapped into memory with numpy.memmap, so processes
+    that open the same file share the operating system page cache instead of
+    each holding a parsed copy. Only the path is sent to worker processes.
+
+    The library records the modification time and size of every source
+    file. A component whose file has changed since the library was built is
+    read from the file instead.
+
+    Parameters
+    ----------
+    path : Location of a library written by build_component_library.
+
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        with open(self.path, 'rb') as LibFile:
+            if LibFile.read(len(_magic)) != _magic:
+                raise ComponentDataError(self.path+" is not an AeroMix "
+                                         "component library")
+            size = int(np.frombuffer(LibFile.read(8), dtype='<i8')[0])
+            header = json.loads(LibFile.read(size).decode('utf-8'))
+        self.directory = header['directory']
+        self.components = header['components']
+        self.rh = header['rh']
+        self.wavelengths = header['wavelengths']
+        self.files = header['files']
+        shape = (len(self.components), len(self.rh))
+        self.optical = np.memmap(self.path, dtype='<f8', mode='r',
+                                 offset=header['optical'],
+                                 shape=shape+(len(self.wavelengths), 8))
+        self.sizemass = np.memmap(self.path, dtype='<f8', mode='r',
+                                  offset=header['sizemass'], shape=shape+(5,))
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def entry(self, path, signature=None):
+        """
+        Size distribution and optical data of a component file.
+
+        Parameters
+        ----------
+        path : Path to the component file.
+        signature : (mtime_ns, size) of the file. The file is looked up with
+            os.stat when not given.
+
+        Returns
+        -------
+        Tuple of the size distribution dictionary and the optical data
+        dictionary, as returned by ComponentDatabase, or None if the file is
+        not in the library or has changed since the library was built. The
+        optical data are read-only views of the mapped file.
+
+        """
+        directory, name = os.path.split(os.path.abspath(path))
+        record = self.files.get(name)
+        if record is None or directory != self.directory:
+            return None
+        if signature is None:
+            st = os.stat(path)
+            signature = (st.st_mtime_ns, st.st_size)
+        c, r, mtime_ns, size = record
+        if (mtime_ns, size) != tuple(signature):
+            return None
+        sizemassdata = dict(zip(['Rmin', 'Rmax', 'sigma', 'rho', 'Rmod'],
+                                self.sizemass[c, r].tolist()))
+        optdata = dict(zip(self.wavelengths, self.optical[c, r]))
+        return sizemassdata, optdata
+
+
+def build_component_library(directory, path=None):
+    """
+    Build a memory-mapped library from a directory of component files.
+
+    Parameters
+    ----------
+    directory : Location of the component files, e.g. the directory copied
+        by CopyAerosolData. Custom components written by ext_aerosol and
+        cs_aerosol are included. Files that are not component files or that
+        have other wavelengths than the first component are skipped.
+    path : Location of the library file. The default is
+        'aerosol_library.aml' in directory.
+
+    Returns
+    -------
+    The ComponentLibrary read back from path.
+
+    """
+    directory = os.path.abspath(directory)
+    if path is None:
+        path = os.path.join(directory, 'aerosol_library'+library_suffix)
+    parsed = {}
+    for name in sorted(os.listdir(directory)):
+        file_path = os.path.join(directory, name)
+        match = _name_pattern.match(name)
+        if match is None or not os.path.isfile(file_path):
+            continue
+        try:
+            st = os.stat(file_path)
+            parsed[name] = (match.group(1), int(match.group(2)),
+                            (st.st_mtime_ns, st.st_size),
+                            _ParseComponentFile(file_path))
+        except (KeyError, ValueError, UnicodeDecodeError):
+            continue
+    if len(parsed) == 0:
+        raise ComponentDataError("No component files found in "+directory)
+    wavelengths = list(next(iter(parsed.values()))[3][1].keys())
+    parsed = {name: value for name, value in parsed.items()
+              if list(value[3][1].keys()) == wavelengths}
+    components = sorted({value[0] for value in parsed.values()})
+    rh = sorted({value[1] for value in parsed.values()})
+    optical = np.zeros((len(components), len(rh), len(wavelengths), 8))
+    sizemass = np.zeros((len(components), len(rh), 5))
+    files = {}
+    for name, (component, RH, signature, (sizemassdata, optdata)) in \
+            parsed.items():
+        c = components.index(component)
+        r = rh.index(RH)
+        optical[c, r] = list(optdata.values())
+        sizemass[c, r] = [sizemassdata[key] for key in
+                          ['Rmin', 'Rmax', 'sigma', 'rho', 'Rmod']]
+        files[name] = [c, r, signature[0], signature[1]]
+
+    # The offsets are part of the header, so they are updated until the
+    # header length no longer changes them
+    header = {'directory': directory, 'components': components, 'rh': rh,
+              'wavelengths': wavelengths, 'files': files, 'optical': 0,
+              'sizemass': 0}
+    while True:
+        text = json.dumps(header).encode('utf-8')
+        start = -(-(len(_magic)+8+len(text))//_align)*_align
+        offsets = (start, -(-(start+optical.nbytes)//_align)*_align)
+        if offsets == (header['optical'], header['sizemass']):
+            break
+        header['optical'], header['sizemass'] = offsets
+    with open(path+'.tmp', 'wb') as LibFile:
+        LibFile.write(_magic)
+        LibFile.write(np.array([len(text)], dtype='<i8').tobytes())
+        LibFile.write(text)
+        LibFile.write(b'\0'*(header['optical']-LibFile.tell()))
+        LibFile.write(optical.astype('<f8').tobytes())
+        LibFile.write(b'\0'*(header['sizemass']-LibFile.tell()))
+        LibFile.write(sizemass.astype('<f8').tobytes())
+    os.replace(path+'.tmp', path)
+    return ComponentLibrary(path)
+
+
+# Build the library of a component directory from the command line, e.g.
+# python -m AeroMix.ComponentLibrary ./aerosol_components_AeroMix
+if __name__ == '__main__':
+    library = build_component_library(sys.argv[1])
+    print(library.path+': '+str(len(library.files))+' component files')
@@ -0,0 +1,293 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+"""
+
+import os
+import functools
+import numpy as np
+from AeroMix.AeroMix_main import _ReadOpticalData, _CalculateMass, rh_levels
+from AeroMix.AeroMix_instrument import _start, _record
+from AeroMix.ComponentDatabase import component_db
+from AeroMix.AeroMix_exceptions import (RelativeHumidityError,
+                                        ComponentDataError)
+
+# Function to return the lower and upper RH level index and the weight of
+# the upper level of relative humidities. RH values at a level get that level
+# as lower level and zero weight.
+
+
+def _brackets(RH):
+    RH = np.asarray(RH, dtype=float)
+    if np.any((RH < rh_levels[0]) | (RH > rh_levels[-1])) or \
+            np.any(np.isnan(RH)):
+        raise RelativeHumidityError("Invalid relative humidity value")
+    levels = np.array(rh_levels, dtype=float)
+    k = np.clip(np.searchsorted(levels, RH, side='right')-1, 0,
+                len(levels)-2)
+    t = (RH-levels[k])/(levels[k+1]-levels[k])
+    # At the upper level the upper bracket is taken as is
+    k = np.where(t == 1, k+1, k)
+    t = np.where(t == 1, 0.0, t)
+    k1 = np.minimum(k+1, len(levels)-1)
+    return k, k1, t
+
+# Function to arrange the spectral optical data of all components in an
+# array of shape (components x wavelengths x properties)
+
+
+def _opticalarray(var, RH):
+    OptdataFiles = _ReadOpticalData(var, RH)
+    C = var['Maximum number of components']
+    optarray = np.zeros((C, len(var['Wavelengths']), 8))
+    available = np.zeros(C, dtype=bool)
+    for i in range(1, C+1):
+        if os.path.exists(OptdataFiles[i]):
+            optarray[i-1] = component_db.spectral_data(OptdataFiles[i],
+                                                       var['Wavelengths'])
+            available[i-1] = True
+    return optarray, available
+
+
+class HumidityTensor:
+    """
+    Optical data and mean particle volume and mass of all components at all
+    relative humidity levels, interpolated to any relative humidity.
+
+    The component files of the eight RH levels are read once into arrays of
+    shape (components x RH levels x wavelengths x 8). Extinction,
+    scattering and absorption coefficients, ext.coeff x SSA, sca.coeff x g,
+    the normalised extinction, the refractive indices and the mean particle
+    volume and mass are interpolated linearly in RH, and SSA and g are
+    recovered from the interpolated products, so that mixing interpolated
+    components is the same as interpolating the mixture. At the RH levels
+    the data of the files are returned unchanged.
+
+    Parameters
+    ----------
+    input_dict : A dictionary containing the input parameters for the AeroMix,
+        in the same format as for AeroMix.run. Only the wavelengths, the
+        component file directory, the maximum number of components and the
+        maximum radius are used.
+
+    """
+
+    def __init__(self, input_dict):
+        start = _start()
+        var = input_dict
+        self.wavelengths = list(var['Wavelengths'])
+        C = var['Maximum number of components']
+        optical = []
+        available = []
+        mean_vol = []
+        mean_mass = []
+        for RH in rh_levels:
+            optarray, avail = _opticalarray(var, RH)
+            vol, mass, mass_data = _CalculateMass(var, RH)
+            optical.append(optarray)
+            available.append(avail)
+            mean_vol.append([vol[i] for i in range(1, C+1)])
+            mean_mass.append([mass[i] for i in range(1, C+1)])
+        self.optical = np.stack(optical, axis=1)
+        self.available = np.stack(available, axis=1)
+        self.mean_vol = np.array(mean_vol).T
+        self.mean_mass = np.array(mean_mass).T
+        # Products that mix linearly with the number concentration
+        self._mixing = self.optical.copy()
+        self._mixing[..., 3] = self.optical[..., 0]*self.optical[..., 3]
+        self._mixing[..., 4] = self.optical[..., 1]*self.optical[..., 4]
+        if start is not None:
+            _record('Humidity tensor', start)
+
+    def interpolate(self, RH):
+        """
+        Component data at any relative humidity.
+
+        Parameters
+        ----------
+        RH : Relative humidity (%) between 0 and 99, either a number or an
+            array of any shape, e.g. a column or a grid of RH values.
+
+        Returns
+        -------
+        Dictionary with 'Optical data' of shape (RH shape x components x
+        wavelengths x 8) in the column order of the component files,
+        'Available' of shape (RH shape x components), which is False where
+        a component file is missing at one of the bracketing levels, and
+        'Mean volume' (um³) and 'Mean mass' (ug) of one particle of shape
+        (RH shape x components).
+
+        """
+        k, k1, t = _brackets(RH)
+        tc = t[..., np.newaxis]
+        tw = t[..., np.newaxis, np.newaxis, np.newaxis]
+        lower = np.moveaxis(self._mixing[:, k], 0, -3)
+        upper = np.moveaxis(self._mixing[:, k1], 0, -3)
+        mixing = lower+tw*(upper-lower)
+        optical = mixing.copy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            optical[..., 3] = np.where(mixing[..., 0] != 0,
+                                       mixing[..., 3]/mixing[..., 0], 0)
+            optical[..., 4] = np.where(mixing[..., 1] != 0,
+                                       mixing[..., 4]/mixing[..., 1], 0)
+        exact = np.moveaxis(self.optical[:, k], 0, -3)
+        optical = np.where(tw == 0, exact, optical)
+        available = np.moveaxis(self.available[:, k], 0, -1) & (
+            (tc == 0) | np.moveaxis(self.available[:, k1], 0, -1))
+        mean_vol, mean_mass = [
+            np.moveaxis(array[:, k], 0, -1)+tc*(
+                np.moveaxis(array[:, k1]-array[:, k], 0, -1))
+            for array in (self.mean_vol, self.mean_mass)]
+        # Components without data are treated as missing files at a level
+        mean_vol = np.where(available, mean_vol, 0.0)
+        mean_mass = np.where(available, mean_mass, 0.0)
+        return {'Optical data': optical, 'Available': available,
+                'Mean volume': mean_vol, 'Mean mass': mean_mass}
+
+    def mix(self, concentrations, RH, input_unit=0):
+        """
+        Optical properties of many mixtures, each at its own relative
+        humidity.
+
+        The components are added one at a time, so the memory used grows
+        with mixtures x wavelengths and not with the number of components.
+
+        Parameters
+        ----------
+        concentrations : Array of shape (mixtures x components) holding the
+            number or mass concentrations of the components.
+        RH : Array of shape (mixtures) holding the relative humidity (%) of
+            each mixture, between 0 and 99.
+        input_unit : 0 if the concentrations are number concentrations
+            (1/cm³) and 1 if they are mass concentrations (ug/m³), as
+            input_dict['Input unit']. The default is 0.
+
+        Returns
+        -------
+        Dictionary with 'Extinction coefficient', 'Scattering coefficient',
+        'Absorption coefficient', 'SSA' and 'g' of shape
+        (mixtures x wavelengths). Mixtures without aerosol are NaN.
+
+        """
+        NumDens, mean_vol, mean_mass, mixed = self._mixsums(
+            concentrations, RH, input_unit)
+        empty = np.all(NumDens == 0, axis=-1)[:, np.newaxis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ssa = np.where(empty, np.nan, mixed[3]/mixed[0])
+            g = np.where(empty, np.nan, mixed[4]/mixed[1])
+        return {'Extinction coefficient': np.where(empty, np.nan, mixed[0]),
+                'Scattering coefficient': np.where(empty, np.nan, mixed[1]),
+                'Absorption coefficient': np.where(empty, np.nan, mixed[2]),
+                'SSA': ssa, 'g': g}
+
+    def _mixsums(self, concentrations, RH, input_unit=0, checked=None):
+        """
+        Number concentrations, mean particle volume and mass and component
+        sums of many mixtures, each at its own relative humidity. Only the
+        bracketing RH levels and weights are interpolated for all mixtures
+        and the data of the two levels are added one component and property
+        at a time, so the memory used is that of a few arrays of shape
+        (mixtures x wavelengths).
+
+        Parameters
+        ----------
+        concentrations : Array of shape (mixtures shape x components).
+        RH : Array of the mixtures shape holding the relative humidity (%).
+        input_unit : 0 for number and 1 for mass concentrations. The default
+            is 0.
+        checked : Optional boolean array of the mixtures shape. Missing
+            component data raise ComponentDataError only where it is True.
+            The default is None, which checks all mixtures.
+
+        Returns
+        -------
+        Number concentrations, mean volume and mean mass of shape
+        (mixtures shape x components) and the sums of ext. coeff., sca.
+        coeff., abs. coeff., ext.coeff x SSA and sca.coeff x g of shape
+        (5 x mixtures shape x wavelengths).
+
+        """
+        conc = np.asarray(concentrations, dtype=float)
+        k, k1, t = _brackets(RH)
+        shape = conc.shape[:-1]
+        NumDens = np.zeros(conc.shape)
+        mean_vol = np.zeros(conc.shape)
+        mean_mass = np.zeros(conc.shape)
+        sums = np.zeros((5,)+shape+(len(self.wavelengths),))
+        tw = t[..., np.newaxis]
+        for c in range(conc.shape[-1]):
+            if not np.any(conc[..., c] != 0):
+                continue
+            available = self.available[c, k] & (
+                (t == 0) | self.available[c, k1])
+            for array, mean in ((self.mean_vol, mean_vol),
+                                (self.mean_mass, mean_mass)):
+                lower = array[c, k]
+                mean[..., c] = np.where(available, lower+t*(
+                    array[c, k1]-lower), 0.0)
+            if input_unit == 1:
+                NumDens[..., c] = np.divide(
+                    conc[..., c], mean_mass[..., c], out=np.zeros(shape),
+                    where=mean_mass[..., c] != 0)
+            else:
+                NumDens[..., c] = conc[..., c]
+            missing = (NumDens[..., c] != 0) & ~available
+            if checked is not None:
+                missing &= checked
+            if np.any(missing):
+                raise ComponentDataError("Component file not found for a "
+                                         "component with non-zero "
+                                         "concentration")
+            n = NumDens[..., c, np.newaxis]
+            for p in range(5):
+                lower = self._mixing[c, k, :, p]
+                sums[p] += n*(lower+tw*(self._mixing[c, k1, :, p]-lower))
+        return NumDens, mean_vol, mean_mass, sums
+
+
+# Function to return the optical array, the available components and the
+# mean particle volume and mass of all components at one relative humidity.
+# The component files are used at the RH levels and the HumidityTensor in
+# between.
+
+
+def _humidityoptics(var, RH):
+    if RH in rh_levels:
+        # File names hold the level as an integer, e.g. WS50 for 50.0
+        RH = rh_levels[rh_levels.index(RH)]
+        C = var['Maximum number of components']
+        optarray, available = _opticalarray(var, RH)
+        mean_vol, mean_mass, mass_data = _CalculateMass(var, RH)
+        return (optarray, available,
+                np.array([mean_vol[i] for i in range(1, C+1)]),
+                np.array([mean_mass[i] for i in range(1, C+1)]))
+    interpolated = _humiditytensor(var).interpolate(RH)
+    return (interpolated['Optical data'], interpolated['Available'],
+            interpolated['Mean volume'], interpolated['Mean mass'])
+
+# Function to return the HumidityTensor of an input dictionary. Tensors are
+# kept while the component files they were built from are unchanged.
+
+
+def _humiditytensor(var):
+    signature = []
+    for RH in rh_levels:
+        for path in _ReadOpticalData(var, RH).values():
+            try:
+                st = os.stat(path)
+                signature.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append((path, None, None))
+    return _cachedtensor(tuple(signature), tuple(var['Wavelengths']),
+                         var['Component file directory'],
+                         var['Maximum number of components'],
+                         var['Maximum radius'])
+
+
+@functools.lru_cache(maxsize=16)
+def _cachedtensor(signature, wavelengths, comp_dir, C, max_radius):
+    return HumidityTensor({'Wavelengths': list(wavelengths),
+                           'Component file directory': comp_dir,
+                           'Maximum number of components': C,
+                           'Maximum radius': max_radius})
@@ -0,0 +1,192 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+"""
+
+import os
+import sqlite3
+import time
+from collections import Counter
+import numpy as np
+
+
+class MieCache:
+    """
+    Persistent on-disk store of Mie efficiencies.
+
+    Efficiencies are stored in a SQLite file and keyed by the refractive
+    indices and size parameters rounded to a fixed number of significant
+    digits. The efficiencies are always evaluated at the rounded inputs, so a
+    calculation gives the same result whether the cache is cold or warm. The
+    least recently used entries are removed when the number of entries exceeds
+    max_entries.
+
+    The same file can be used by several processes. Only the path and the
+    settings are sent to worker processes, each of which opens its own
+    connection.
+
+    Parameters
+    ----------
+    path : Location of the cache file. It is created if it does not exist.
+    max_entries : Maximum number of stored efficiencies. The default is
+        2000000.
+    digits : Number of significant digits kept in the keys. The default is 6.
+
+    """
+
+    def __init__(self, path, max_entries=2000000, digits=6):
+        self.path = os.path.abspath(path)
+        self.max_entries = max_entries
+        self.digits = digits
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+
+    def __getstate__(self):
+        return {'path': self.path, 'max_entries': self.max_entries,
+                'digits': self.digits}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['max_entries'], state['digits'])
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS mie (key TEXT PRIMARY KEY, '
+                'qext REAL, qsca REAL, qabs REAL, g REAL, used INTEGER)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS mie_used '
+                               'ON mie (used)')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, '
+                'value INTEGER)')
+            self._conn.commit()
+        return self._conn
+
+    def quantize(self, params):
+        """
+        Round parameters to the number of significant digits of the keys.
+
+        Parameters
+        ----------
+        params : Array of real parameters.
+
+        Returns
+        -------
+        Array of rounded parameters.
+
+        """
+        params = np.asarray(params, dtype=float)
+        with np.errstate(divide='ignore'):
+            exponent = np.floor(np.log10(np.abs(params)))
+        exponent = np.where(np.isfinite(exponent), exponent, 0)
+        scale = 10.0**(self.digits-1-exponent)
+        return np.round(params*scale)/scale
+
+    def lookup(self, kind, params, compute):
+        """
+        Efficiencies for a set of Mie problems, computing the missing ones.
+
+        Parameters
+        ----------
+        kind : Name of the problem type, e.g. 'sphere' or 'coreshell'.
+        params : Array of shape (problems x parameters) of real inputs, such
+            as (real index, imaginary index, size parameter).
+        compute : Function called with the rounded parameters of the missing
+            problems. It should return an array of shape
+            (problems x 4) holding Q_ext, Q_sca, Q_abs and g.
+
+        Returns
+        -------
+        Array of shape (problems x 4) holding Q_ext, Q_sca, Q_abs and g.
+
+        """
+        params = self.quantize(params)
+        keys = [kind+':'+','.join(repr(v) for v in row) for row in params]
+        conn = self._connection()
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), 500):
+            chunk = unique[start:start+500]
+            rows = conn.execute(
+                'SELECT key, qext, qsca, qabs, g FROM mie WHERE key IN ('
+                + ','.join('?'*len(chunk))+')', chunk).fetchall()
+            for row in rows:
+                found[row[0]] = row[1:]
+        missing = [key for key in unique if key not in found]
+        if missing:
+            index = {key: k for k, key in enumerate(keys)}
+            values = np.asarray(compute(params[[index[key]
+                                                for key in missing]]))
+            for key, value in zip(missing, values):
+                found[key] = tuple(float(v) for v in value)
+        now = time.time_ns()
+        conn.executemany(
+            'INSERT OR REPLACE INTO mie VALUES (?, ?, ?, ?, ?, ?)',
+            [(key,)+tuple(found[key])+(now,) for key in unique])
+        counts = Counter(keys)
+        n_hits = len(keys)-sum(counts[key] for key in missing)
+        self.hits += n_hits
+        self.misses += len(keys)-n_hits
+        conn.executemany(
+            'INSERT INTO stats VALUES (?, ?) ON CONFLICT(name) '
+            'DO UPDATE SET value = value + excluded.value',
+            [('hits', n_hits), ('misses', len(keys)-n_hits)])
+        conn.commit()
+        if missing:
+            self._evict()
+        return np.array([found[key] for key in keys])
+
+    def _evict(self):
+        conn = self._connection()
+        count = conn.execute('SELECT COUNT(*) FROM mie').fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                'DELETE FROM mie WHERE key IN (SELECT key FROM mie '
+                'ORDER BY used LIMIT ?)',
+                (count-int(0.9*self.max_entries),))
+            conn.commit()
+
+    def stats(self):
+        """
+        Hit-rate statistics of the cache.
+
+        Returns
+        -------
+        Dictionary with the hits, misses and hit rate of this process
+        ('Hits', 'Misses', 'Hit rate'), the same values accumulated in the
+        cache file over all processes ('Total hits', 'Total misses',
+        'Total hit rate') and the number of stored entries ('Entries').
+
+        """
+        conn = self._connection()
+        totals = dict(conn.execute('SELECT name, value FROM stats').fetchall())
+        total_hits = totals.get('hits', 0)
+        total_misses = totals.get('misses', 0)
+        return {'Hits': self.hits, 'Misses': self.misses,
+                'Hit rate': _rate(self.hits, self.misses),
+                'Total hits': total_hits, 'Total misses': total_misses,
+                'Total hit rate': _rate(total_hits, total_misses),
+                'Entries': conn.execute(
+                    'SELECT COUNT(*) FROM mie').fetchone()[0]}
+
+    def clear(self):
+        """Remove all stored efficiencies and statistics."""
+        conn = self._connection()
+        conn.execute('DELETE FROM mie')
+        conn.execute('DELETE FROM stats')
+        conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        """Close the connection to the cache file."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _rate(hits, misses):
+    return hits/(hits+misses) if hits+misses > 0 else 0.0
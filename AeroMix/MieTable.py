@@ -0,0 +1,259 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+"""
+
+import sys
+import numpy as np
+from AeroMix.vectorMie import mie_q
+
+# Imaginary refractive indices below this value are looked up at this value
+kmin = 1e-9
+# Spheres larger than x_resonance with k*x below kx_resonance have narrow
+# resonances in x and n that the table cannot resolve (errors of up to 25 %
+# with the default grid). Their efficiencies are computed with the exact Mie
+# kernel instead.
+x_resonance = 1.0
+kx_resonance = 2.0
+
+
+class MieTable:
+    """
+    Precomputed Mie efficiencies of homogeneous spheres for fast lookups.
+
+    The table holds Q_sca, Q_abs and g on a grid of log size parameter, real
+    refractive index and log imaginary refractive index. Q_sca and Q_abs are
+    interpolated in log space and g linearly. Points outside the table and
+    weakly absorbing spheres in the resonance region (x > x_resonance and
+    k*x < kx_resonance) are computed with the exact Mie kernel. Use
+    validate() to measure the error against PyMieScatt before relying on a
+    table.
+
+    Parameters
+    ----------
+    path : Location of a table written by build_mie_table.
+
+    """
+
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.log_x = data['log_x']
+            self.n = data['n']
+            self.log_k = data['log_k']
+            self.log_qsca = data['log_qsca']
+            self.log_qabs = data['log_qabs']
+            self.g = data['g']
+        self.path = path
+
+    def lookup(self, m, x):
+        """
+        Interpolated Mie efficiencies.
+
+        Parameters
+        ----------
+        m : Complex refractive index (n+kj), either a scalar or an array that
+            broadcasts against x.
+        x : Array of size parameters.
+
+        Returns
+        -------
+        Arrays of extinction, scattering and absorption efficiencies and the
+        asymmetry parameter, each with the broadcast shape of m and x.
+
+        """
+        m, x = np.broadcast_arrays(np.asarray(m, dtype=complex),
+                                   np.asarray(x, dtype=float))
+        shape = x.shape
+        m = m.ravel()
+        x = x.ravel()
+        qsca = np.zeros(x.size)
+        qabs = np.zeros(x.size)
+        g = np.zeros(x.size)
+        coords, inside = self._interpolated(m, x)
+        axes = [self.log_x, self.n, self.log_k]
+        if np.any(inside):
+            # Trilinear interpolation
+            index = []
+            weight = []
+            for c, axis in zip(coords, axes):
+                i = np.clip(np.searchsorted(axis, c[inside])-1, 0,
+                            axis.size-2)
+                index.append(i)
+                weight.append((c[inside]-axis[i])/(axis[i+1]-axis[i]))
+            values = [np.zeros(np.count_nonzero(inside)) for k in range(3)]
+            for dx in (0, 1):
+                for dn in (0, 1):
+                    for dk in (0, 1):
+                        w = ((weight[0] if dx else 1-weight[0])
+                             * (weight[1] if dn else 1-weight[1])
+                             * (weight[2] if dk else 1-weight[2]))
+                        corner = (index[0]+dx, index[1]+dn, index[2]+dk)
+                        values[0] += w*self.log_qsca[corner]
+                        values[1] += w*self.log_qabs[corner]
+                        values[2] += w*self.g[corner]
+            qsca[inside] = np.exp(values[0])
+            qabs[inside] = np.exp(values[1])
+            g[inside] = values[2]
+        outside = ~inside & (x > 0)
+        if np.any(outside):
+            exact = mie_q(m[outside], x[outside])
+            qsca[outside] = exact[1]
+            qabs[outside] = exact[2]
+            g[outside] = exact[3]
+        qext = qsca+qabs
+        return (qext.reshape(shape), qsca.reshape(shape), qabs.reshape(shape),
+                g.reshape(shape))
+
+    def _interpolated(self, m, x):
+        # Table coordinates of the points and whether they are interpolated,
+        # i.e. inside the table and outside the resonance region
+        with np.errstate(divide='ignore'):
+            coords = [np.log10(x), m.real,
+                      np.log10(np.maximum(m.imag, kmin))]
+        inside = (x <= x_resonance) | (m.imag*x >= kx_resonance)
+        for c, axis in zip(coords, [self.log_x, self.n, self.log_k]):
+            inside &= (c >= axis[0]) & (c <= axis[-1])
+        return coords, inside
+
+    def validate(self, samples=2000, seed=0):
+        """
+        Relative error of the table against PyMieScatt.MieQ at random points
+        inside the table and outside the resonance region, i.e. at points
+        that are interpolated.
+
+        Parameters
+        ----------
+        samples : Number of random test points. The default is 2000.
+        seed : Seed of the random number generator. The default is 0.
+
+        Returns
+        -------
+        Dictionary with the maximum and the 99th percentile of the relative
+        error of 'Qext', 'Qsca' and 'g', e.g. 'Qext max' and 'Qext p99'.
+
+        """
+        import PyMieScatt as ps
+        rng = np.random.default_rng(seed)
+        m = np.zeros(0, dtype=complex)
+        x = np.zeros(0)
+        while x.size < samples:
+            x_new = 10**rng.uniform(self.log_x[0], self.log_x[-1], samples)
+            n = rng.uniform(self.n[0], self.n[-1], samples)
+            k = 10**rng.uniform(self.log_k[0], self.log_k[-1], samples)
+            keep = self._interpolated(n+1j*k, x_new)[1]
+            m = np.concatenate([m, n[keep]+1j*k[keep]])[:samples]
+            x = np.concatenate([x, x_new[keep]])[:samples]
+        qext, qsca, qabs, g = self.lookup(m, x)
+        exact = np.array([ps.MieQ(m=m[i], wavelength=1.0, diameter=x[i]/np.pi,
+                                  asDict=False, asCrossSection=False)[:4]
+                          for i in range(samples)])
+        errors = {}
+        for name, approx, ref in (('Qext', qext, exact[:, 0]),
+                                  ('Qsca', qsca, exact[:, 1]),
+                                  ('g', g, exact[:, 3])):
+            # g is zero in the Rayleigh limit, so its error is taken relative
+            # to one there
+            scale = np.abs(ref) if name != 'g' else np.maximum(np.abs(ref), 1)
+            err = np.abs(approx-ref)/scale
+            errors[name+' max'] = float(np.max(err))
+            errors[name+' p99'] = float(np.percentile(err, 99))
+        return errors
+
+    def validate_component(self, input_dict):
+        """
+        Relative error of the size-integrated optical properties of a
+        component computed with the table against the exact PyMieScatt path
+        of ext_aerosol.
+
+        Parameters
+        ----------
+        input_dict : Dictionary of input parameters of ext_aerosol. No file
+            is written.
+
+        Returns
+        -------
+        Dictionary with the maximum relative error over all wavelengths of
+        'Ext.Coeff', 'Sca.Coeff', 'Abs.Coeff', 'SSA' and 'g'.
+
+        """
+        from AeroMix.newAerosol import _radiusarray, _extwavelength
+        rad_array = _radiusarray(input_dict['Minimum radius'],
+                                 input_dict['Maximum radius'])
+        names = ['Ext.Coeff', 'Sca.Coeff', 'Abs.Coeff', 'SSA', 'g']
+        errors = {name: 0.0 for name in names}
+        for lamb, ref in input_dict['Spectral refractive indices'].items():
+            approx = _extwavelength(lamb, ref, input_dict['Std dev'],
+                                    rad_array, input_dict['Mode radius'],
+                                    'vector', table=self)
+            exact = _extwavelength(lamb, ref, input_dict['Std dev'],
+                                   rad_array, input_dict['Mode radius'],
+                                   'pymiescatt')
+            for name, a, e in zip(names, approx, exact):
+                errors[name] = max(errors[name], float(abs(a-e)/abs(e)))
+        return errors
+
+
+def build_mie_table(path, x_range=(1e-3, 600), n_range=(1.3, 2.8),
+                    k_range=(kmin, 1.2), nx=600, nn=31, nk=40, k_split=1e-3):
+    """
+    Build a Mie lookup table with the vectorized Mie kernel.
+
+    Parameters
+    ----------
+    path : Location of the table file (.npz).
+    x_range : Smallest and largest size parameter. The default is
+        (1e-3, 600), which covers radii up to 20 µm at 0.25 µm.
+    n_range : Smallest and largest real refractive index. The default is
+        (1.3, 2.8).
+    k_range : Smallest and largest imaginary refractive index. The default is
+        (1e-9, 1.2).
+    nx : Number of size parameters (log-spaced). The default is 600.
+    nn : Number of real refractive indices. The default is 31.
+    nk : Number of imaginary refractive indices. The default is 40.
+    k_split : Imaginary refractive index above which four fifths of the nk
+        values are placed. The efficiencies of strongly absorbing particles
+        change fastest with k. Both parts are log-spaced. The default is 1e-3.
+
+    Returns
+    -------
+    The MieTable read back from path.
+
+    """
+    log_x = np.linspace(np.log10(x_range[0]), np.log10(x_range[1]), nx)
+    n = np.linspace(n_range[0], n_range[1], nn)
+    log_k = np.concatenate([
+        np.linspace(np.log10(k_range[0]), np.log10(k_split), nk//5,
+                    endpoint=False),
+        np.linspace(np.log10(k_split), np.log10(k_range[1]), nk-nk//5)])
+    qsca = np.zeros((nx, nn, nk))
+    qabs = np.zeros((nx, nn, nk))
+    g = np.zeros((nx, nn, nk))
+    for i in range(nn):
+        for j in range(nk):
+            result = mie_q(n[i]+1j*10**log_k[j], 10**log_x)
+            qsca[:, i, j] = result[1]
+            qabs[:, i, j] = result[2]
+            g[:, i, j] = result[3]
+    if not path.endswith('.npz'):
+        path = path+'.npz'
+    np.savez(path, log_x=log_x, n=n, log_k=log_k,
+             log_qsca=np.log(np.maximum(qsca, 1e-300)),
+             log_qabs=np.log(np.maximum(qabs, 1e-300)), g=g)
+    return MieTable(path)
+
+
+# Build a table with the default settings and report its error, e.g.
+# python -m AeroMix.MieTable mie_table.npz
+if __name__ == '__main__':
+    table = build_mie_table(sys.argv[1] if len(sys.argv) > 1 else
+                            'mie_table.npz')
+    print('Maximum and 99th percentile relative error of interpolated single '
+          'particles')
+    for name, value in table.validate().items():
+        print(name+': '+'{:e}'.format(value))
+    from AeroMix.newAerosol import getSampleInputDict_ext
+    print('Maximum relative error of the sample externally mixed component')
+    for name, value in table.validate_component(
+            getSampleInputDict_ext()).items():
+        print(name+': '+'{:e}'.format(value))
@@ -0,0 +1,89 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+"""
+
+import numpy as np
+from AeroMix.AeroMix_exceptions import WavelengthError
+
+# Columns of the component files interpolated as power laws of the
+# wavelength (ext. coeff., sca. coeff., abs. coeff., normalised ext. and
+# imaginary refractive index). The asymmetry parameter and the real
+# refractive index are interpolated linearly in log wavelength and the SSA
+# is taken as sca. coeff./ext. coeff.
+_powerlaw_columns = [0, 1, 2, 5, 7]
+
+# Function to interpolate the columns of values (wavelengths x columns) to
+# new wavelengths, linearly in log wavelength and, for the columns in
+# powerlaw, also in log value. Values of different sign or zero at the two
+# bracketing wavelengths are interpolated linearly. The values at the given
+# wavelengths are returned unchanged.
+
+
+def _loginterp(wavelengths, values, new_wavelengths, powerlaw):
+    lamb = np.asarray(wavelengths, dtype=float)
+    values = np.asarray(values, dtype=float)
+    new = np.asarray(new_wavelengths, dtype=float)
+    order = np.argsort(lamb)
+    lamb = lamb[order]
+    values = values[order]
+    if not np.all((new >= lamb[0]) & (new <= lamb[-1])):
+        raise WavelengthError("Wavelength outside the range "+str(lamb[0]) +
+                              "-"+str(lamb[-1])+" um of the component data",
+                              'Wavelengths')
+    if lamb.size == 1:
+        return np.repeat(values, new.size, axis=0)
+    i = np.clip(np.searchsorted(lamb, new, side='right')-1, 0, lamb.size-2)
+    t = ((np.log(new)-np.log(lamb[i])) /
+         (np.log(lamb[i+1])-np.log(lamb[i])))[:, np.newaxis]
+    lower = values[i]
+    upper = values[i+1]
+    result = lower+t*(upper-lower)
+    same_sign = (lower*upper > 0)[:, powerlaw]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_lower = np.log(np.abs(lower[:, powerlaw]))
+        log_upper = np.log(np.abs(upper[:, powerlaw]))
+        power = np.sign(lower[:, powerlaw])*np.exp(
+            log_lower+t*(log_upper-log_lower))
+    result[:, powerlaw] = np.where(same_sign, power, result[:, powerlaw])
+    result = np.where(t == 0, lower, result)
+    return np.where(t == 1, upper, result)
+
+
+def interpolate_spectrum(wavelengths, optical, new_wavelengths):
+    """
+    Interpolate the spectral optical data of a component to other
+    wavelengths.
+
+    The extinction, scattering and absorption coefficients, the normalised
+    extinction and the imaginary refractive index are interpolated as power
+    laws between neighbouring wavelengths, i.e. with a constant Ångström
+    exponent. The asymmetry parameter and the real refractive index are
+    interpolated linearly in log wavelength and the SSA is the ratio of the
+    interpolated scattering and extinction coefficients. Data at the given
+    wavelengths are returned unchanged.
+
+    Parameters
+    ----------
+    wavelengths : List of the wavelengths (µm) of the data.
+    optical : Array of shape (wavelengths x 8) holding ext. coeff.,
+        sca. coeff., abs. coeff., SSA, g, normalised ext., real and imaginary
+        refractive index, as in the component files.
+    new_wavelengths : Wavelengths (µm) within the range of wavelengths.
+
+    Returns
+    -------
+    Array of shape (new wavelengths x 8).
+
+    """
+    lamb = np.asarray(wavelengths, dtype=float)
+    optical = np.asarray(optical, dtype=float)
+    new = np.atleast_1d(np.asarray(new_wavelengths, dtype=float))
+    result = _loginterp(lamb, optical, new, _powerlaw_columns)
+    exact = np.isin(new, lamb)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ssa = np.where(result[:, 0] != 0, result[:, 1]/result[:, 0],
+                       result[:, 3])
+    result[:, 3] = np.where(exact, result[:, 3], ssa)
+    return result
@@ -1,4 +1,91 @@
-from AeroMix.AeroMix_main import run
-from AeroMix.getAerosolType import getAerosolType
-from AeroMix.CopyAerosolData import CopyAerosolData
-from AeroMix.newAerosol import ext_aerosol,cs_aerosol,getSampleInputDict_ext,getSampleInputDict_cs
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+
+The functions and classes of the package are imported from their modules
+when first used, so that e.g. PyMieScatt and SciPy are only loaded by the
+functions creating aerosol components.
+"""
+import importlib
+import sys
+import types
+
+# Module of each public name of the package
+_lazy_names = {
+    'run': 'AeroMix_main', 'run_layers': 'AeroMix_main',
+    'validate_input': 'AeroMix_main',
+    'run_batch': 'AeroMix_batch', 'run_scenarios': 'AeroMix_batch',
+    'getAerosolType': 'getAerosolType',
+    'CopyAerosolData': 'CopyAerosolData',
+    'ext_aerosol': 'newAerosol', 'cs_aerosol': 'newAerosol',
+    'getSampleInputDict_ext': 'newAerosol',
+    'getSampleInputDict_cs': 'newAerosol',
+    'ComponentDatabase': 'ComponentDatabase',
+    'component_db': 'ComponentDatabase',
+    'write_binary_component': 'ComponentDatabase',
+    'convert_component_library': 'ComponentDatabase',
+    'use_component_library': 'ComponentDatabase',
+    'ComponentLibrary': 'ComponentLibrary',
+    'build_component_library': 'ComponentLibrary',
+    'MieCache': 'MieCache',
+    'MieTable': 'MieTable', 'build_mie_table': 'MieTable',
+    'HumidityTensor': 'HumidityTensor',
+    'interpolate_spectrum': 'SpectralInterpolation',
+    'run_grid': 'AeroMix_grid',
+    'AeroMixServer': 'AeroMix_server', 'AeroMixClient': 'AeroMix_server',
+    'serve': 'AeroMix_server',
+    'retrieve': 'AeroMix_retrieval', 'retrieve_batch': 'AeroMix_retrieval',
+    'run_jacobian': 'AeroMix_sensitivity',
+    'run_uncertainty': 'AeroMix_uncertainty',
+    'AeroMixResult': 'AeroMix_result',
+    'ResultWriter': 'AeroMix_export', 'save_results': 'AeroMix_export',
+    'load_results': 'AeroMix_export',
+    'AeroMixError': 'AeroMix_exceptions', 'InputError': 'AeroMix_exceptions',
+    'WavelengthError': 'AeroMix_exceptions',
+    'RelativeHumidityError': 'AeroMix_exceptions',
+    'ComponentError': 'AeroMix_exceptions',
+    'ProfileError': 'AeroMix_exceptions',
+    'ComponentDataError': 'AeroMix_exceptions',
+    'instrument': 'AeroMix_instrument',
+    'InstrumentStats': 'AeroMix_instrument',
+    'add_callback': 'AeroMix_instrument',
+    'remove_callback': 'AeroMix_instrument'}
+_submodules = sorted(set(_lazy_names.values()) | {'vectorMie'})
+
+__all__ = list(_lazy_names)
+
+
+class _Package(types.ModuleType):
+    """
+    Module type of the package. Importing a submodule binds it as attribute
+    of the package, so that the functions and classes with the name of their
+    submodule, e.g. getAerosolType, are bound again instead.
+    """
+
+    def __setattr__(self, name, value):
+        if isinstance(value, types.ModuleType) and \
+                _lazy_names.get(name) == name and \
+                value.__name__ == __name__+'.'+name:
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
+
+
+def __getattr__(name):
+    if name in _lazy_names:
+        value = getattr(importlib.import_module(
+            __name__+'.'+_lazy_names[name]), name)
+    elif name in _submodules:
+        value = importlib.import_module(__name__+'.'+name)
+    else:
+        raise AttributeError("module 'AeroMix' has no attribute "+name)
+    # Later lookups find the name without calling __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names) | set(_submodules))
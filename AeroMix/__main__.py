@@ -0,0 +1,299 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+
+Command line interface evaluating streams of scenarios, e.g.
+
+    python -m AeroMix scenarios.jsonl -o results.jsonl
+    python -m AeroMix scenarios.jsonl -o results --output-format npy
+    cat scenarios.csv | python -m AeroMix --format csv --wavelengths 0.44,0.55
+
+or starting a local server (see AeroMix_server), e.g.
+
+    python -m AeroMix serve --socket /tmp/aeromix.sock
+
+Each scenario is one JSON object per line (JSONL) or one row of a CSV file
+with a header. The keys 'type', 'wavelengths', 'rh' and 'max_components'
+select a getAerosolType preset, 'id' is copied to the result and all other
+keys override entries of the input dictionary. Overrides of one component
+concentration or profile parameter are written as
+'Layer1 component concentration.2' or 'Layer1 profile params.2' (counted
+from 1). CSV values are read as JSON where possible, e.g. [0.44, 0.55], and
+as text otherwise.
+"""
+
+import sys
+import csv
+import json
+import argparse
+import numpy as np
+from AeroMix.getAerosolType import getAerosolType
+from AeroMix.AeroMix_batch import _evaluatescenarios, _jsonvalue
+from AeroMix.AeroMix_export import ResultWriter
+from AeroMix.AeroMix_exceptions import InputError
+
+# Fields of run_batch that can be written. Fields of the layers have one
+# value per layer and wavelength (or component).
+output_fields = ['Total column AOD', 'AOD', 'Extinction coefficient',
+                 'Scattering coefficient', 'Absorption coefficient', 'SSA',
+                 'g', 'Number concentration', 'Mass concentration',
+                 'Volume concentration']
+default_fields = ['Total column AOD', 'Extinction coefficient', 'SSA', 'g']
+# Fields with one value per layer and component
+_component_fields = ['Number concentration', 'Mass concentration',
+                     'Volume concentration']
+
+# Keys of a scenario selecting the getAerosolType preset
+_preset_keys = ['id', 'type', 'wavelengths', 'rh', 'max_components']
+
+# Function to read the scenarios of a stream one at a time. Lines that are
+# not valid JSON give an InputError in place of the scenario.
+
+
+def _readscenarios(stream, fmt):
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key: _parsevalue(value) for key, value in row.items()
+                   if key is not None and value not in (None, '')}
+    else:
+        for n, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    scenario = json.loads(line)
+                except ValueError:
+                    scenario = None
+                yield scenario if isinstance(scenario, dict) else \
+                    InputError("Line "+str(n)+" is not a JSON object")
+
+
+def _parsevalue(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+# Function to build the input dictionary of a scenario
+
+
+def _inputdict(scenario, wavelengths):
+    var = getAerosolType(scenario.get('type', 'default'),
+                         scenario.get('wavelengths', wavelengths),
+                         scenario.get('rh', 0),
+                         scenario.get('max_components', 9))
+    for key, value in scenario.items():
+        if key in _preset_keys:
+            continue
+        if key not in var and '.' in key:
+            key, index = key.rsplit('.', 1)
+            if key not in var:
+                raise InputError("Unknown input "+key)
+            var[key][int(index) if isinstance(var[key], dict) else
+                     int(index)-1] = value
+        elif key.endswith('component concentration'):
+            # JSON object keys are text
+            var[key] = {int(i): c for i, c in value.items()}
+        else:
+            var[key] = value
+    return var
+
+# Function to evaluate a batch of scenarios, grouped into run_batch calls.
+# Scenarios that fail, or whose input dictionary could not be built, give a
+# result with the error.
+
+
+def _evaluate(batch, fields):
+    inputs = [var for ident, var in batch if not isinstance(var, Exception)]
+    outputs = iter(_evaluatescenarios(inputs))
+    results = []
+    for ident, var in batch:
+        output = var if isinstance(var, Exception) else next(outputs)
+        if isinstance(output, Exception):
+            results.append({'id': ident, 'error': output})
+            continue
+        result = {'id': ident, 'Wavelengths': var['Wavelengths']}
+        for field in fields:
+            result[field] = output[field]
+        results.append(result)
+    return results
+
+# Function to stack the results of a batch into arrays with the scenarios
+# along the first axis, e.g. for ResultWriter
+
+
+def _stackresults(results, fields):
+    output = {'Wavelengths': results[0]['Wavelengths']}
+    for result in results:
+        if result['Wavelengths'] != output['Wavelengths']:
+            raise InputError("Columnar results need the same wavelengths in "
+                             "all scenarios")
+    for field in fields:
+        output[field] = np.array([result[field] for result in results])
+    return output
+
+# Function to flatten a result to CSV columns, e.g. 'SSA L1 0.55' for the
+# SSA of layer 1 at 0.55 µm
+
+
+def _csvrow(result, fields):
+    row = {'id': result['id']}
+    wavelengths = result['Wavelengths']
+    for field in fields:
+        value = np.asarray(result[field], dtype=float)
+        if value.ndim == 1:
+            for w, v in zip(wavelengths, value):
+                row[field+' '+str(w)] = v
+            continue
+        labels = (range(1, value.shape[1]+1) if field in _component_fields
+                  else wavelengths)
+        for k in range(value.shape[0]):
+            for label, v in zip(labels, value[k]):
+                row[field+' L'+str(k+1)+' '+str(label)] = v
+    return row
+
+
+def main(argv=None):
+    """
+    Evaluate a stream of scenarios and write one result per scenario.
+
+    Parameters
+    ----------
+    argv : List of command line arguments. The default is sys.argv[1:].
+        Arguments starting with 'serve' start an AeroMixServer instead.
+
+    Returns
+    -------
+    Exit status, 1 if any scenario failed and 0 otherwise.
+
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['serve']:
+        from AeroMix.AeroMix_server import main as serve_main
+        serve_main(argv[1:])
+        return
+    parser = argparse.ArgumentParser(
+        prog='python -m AeroMix',
+        description='Evaluate AeroMix scenarios read line by line from a '
+        'JSONL or CSV file and write one result line per scenario.')
+    parser.add_argument('input', nargs='?', default='-',
+                        help="scenario file, '-' for stdin (default)")
+    parser.add_argument('-o', '--output', default='-',
+                        help="result file, '-' for stdout (default)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'],
+                        help='format of the scenarios (default: csv for '
+                        '.csv files, else jsonl)')
+    parser.add_argument('--output-format',
+                        choices=['jsonl', 'csv', 'npy', 'parquet'],
+                        help='format of the results (default: as --format). '
+                        'npy writes a directory of columnar arrays and '
+                        'parquet a Parquet file (see ResultWriter).')
+    parser.add_argument('--wavelengths', default='0.55',
+                        help='comma separated wavelengths (µm) of scenarios '
+                        'without wavelengths (default: 0.55)')
+    parser.add_argument('--fields', default=','.join(default_fields),
+                        help='comma separated output fields (default: '
+                        + ','.join(default_fields)+')')
+    parser.add_argument('--batch-size', type=int, default=256,
+                        help='number of scenarios evaluated together '
+                        '(default: 256)')
+    args = parser.parse_args(argv)
+    fmt = args.format or ('csv' if args.input.endswith('.csv') else 'jsonl')
+    output_format = args.output_format or fmt
+    wavelengths = [float(w) for w in args.wavelengths.split(',')]
+    fields = args.fields.split(',')
+    for field in fields:
+        if field not in output_fields:
+            parser.error('unknown field '+field)
+    columnar = output_format in ('npy', 'parquet')
+    if columnar and args.output == '-':
+        parser.error(output_format+' results need an output path (-o)')
+    if (output_format == 'parquet') != args.output.endswith('.parquet') \
+            and columnar:
+        parser.error('parquet results need an output path ending with '
+                     '.parquet')
+
+    instream = sys.stdin if args.input == '-' else open(args.input, 'r',
+                                                        newline='')
+    if columnar:
+        outstream = None
+        writer = ResultWriter(args.output, fields)
+    else:
+        outstream = sys.stdout if args.output == '-' else \
+            open(args.output, 'w', newline='')
+        writer = None
+    failures = 0
+    try:
+        batch = []
+        scenarios = _readscenarios(instream, fmt)
+        while True:
+            scenario = next(scenarios, None)
+            if isinstance(scenario, Exception):
+                batch.append((None, scenario))
+            elif scenario is not None:
+                try:
+                    var = _inputdict(scenario, wavelengths)
+                except Exception as error:
+                    var = error
+                batch.append((scenario.get('id'), var))
+            if batch and (scenario is None or len(batch) >= args.batch_size):
+                results = []
+                # Failed scenarios are reported on stderr and, for JSONL
+                # results, with their error
+                for result in _evaluate(batch, fields):
+                    if 'error' not in result:
+                        results.append(result)
+                        continue
+                    failures += 1
+                    sys.stderr.write('Error: scenario '+str(result['id']) +
+                                     ': '+str(result['error'])+'\n')
+                    if output_format == 'jsonl':
+                        results.append(result)
+                if columnar and results:
+                    writer.append(_stackresults(results, fields),
+                                  [result['id'] for result in results])
+                    results = []
+                for result in results:
+                    if output_format == 'csv':
+                        row = _csvrow(result, fields)
+                        if writer is None:
+                            writer = csv.DictWriter(outstream,
+                                                    fieldnames=list(row))
+                            writer.writeheader()
+                        elif list(row) != writer.fieldnames:
+                            # A CSV result with other columns than the
+                            # first one fails on its own
+                            failures += 1
+                            sys.stderr.write(
+                                'Error: scenario '+str(result['id'])+': ' +
+                                'CSV results need the same wavelengths and '
+                                'components in all scenarios\n')
+                            continue
+                        writer.writerow(row)
+                        continue
+                    if 'error' in result:
+                        record = {'id': result['id'],
+                                  'error': str(result['error']),
+                                  'type': type(result['error']).__name__}
+                    else:
+                        record = {'id': result['id'],
+                                  'Wavelengths': result['Wavelengths']}
+                        for field in fields:
+                            record[field] = _jsonvalue(result[field])
+                    outstream.write(json.dumps(record)+'\n')
+                if outstream is not None:
+                    outstream.flush()
+                batch = []
+            if scenario is None:
+                break
+    finally:
+        if instream is not sys.stdin:
+            instream.close()
+        if columnar:
+            writer.close()
+        elif outstream is not sys.stdout:
+            outstream.close()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -23,8 +23,10 @@ def getAerosolType(name, wavelength_array, mixed_layer_rh, max_no_comps=9):
          4.5, 5.0, 5.5, 6.0, 6.2, 6.5, 7.2, 7.9, 8.2, 8.5, 8.7, 9.0, 9.2, 9.5,
          9.8, 10.0, 10.6, 11.0, 11.5, 12.5, 13.0, 14.0, 14.8, 15.0, 16.4, 17.2,
          18.0, 18.5, 20.0, 21.3, 22.5, 25.0, 27.9, 30.0, 35.0, 40.0].
+        Other wavelengths between 0.25 and 40 µm are interpolated.
     mixed_layer_rh : An integer representing the relative humidity percentage
-        in the mixed layer. Acceptable values are (0,50,70,80,90,95,98,99)
+        in the mixed layer. Acceptable values are (0,50,70,80,90,95,98,99).
+        Other values between 0 and 99 are interpolated.
     max_no_comps : Maximum number of components to constitute the mixture.
         Should be 9 or greater. The default is 9
 
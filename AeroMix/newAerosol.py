@@ -6,6 +6,9 @@ Copyright © 2023  Sam P Raj and P R Sinha
 
 import os
 import sys
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from math import pi
 from math import exp
 from math import sqrt
@@ -14,6 +17,15 @@ from numpy import log as ln
 from numpy import log10 as log
 from scipy.integrate import trapezoid as trap
 import PyMieScatt as ps
+from AeroMix.ComponentDatabase import component_db
+from AeroMix.vectorMie import mie_q, rayleigh_limit
+from AeroMix.SpectralInterpolation import _loginterp
+from AeroMix.AeroMix_exceptions import InputError, ComponentDataError
+from AeroMix.AeroMix_instrument import _start, _record
+
+# Relative weight of the size distribution below which the adaptive
+# quadrature ignores the radius range
+weight_threshold = 1e-8
 
 
 def getSampleInputDict_ext():
@@ -95,7 +107,177 @@ def getSampleInputDict_cs():
     return input_dict
 
 
-def _miecoeff(n, sigma, rad_array, lamb, rm, ref):
+# Function to create the radius array of the size distribution
+
+
+def _radiusarray(xrmin, xrmax):
+    deltar = 0.015
+    xr = np.zeros(100000)
+    xr[0] = xrmin
+    ix = 1
+    xranf = log(xrmin)
+    while xr[ix-1] < xrmax:
+        xrl = xranf+deltar*(ix-1)
+        xr[ix] = 10**(xrl)
+        ix = ix+1
+    rad_array = xr[1:np.argmax(xr)+1]
+    return rad_array
+
+# Function to give the nodes and weights of Fejer's second rule with N-1
+# nodes on [-1, 1]. The nodes for N are every other node for 2N, so all values
+# are reused when N is doubled.
+
+
+@functools.lru_cache(maxsize=None)
+def _fejer(N):
+    theta = np.arange(1, N)*pi/N
+    w = np.zeros(N-1)
+    for k in range(1, N//2+1):
+        w += np.sin((2*k-1)*theta)/(2*k-1)
+    return np.cos(theta), 4*np.sin(theta)*w/N
+
+# Function to integrate the mie coefficients of one wavelength over the size
+# distribution with adaptive quadrature in ln(r). func returns the ext, sca,
+# abs and sca*g integrands for an array of radii. The integrand is a lognormal
+# in ln(r) centred at ln(rm)+2s^2 times efficiencies that grow at most as r^4,
+# and the range where it is below weight_threshold is skipped. The rest is
+# split into panels of about 2s that end on points of rad_array. The
+# efficiencies are discontinuous at the Rayleigh limit, so the interval of
+# rad_array around it is integrated with the trapezoid rule, which keeps the
+# results within tol of the trapezoid rule on rad_array. The nodes of each
+# panel are doubled until the panel changes by less than tol/(2 panels)
+# relative to each of the four integrals, so that SSA = sca/ext and
+# g = sca*g/sca are within about tol as well. Integrals below weight_threshold
+# times the extinction (e.g. abs of non-absorbing particles) are converged to
+# that fraction of the extinction instead. A panel that does not converge
+# before it needs more nodes than rad_array has in it (e.g. the resonances of
+# large, weakly absorbing particles) is integrated with the trapezoid rule on
+# those points, as without quadrature.
+
+
+def _adaptiveintegral(func, rad_array, rm, sigma, lamb, tol):
+    s = ln(sigma)
+    u_grid = ln(rad_array)
+    mu = ln(rm)+2*s**2
+    c = sqrt(2*ln(1/weight_threshold))
+    i0 = np.searchsorted(u_grid, mu-c*s)
+    i1 = np.searchsorted(u_grid, mu+c*s+4*s**2, side='right')-1
+    i0 = min(i0, len(rad_array)-1)
+    i1 = max(i1, i0)
+    step = max(1, int(round(2*s/(u_grid[1]-u_grid[0]))))
+    edges = list(u_grid[i0:i1:step])+[u_grid[i1]]
+    # Points of rad_array around the Rayleigh limit
+    j = np.searchsorted(u_grid, ln(rayleigh_limit*lamb/(2*pi)))
+    if i0 < j <= i1:
+        edges = sorted(set(edges) | {u_grid[j-1], u_grid[j]})
+    panels = list(zip(edges[:-1], edges[1:]))
+    if len(panels) == 0:
+        r = rad_array[i0:i1+1]
+        return np.array([trap(f, r) for f in func(r)]) if r.size > 1 \
+            else np.zeros(4)
+    N = [4]*len(panels)
+    values = [None]*len(panels)
+    estimate = np.zeros((len(panels), 4))
+    previous = np.full((len(panels), 4), np.nan)
+    active = list(range(len(panels)))
+    if i0 < j <= i1:
+        k = panels.index((u_grid[j-1], u_grid[j]))
+        r = rad_array[j-1:j+1]
+        estimate[k] = [trap(f, r) for f in func(r)]
+        active.remove(k)
+    while active:
+        # Evaluate the new nodes of all active panels at once
+        radii = []
+        for k in active:
+            lo, hi = panels[k]
+            u = 0.5*(hi-lo)*_fejer(N[k])[0]+0.5*(hi+lo)
+            radii.append(np.exp(u if values[k] is None else u[::2]))
+        r = np.concatenate(radii)
+        f = np.array(func(r))*r
+        start = 0
+        for k, rk in zip(active, radii):
+            new = f[:, start:start+rk.size]
+            start += rk.size
+            if values[k] is not None:
+                merged = np.empty((4, N[k]-1))
+                merged[:, ::2] = new
+                merged[:, 1::2] = values[k]
+                new = merged
+            values[k] = new
+            lo, hi = panels[k]
+            previous[k] = estimate[k]
+            estimate[k] = 0.5*(hi-lo)*(new@_fejer(N[k])[1])
+        total = estimate.sum(axis=0)
+        scale = np.maximum(np.abs(total), weight_threshold*abs(total[0]))
+        remaining = []
+        for k in active:
+            change = np.max(np.abs(estimate[k]-previous[k])/scale)
+            if change <= 0.5*tol/len(panels):
+                continue
+            lo, hi = panels[k]
+            inside = rad_array[(u_grid > lo) & (u_grid < hi)]
+            if 2*N[k]-1 > inside.size+2:
+                # Trapezoid rule on the points of rad_array in the panel
+                r = np.concatenate([[np.exp(lo)], inside, [np.exp(hi)]])
+                estimate[k] = [trap(fr, r) for fr in func(r)]
+                continue
+            N[k] = 2*N[k]
+            remaining.append(k)
+        active = remaining
+    return estimate.sum(axis=0)
+
+# Functions to compute Mie efficiencies missing from a MieCache. Each row of
+# params holds (real index, imaginary index, size parameter) for spheres and
+# (core real, core imaginary, shell real, shell imaginary, core size
+# parameter, shell size parameter) for core-shell particles.
+
+
+def _vectorcompute(params):
+    return np.column_stack(mie_q(params[:, 0]+1j*params[:, 1], params[:, 2]))
+
+
+def _pymiescattcompute(params):
+    return [ps.MieQ(m=complex(p[0], p[1]), wavelength=1.0, diameter=p[2]/pi,
+                    asDict=False, asCrossSection=False)[:4] for p in params]
+
+
+def _coreshellcompute(params):
+    return [ps.MieQCoreShell(
+        mCore=complex(p[0], p[1]), mShell=complex(p[2], p[3]), wavelength=1.0,
+        dCore=p[4]/pi, dShell=p[5]/pi, asDict=False,
+        asCrossSection=False)[:4] for p in params]
+
+
+_spherecompute = {'vector': _vectorcompute,
+                  'pymiescatt': _pymiescattcompute}
+
+
+def _miecoeff(n, sigma, rad_array, lamb, rm, ref, backend='vector',
+              cache=None, table=None):
+    start = _start()
+    if backend == 'vector' or cache is not None or table is not None:
+        # Mie program for all radii at once
+        rad_array = np.asarray(rad_array)
+        x = 2*pi*rad_array/lamb
+        if table is not None:
+            qext, qsca, qabs, g = table.lookup(ref, x)
+            evaluations = 0
+        elif cache is not None:
+            params = np.column_stack([np.full(x.size, ref.real),
+                                      np.full(x.size, ref.imag), x])
+            misses = cache.misses
+            qext, qsca, qabs, g = cache.lookup(
+                'sphere', params, _spherecompute[backend]).T
+            evaluations = cache.misses-misses
+        else:
+            qext, qsca, qabs, g = mie_q(ref, x)
+            evaluations = x.size
+        if start is not None:
+            _record('Mie', start, mie=evaluations)
+        # Mie coeff calculation for log-normal dist.
+        dist = 1e-3*sqrt(pi/2.0)*(n/ln(sigma))*rad_array*np.exp(
+            -0.5*(((ln(rad_array/rm))**2)/(ln(sigma))**2))
+        return dist*qext, dist*qsca, dist*qabs, dist*qsca*g
     bext_array = []
     bsca_array = []
     babs_array = []
@@ -120,10 +302,84 @@ def _miecoeff(n, sigma, rad_array, lamb, rm, ref):
         bsca_array.append(bsca)
         babs_array.append(babs)
         g_array.append(g_val)
+    if start is not None:
+        _record('Mie', start, mie=len(rad_array))
     return bext_array, bsca_array, babs_array, g_array
 
 
-def ext_aerosol(input_dict):
+# Functions to integrate the mie coefficients of one wavelength over the size
+# distribution. They are defined at module level so that they can be sent to
+# worker processes.
+
+
+def _extwavelength(lamb, ref, sigma, rad_array, rm, backend, cache=None,
+                   table=None, quadrature='trapezoid', tol=1e-3):
+    def func(r):
+        return _miecoeff(n=1, sigma=sigma, rad_array=r, lamb=lamb, rm=rm,
+                         ref=ref, backend=backend, cache=cache, table=table)
+    return _integratewavelength(func, rad_array, rm, sigma, lamb, quadrature,
+                                tol)
+
+
+def _cswavelength(lamb, refc, refs, sigma, rad_array, csr, rm, cache,
+                  quadrature='trapezoid', tol=1e-3):
+    def func(r):
+        return _csmiecoeff(n=1, sigma=sigma, rad_array=r, csr=csr, lamb=lamb,
+                           rm=rm, refc=refc, refs=refs, cache=cache)
+    return _integratewavelength(func, rad_array, rm, sigma, lamb, quadrature,
+                                tol)
+
+
+def _integratewavelength(func, rad_array, rm, sigma, lamb, quadrature, tol):
+    if quadrature == 'adaptive':
+        bext, bsca, babs, bg = _adaptiveintegral(func, rad_array, rm, sigma,
+                                                 lamb, tol)
+    else:
+        bext_array, bsca_array, babs_array, g_array = func(rad_array)
+        bext = trap(bext_array, rad_array)
+        bsca = trap(bsca_array, rad_array)
+        babs = trap(babs_array, rad_array)
+        bg = trap(g_array, rad_array)
+    ssa = bsca/bext
+    g_val = bg/bsca
+    return bext, bsca, babs, ssa, g_val
+
+# Function to check the quadrature of ext_aerosol and cs_aerosol
+
+
+def _checkquadrature(quadrature):
+    if quadrature not in ('trapezoid', 'adaptive'):
+        raise InputError("Invalid quadrature. Use 'trapezoid' or 'adaptive'")
+
+# Function to return the extinction coefficient at 0.55 µm used to normalise
+# the extinction. It is interpolated as a power law of the wavelength when
+# 0.55 µm is not among the wavelengths.
+
+
+def _ext550(Bext):
+    if 0.55 in Bext:
+        return Bext[0.55]
+    return _loginterp(list(Bext.keys()),
+                      np.array(list(Bext.values()))[:, np.newaxis], [0.55],
+                      [0])[0, 0]
+
+# Function to evaluate the wavelengths serially, on a process pool of the
+# given size or on a user supplied executor. Results are returned in the
+# order of the wavelengths.
+
+
+def _mapwavelengths(func, args, workers=None, executor=None):
+    if executor is not None:
+        return list(executor.map(func, *args))
+    if workers is not None and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(func, *args))
+    return list(map(func, *args))
+
+
+def ext_aerosol(input_dict, mie_backend='vector', workers=None,
+                executor=None, mie_cache=None, mie_table=None,
+                quadrature='trapezoid', quad_tol=1e-3):
     """
     Models new aerosol components in an externally mixed state.
 
@@ -170,7 +426,34 @@ def ext_aerosol(input_dict):
                          10.0, 10.6, 11.0, 11.5, 12.5, 13.0, 14.0, 14.8, 15.0,
                          16.4, 17.2, 18.0, 18.5, 20.0, 21.3, 22.5, 25.0, 27.9,
                          30.0, 35.0, 40.0]. m and k are the real and imaginary
-            part of the refractive index.
+            part of the refractive index. Other wavelengths may be given,
+            but their range should include 0.55 µm, the wavelength at which
+            the extinction is normalised.
+
+    mie_backend (str): Mie program used for the calculation. 'vector'
+    (default) evaluates all radii of a wavelength in one array operation and
+    'pymiescatt' calls PyMieScatt.MieQ for each radius.
+
+    workers (int): Number of worker processes used to evaluate the
+    wavelengths in parallel. The default runs serially.
+
+    executor (concurrent.futures.Executor): Executor used to evaluate the
+    wavelengths instead of a new process pool. Takes precedence over workers.
+
+    mie_cache (AeroMix.MieCache): Persistent cache of Mie efficiencies. When
+    given, the efficiencies are evaluated at refractive indices and size
+    parameters rounded to the precision of the cache and reused across calls.
+
+    mie_table (AeroMix.MieTable): Precomputed Mie lookup table. When given,
+    the efficiencies are interpolated from the table (fast mode) instead of
+    being computed. Takes precedence over mie_backend and mie_cache.
+
+    quadrature (str): Integration over the size distribution. 'trapezoid'
+    (default) uses the fixed radius grid and 'adaptive' places far fewer
+    nodes where the distribution weight is significant.
+
+    quad_tol (float): Relative tolerance of the adaptive quadrature with
+    respect to the coefficients, SSA and g. The default is 1e-3.
 
     Returns
     -------
@@ -178,6 +461,9 @@ def ext_aerosol(input_dict):
     component.
 
     """
+    if mie_backend not in ('vector', 'pymiescatt'):
+        raise InputError("Invalid Mie backend. Use 'vector' or 'pymiescatt'")
+    _checkquadrature(quadrature)
     RMIN = input_dict['Minimum radius']
     RMAX = input_dict['Maximum radius']
     SIGMA = input_dict['Std dev']
@@ -195,18 +481,7 @@ def ext_aerosol(input_dict):
 
     # Creating radius array
 
-    xrmin = RMIN
-    xrmax = RMAX
-    deltar = 0.015
-    xr = np.zeros(100000)
-    xr[0] = xrmin
-    ix = 1
-    xranf = log(xrmin)
-    while xr[ix-1] < xrmax:
-        xrl = xranf+deltar*(ix-1)
-        xr[ix] = 10**(xrl)
-        ix = ix+1
-    rad_array = xr[1:np.argmax(xr)+1]
+    rad_array = _radiusarray(RMIN, RMAX)
 
     # Calculating mie coefficients
 
@@ -218,15 +493,14 @@ def ext_aerosol(input_dict):
     ext_norm = {}
     real = {}
     img = {}
-    for lamb in wavelengths:    # Calculation for each wavelengths
-        bext_array, bsca_array, babs_array, g_array = _miecoeff(
-            n=1, sigma=SIGMA, rad_array=rad_array, lamb=lamb,
-            rm=RMOD, ref=REF[lamb])
-        bext = trap(bext_array, rad_array)
-        bsca = trap(bsca_array, rad_array)
-        babs = trap(babs_array, rad_array)
-        ssa = bsca/bext
-        g_val = (trap(g_array, rad_array))/bsca
+    results = _mapwavelengths(
+        _extwavelength, [wavelengths, [REF[lamb] for lamb in wavelengths],
+                         repeat(SIGMA), repeat(rad_array), repeat(RMOD),
+                         repeat(mie_backend), repeat(mie_cache),
+                         repeat(mie_table), repeat(quadrature),
+                         repeat(quad_tol)], workers, executor)
+    # Calculation for each wavelengths
+    for lamb, (bext, bsca, babs, ssa, g_val) in zip(wavelengths, results):
         Bsca[lamb] = bsca
         Babs[lamb] = babs
         Bext[lamb] = bext
@@ -234,8 +508,9 @@ def ext_aerosol(input_dict):
         g[lamb] = g_val
         real[lamb] = REF[lamb].real
         img[lamb] = REF[lamb].imag*-1
+    ext_550 = _ext550(Bext)
     for lamb in wavelengths:
-        ext_norm[lamb] = Bext[lamb]/Bext[0.55]
+        ext_norm[lamb] = Bext[lamb]/ext_550
     RHOn = RHO
 
     # Write to output file
@@ -277,35 +552,16 @@ def _ReadSizeMassData(comp_name, rh, input_dict):
     elif comp_dir[-1] != '\\' and sys.platform == 'Windows':
         comp_dir = comp_dir+'\\'
     if not os.path.exists(comp_dir):
-        print("Error: Component file directory"+comp_dir+" not found\nExiting program")
-        raise SystemExit
+        raise ComponentDataError("Component file directory "+comp_dir +
+                                 " not found")
     non_hs = {'IS', 'BC', 'MDnm', 'MDam', 'MDcm'}
     comp_name = comp_name+'00' if comp_name in non_hs else comp_name+'_'+rh if comp_name[:6] == 'custom' else comp_name+rh
     if not os.path.exists(comp_dir+comp_name):
-        print("Error: Component file directory "+comp_dir+comp_name+" not found\nExiting program")
-        raise SystemExit
-    REF = {}
-    OptDataFile = open(comp_dir+comp_name, 'r')
-    for line in OptDataFile:
-        if "minimum radius" in line:
-            var_name, min_rad = line.split(':')
-        if "maximum radius" in line:
-            var_name, max_rad = line.split(':')
-        if "sigma" in line:
-            var_name, sigma = line.split(':')
-        if "rho[g/cm**3]" in line:
-            var_name, rho = line.split(':')
-        if "Rmod" and "wet" in line:
-            var_name, Rmod = line.split(':')
-        if "Rmod [um]:" in line:
-            var_name, Rmod = line.split(':')
-        if ',' in line:
-            wavelength, extc, scac, absc, ssa, g, extn, real, img = line.split(
-                ",")
-            REF[float(wavelength)] = complex(float(real), -1*float(img))
-    sizemassdata = {'Rmin': float(min_rad), 'Rmax': float(max_rad),
-                    'sigma': float(sigma), 'rho': float(rho),
-                    'Rmod': float(Rmod)}
+        raise ComponentDataError("Component file directory "+comp_dir +
+                                 comp_name+" not found")
+    sizemassdata = dict(component_db.size_mass_data(comp_dir+comp_name))
+    REF = {wavelength: complex(row[6], -1*row[7]) for wavelength, row in
+           component_db.optical_data(comp_dir+comp_name).items()}
     return sizemassdata, REF
 
 
@@ -315,7 +571,24 @@ def _csr(Mc, Ms, RHOc, RHOs):
     return round(ans, 2)
 
 
-def _csmiecoeff(n, sigma, rad_array, csr, lamb, rm, refc, refs):
+def _csmiecoeff(n, sigma, rad_array, csr, lamb, rm, refc, refs, cache=None):
+    start = _start()
+    if cache is not None:
+        rad_array = np.asarray(rad_array)
+        x = 2*pi*rad_array/lamb
+        params = np.column_stack([np.full(x.size, refc.real),
+                                  np.full(x.size, refc.imag),
+                                  np.full(x.size, refs.real),
+                                  np.full(x.size, refs.imag), x*csr, x])
+        misses = cache.misses
+        qext, qsca, qabs, g = cache.lookup(
+            'coreshell', params, _coreshellcompute).T
+        if start is not None:
+            _record('Mie', start, mie=cache.misses-misses)
+        # Mie coeff calculation for log-normal dist.
+        dist = 1e-3*sqrt(pi/2.0)*(n/ln(sigma))*rad_array*np.exp(
+            -0.5*(((ln(rad_array/rm))**2)/(ln(sigma))**2))
+        return dist*qext, dist*qsca, dist*qabs, dist*qsca*g
     bext_array = []
     bsca_array = []
     babs_array = []
@@ -341,10 +614,13 @@ def _csmiecoeff(n, sigma, rad_array, csr, lamb, rm, refc, refs):
         bsca_array.append(bsca)
         babs_array.append(babs)
         g_array.append(g_val)
+    if start is not None:
+        _record('Mie', start, mie=len(rad_array))
     return bext_array, bsca_array, babs_array, g_array
 
 
-def cs_aerosol(input_dict):
+def cs_aerosol(input_dict, workers=None, executor=None, mie_cache=None,
+               quadrature='trapezoid', quad_tol=1e-3):
     """
     Models aerosol components in a core-shell mixed state.
 
@@ -391,12 +667,29 @@ def cs_aerosol(input_dict):
     input_dict['Mass of shell'] (float): Mass of shell component participating
     in the core-shell mixing. Will not be used if input_dict['Method'] = 'CSR'.
 
+    workers (int): Number of worker processes used to evaluate the
+    wavelengths in parallel. The default runs serially.
+
+    executor (concurrent.futures.Executor): Executor used to evaluate the
+    wavelengths instead of a new process pool. Takes precedence over workers.
+
+    mie_cache (AeroMix.MieCache): Persistent cache of Mie efficiencies. When
+    given, the efficiencies are evaluated at refractive indices and size
+    parameters rounded to the precision of the cache and reused across calls.
+
+    quadrature (str): Integration over the size distribution, 'trapezoid'
+    (default) or 'adaptive', as in ext_aerosol.
+
+    quad_tol (float): Relative tolerance of the adaptive quadrature. The
+    default is 1e-3.
+
     Returns
     -------
     A datafile containing mie coefficients normalised for one particle of the
     component.
 
     """
+    _checkquadrature(quadrature)
     c_data, c_ref = _ReadSizeMassData(
         input_dict['Core'], input_dict['RH'], input_dict)
     s_data, s_ref = _ReadSizeMassData(
@@ -404,29 +697,18 @@ def cs_aerosol(input_dict):
     if input_dict['Method'] == 'CSR':
         CSR = input_dict['CSR']
         if CSR < 0 or CSR > 1:
-            print("Error: Invalid Core to shell radius ratio. Enter a value between 0 and 1")
-            raise SystemExit
+            raise InputError("Invalid Core to shell radius ratio. Enter a "
+                             "value between 0 and 1")
     elif input_dict['Method'] == 'mass':
         CSR = _csr(input_dict['Mass of core'], input_dict['Mass of shell'],
                    c_data['rho'], s_data['rho'])
     else:
-        print('only \'CSR\' or \'mass\' are acceptble inputs for Method. Check your input dictionary.')
-        raise SystemExit
+        raise InputError("Only 'CSR' or 'mass' are acceptable inputs for "
+                         "Method. Check your input dictionary.", 'Method')
 
     # Creating radius array
 
-    xrmin = s_data['Rmin']
-    xrmax = s_data['Rmax']
-    deltar = 0.015
-    xr = np.zeros(100000)
-    xr[0] = xrmin
-    ix = 1
-    xranf = log(xrmin)
-    while xr[ix-1] < xrmax:
-        xrl = xranf+deltar*(ix-1)
-        xr[ix] = 10**(xrl)
-        ix = ix+1
-    rad_array = xr[1:np.argmax(xr)+1]
+    rad_array = _radiusarray(s_data['Rmin'], s_data['Rmax'])
 
     # Calculating mie coefficients
 
@@ -438,15 +720,24 @@ def cs_aerosol(input_dict):
     ext_norm = {}
     real = {}
     img = {}
-    for lamb in list(s_ref.keys()):    # Calculation for each wavelengths
-        bext_array, bsca_array, babs_array, g_array = _csmiecoeff(
-            n=1, sigma=s_data['sigma'], rad_array=rad_array, csr=CSR,
-            lamb=lamb, rm=s_data['Rmod'], refc=c_ref[lamb], refs=s_ref[lamb])
-        bext = trap(bext_array, rad_array)
-        bsca = trap(bsca_array, rad_array)
-        babs = trap(babs_array, rad_array)
-        ssa = bsca/bext
-        g_val = (trap(g_array, rad_array))/bsca
+    wavelengths = list(s_ref.keys())
+    if list(c_ref.keys()) != wavelengths:
+        # Refractive indices of the core at the wavelengths of the shell
+        ref = _loginterp(list(c_ref.keys()),
+                         [[m.real, m.imag] for m in c_ref.values()],
+                         wavelengths, [1])
+        c_ref = {lamb: complex(n, k) for lamb, (n, k) in
+                 zip(wavelengths, ref)}
+    results = _mapwavelengths(
+        _cswavelength, [wavelengths, [c_ref[lamb] for lamb in wavelengths],
+                        [s_ref[lamb] for lamb in wavelengths],
+                        repeat(s_data['sigma']), repeat(rad_array),
+                        repeat(CSR), repeat(s_data['Rmod']),
+                        repeat(mie_cache), repeat(quadrature),
+                        repeat(quad_tol)],
+        workers, executor)
+    # Calculation for each wavelengths
+    for lamb, (bext, bsca, babs, ssa, g_val) in zip(wavelengths, results):
         nan = 999
         Bsca[lamb] = bsca
         Babs[lamb] = babs
@@ -455,8 +746,9 @@ def cs_aerosol(input_dict):
         g[lamb] = g_val
         real[lamb] = nan
         img[lamb] = nan
+    ext_550 = _ext550(Bext)
     for lamb in list(s_ref.keys()):
-        ext_norm[lamb] = Bext[lamb]/Bext[0.55]
+        ext_norm[lamb] = Bext[lamb]/ext_550
 
     RHOn = c_data['rho']*(CSR**3)+s_data['rho']*(1-(CSR**3))
 
@@ -0,0 +1,129 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+"""
+
+import numpy as np
+
+# Size parameter below which the Rayleigh approximation is used, as in
+# PyMieScatt.MieQ
+rayleigh_limit = 0.05
+
+
+def mie_q(m, x):
+    """
+    Lorenz-Mie efficiencies of homogeneous spheres for an array of size
+    parameters.
+
+    The Mie series of all size parameters are evaluated together. The number
+    of series terms is set from the largest size parameter and the terms
+    beyond the usual limit 2+x+4x^(1/3) of each size parameter are discarded,
+    so the results agree with PyMieScatt.MieQ. The logarithmic derivative
+    is started higher than in PyMieScatt, whose recurrence is not converged
+    for large (x > 50), weakly absorbing spheres. The efficiencies of such
+    spheres differ from PyMieScatt by up to a few tenths of a percent.
+
+    Parameters
+    ----------
+    m : Complex refractive index (n+kj), either a scalar or an array that
+        broadcasts against x.
+    x : Array of size parameters (2*pi*radius/wavelength).
+
+    Returns
+    -------
+    Arrays of extinction, scattering and absorption efficiencies and the
+    asymmetry parameter, each with the broadcast shape of m and x.
+
+    """
+    m, x = np.broadcast_arrays(np.asarray(m, dtype=complex),
+                               np.asarray(x, dtype=float))
+    shape = x.shape
+    m = m.ravel()
+    x = x.ravel()
+    qext = np.zeros(x.size)
+    qsca = np.zeros(x.size)
+    qabs = np.zeros(x.size)
+    g = np.zeros(x.size)
+    g[x == 0] = 1.5
+
+    # Rayleigh approximation for small particles
+    small = (x > 0) & (x <= rayleigh_limit)
+    if np.any(small):
+        LL = (m[small]**2-1)/(m[small]**2+2)
+        qsca[small] = 8*np.abs(LL)**2*(x[small]**4)/3
+        qabs[small] = 4*x[small]*LL.imag
+        qext[small] = qsca[small]+qabs[small]
+
+    big = x > rayleigh_limit
+    if np.any(big):
+        mb = m[big]
+        xb = x[big]
+        an, bn, n, nstop = _mie_ab(mb, xb)
+        valid = n[:, np.newaxis] <= nstop[np.newaxis, :]
+        an = np.where(valid, an, 0)
+        bn = np.where(valid, bn, 0)
+        n = n[:, np.newaxis]
+        n1 = 2*n+1
+        n2 = n*(n+2)/(n+1)
+        n3 = n1/(n*(n+1))
+        x2 = xb**2
+        qext[big] = (2/x2)*np.sum(n1*(an.real+bn.real), axis=0)
+        qsca[big] = (2/x2)*np.sum(n1*(an.real**2+an.imag**2+bn.real**2
+                                      + bn.imag**2), axis=0)
+        qabs[big] = qext[big]-qsca[big]
+        a1 = np.zeros_like(an)
+        b1 = np.zeros_like(bn)
+        a1[:-1] = an[1:]
+        b1[:-1] = bn[1:]
+        g[big] = (4/(qsca[big]*x2))*np.sum(
+            n2*(an.real*a1.real+an.imag*a1.imag+bn.real*b1.real
+                + bn.imag*b1.imag)+n3*(an.real*bn.real+an.imag*bn.imag),
+            axis=0)
+    return (qext.reshape(shape), qsca.reshape(shape), qabs.reshape(shape),
+            g.reshape(shape))
+
+# Function to calculate the Mie coefficients an and bn (Bohren and Huffman,
+# 1983) for all size parameters. Rows are the series index n.
+
+
+def _mie_ab(m, x):
+    nstop = np.round(2+x+4*(x**(1/3)))
+    nmax = int(np.max(nstop))
+    mx = m*x
+    # The downward recurrence starts well above max(nmax, |mx|)+16 used by
+    # PyMieScatt, which does not converge for large, weakly absorbing spheres
+    nmx = int(np.round(max(nmax, np.max(np.abs(mx)))*1.5+16))
+    n = np.arange(1, nmax+1)
+
+    # Riccati-Bessel functions psi_n(x) and chi_n(x) by upward recurrence.
+    # Row k holds order k, terms beyond nstop are discarded by the caller.
+    psi = np.zeros((nmax+1, x.size))
+    chi = np.zeros((nmax+1, x.size))
+    psi[0] = np.sin(x)
+    chi[0] = np.cos(x)
+    psi[1] = psi[0]/x-chi[0]
+    chi[1] = chi[0]/x+psi[0]
+    with np.errstate(over='ignore', invalid='ignore'):
+        for k in range(1, nmax):
+            psi[k+1] = ((2*k+1)/x)*psi[k]-psi[k-1]
+            chi[k+1] = ((2*k+1)/x)*chi[k]-chi[k-1]
+        px = psi[1:]
+        p1x = psi[:-1]
+        gsx = px-1j*chi[1:]
+        gs1x = p1x-1j*chi[:-1]
+
+    # B&H Equation 4.89, downward recurrence of the logarithmic derivative
+    D = np.zeros((nmax, x.size), dtype=complex)
+    Dn = np.zeros(x.size, dtype=complex)
+    for i in range(nmx-1, 1, -1):
+        Dn = (i/mx)-(1/(Dn+i/mx))
+        if i-1 <= nmax:
+            D[i-2] = Dn
+
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        da = D/m+n[:, np.newaxis]/x
+        db = m*D+n[:, np.newaxis]/x
+        an = (da*px-p1x)/(da*gsx-gs1x)
+        bn = (db*px-p1x)/(db*gsx-gs1x)
+    return an, bn, n, nstop
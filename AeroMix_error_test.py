@@ -0,0 +1,79 @@
+"""Sample python program for testing the errors raised by AeroMix for invalid
+inputs."""
+import os
+import copy
+import asyncio
+import tempfile
+import subprocess
+import sys
+import AeroMix
+
+wavelengths = [0.44, 0.55, 0.87]
+input_dict = AeroMix.getAerosolType('urban', wavelengths, 80)
+observations = {'AOD': AeroMix.run(input_dict).array('AOD')[0]}
+
+# Function to check that func raises error_type with the given key
+
+
+def check_error(func, error_type, key):
+    try:
+        func()
+    except error_type as error:
+        assert error.key == key, (error.key, key)
+        return error
+    raise AssertionError(error_type.__name__+' not raised')
+
+#%% Invalid profiles of the retrieved layer
+
+
+for profile_type, profile_params in [(3, [0, 2]), (0, [0, 1])]:
+    var = copy.deepcopy(input_dict)
+    var['Layer1 profile type'] = profile_type
+    var['Layer1 profile params'] = profile_params
+    check_error(lambda: AeroMix.run(var), AeroMix.ProfileError,
+                'Layer1 profile params')
+    check_error(lambda: AeroMix.retrieve(var, observations),
+                AeroMix.ProfileError, 'Layer1 profile params')
+    check_error(lambda: AeroMix.retrieve_batch(var, observations),
+                AeroMix.ProfileError, 'Layer1 profile params')
+print('retrieve rejects invalid profiles')
+
+#%% Errors of the local server keep the key of the input
+
+
+async def serve_input(path, var):
+    async with AeroMix.AeroMixServer(path):
+        async with AeroMix.AeroMixClient(path) as client:
+            return await client.run(var)
+
+var = copy.deepcopy(input_dict)
+var['Layer2 relative humidity'] = 120
+socket_dir = tempfile.mkdtemp()
+socket_path = os.path.join(socket_dir, 'aeromix.sock') if os.name != 'nt' \
+    else None
+check_error(lambda: asyncio.run(serve_input(socket_path, var)),
+            AeroMix.RelativeHumidityError, 'Layer2 relative humidity')
+if socket_path is not None and os.path.exists(socket_path):
+    os.remove(socket_path)
+os.rmdir(socket_dir)
+print('AeroMixServer errors keep their key')
+
+#%% CSV scenarios with other wavelengths than the first one fail on their own
+
+csv_path = os.path.join(tempfile.mkdtemp(), 'scenarios.csv')
+with open(csv_path, 'w') as f:
+    f.write('id,type,rh,wavelengths\n'
+            'a,urban,50,\n'
+            'b,urban,50,"[0.44, 0.55]"\n'
+            'c,desert,30,\n')
+process = subprocess.run([sys.executable, '-m', 'AeroMix', csv_path],
+                         capture_output=True, text=True)
+assert process.returncode == 1, process.stderr
+assert [line.split(',')[0] for line in process.stdout.splitlines()[1:]] \
+    == ['a', 'c'], process.stdout
+assert process.stderr.startswith('Error: scenario b:'), process.stderr
+os.remove(csv_path)
+os.rmdir(os.path.dirname(csv_path))
+print('CSV scenarios fail one at a time')
+
+print('Test completed successfully')
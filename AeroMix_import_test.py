@@ -0,0 +1,39 @@
+"""Sample python program for testing the import time of AeroMix."""
+import subprocess
+import sys
+
+#%% Importing AeroMix and running it in a new interpreter
+
+code = '''
+import sys, time
+start = time.perf_counter()
+import AeroMix
+imported = time.perf_counter()
+AeroMix.run(AeroMix.getAerosolType('urban', [0.55], 80))
+done = time.perf_counter()
+print(imported-start, done-start)
+print(*[name for name in ('scipy', 'PyMieScatt', 'matplotlib')
+        if name in sys.modules])
+'''
+
+# Best of three runs, since the first one may read the files from disk
+times = []
+for i in range(3):
+    lines = subprocess.run([sys.executable, '-c', code], check=True,
+                           capture_output=True, text=True).stdout.splitlines()
+    times.append([float(t) for t in lines[0].split()])
+    loaded = lines[1] if len(lines) > 1 else ''
+import_time, run_time = (min(t) for t in zip(*times))
+print('import AeroMix: %.3f s, import and run: %.3f s' % (import_time,
+                                                          run_time))
+
+#%% Checking the modules loaded and the times
+
+if loaded:
+    raise AssertionError('modules loaded by import and run: '+loaded)
+if import_time > 0.3:
+    raise AssertionError('import AeroMix took %.3f s' % import_time)
+if run_time > 1:
+    raise AssertionError('import and run took %.3f s' % run_time)
+
+print('Test completed successfully')
@@ -0,0 +1,99 @@
+"""Sample python program for testing that the batch paths of AeroMix give the
+same results as AeroMix.run."""
+import os
+import copy
+import asyncio
+import tempfile
+from collections.abc import Mapping
+import numpy as np
+import AeroMix
+
+aerosol_types = ['default', 'urban', 'continental clean',
+                 'continental average', 'continental polluted', 'desert',
+                 'maritime clean', 'maritime polluted', 'maritime tropical',
+                 'antarctic', 'arctic']
+wavelengths = [0.44, 0.55, 0.87]
+layer_outputs = ['Extinction coefficient', 'Scattering coefficient',
+                 'Absorption coefficient', 'SSA', 'g', 'AOD',
+                 'Number concentration', 'Mass concentration',
+                 'Volume concentration']
+rtol = 1e-12
+
+# Function to check that two outputs of run, as mappings or as JSON, are
+# equal to rtol
+
+
+def check_equal(a, b, path=''):
+    if isinstance(a, Mapping):
+        assert list(a) == list(b), path+': different keys'
+        for key in a:
+            check_equal(a[key], b[key], path+'/'+str(key))
+    elif isinstance(a, str):
+        assert a == b, path
+    else:
+        assert np.allclose(float(a), float(b), rtol=rtol, atol=0,
+                           equal_nan=True), path
+
+#%% Input dictionaries of all predefined types at several relative humidities
+
+inputs = []
+for name in aerosol_types:
+    for rh in [0, 50, 73.5, 99]:
+        var = AeroMix.getAerosolType(name, wavelengths, rh)
+        var['Layer2 relative humidity'] = 85
+        inputs.append(var)
+outputs = [AeroMix.run(var) for var in inputs]
+
+#%% run_batch with the concentrations and relative humidities of each input
+
+rng = np.random.default_rng(0)
+var = AeroMix.getAerosolType('urban', wavelengths, 80)
+concentrations = rng.uniform(0, 1e4, (20, 6, 9))
+concentrations[:, :, rng.integers(0, 9, 5)] = 0
+relative_humidity = rng.uniform(0, 99, (20, 6))
+for rh in (None, relative_humidity):
+    batch = AeroMix.run_batch(var, concentrations, rh)
+    for s in range(len(concentrations)):
+        single = copy.deepcopy(var)
+        for k in range(1, 7):
+            single['Layer'+str(k)+' component concentration'] = {
+                i: float(concentrations[s, k-1, i-1]) for i in range(1, 10)}
+            if rh is not None:
+                single['Layer'+str(k)+' relative humidity'] = float(
+                    rh[s, k-1])
+        output = AeroMix.run(single)
+        for key in layer_outputs+['Total column AOD']:
+            assert np.allclose(batch[key][s], output.array(key), rtol=rtol,
+                               atol=0, equal_nan=True), key
+print('run_batch matches run')
+
+#%% run_scenarios of the predefined types, with one invalid input
+
+invalid = copy.deepcopy(inputs[0])
+invalid['Layer1 relative humidity'] = 120
+results = AeroMix.run_scenarios(inputs+[invalid])
+for result, output in zip(results, outputs):
+    check_equal(output, result)
+assert isinstance(results[-1], AeroMix.RelativeHumidityError)
+print('run_scenarios matches run')
+
+#%% AeroMixServer answering the inputs at once
+
+
+async def serve_inputs(path):
+    async with AeroMix.AeroMixServer(path):
+        async with AeroMix.AeroMixClient(path) as client:
+            return await asyncio.gather(*[client.run(var) for var in inputs])
+
+socket_dir = tempfile.mkdtemp()
+socket_path = os.path.join(socket_dir, 'aeromix.sock') if os.name != 'nt' \
+    else None
+results = asyncio.run(serve_inputs(socket_path))
+for result, output in zip(results, outputs):
+    check_equal(output, result)
+if socket_path is not None and os.path.exists(socket_path):
+    os.remove(socket_path)
+os.rmdir(socket_dir)
+print('AeroMixServer matches run')
+
+print('Test completed successfully')
@@ -0,0 +1,53 @@
+"""Sample python program for testing the adaptive quadrature of AeroMix."""
+import os
+import shutil
+import tempfile
+import numpy as np
+import AeroMix
+
+quad_tol = 1e-3
+
+# Function to read the ext, sca, abs, SSA and g columns of a component file
+
+
+def read_component(filename):
+    with open(filename) as f:
+        rows = [line.split(',') for line in f if not line.startswith('#')]
+    return np.array(rows[1:], dtype=float)[:, 1:6]
+
+#%% Copying aerosol data to a temporary directory
+
+
+temp_dir = tempfile.mkdtemp()
+AeroMix.CopyAerosolData(temp_dir+'/')
+data_dir = temp_dir+'/aerosol_components_AeroMix'
+
+#%% Creating the sample external and core-shell aerosols with both rules
+
+for quadrature in ('trapezoid', 'adaptive'):
+    ext_input = AeroMix.getSampleInputDict_ext()
+    ext_input['Output directory'] = data_dir
+    ext_input['Output filename'] = 'ext_'+quadrature
+    ext_input['RH'] = 0
+    AeroMix.ext_aerosol(ext_input, quadrature=quadrature, quad_tol=quad_tol)
+
+    cs_input = AeroMix.getSampleInputDict_cs()
+    cs_input['Component file directory'] = data_dir
+    cs_input['Output directory'] = data_dir
+    cs_input['Output filename'] = 'cs_'+quadrature
+    cs_input['RH'] = 0
+    AeroMix.cs_aerosol(cs_input, quadrature=quadrature, quad_tol=quad_tol)
+
+#%% Comparing the coefficients, SSA and g with the trapezoid rule
+
+for name in ('ext', 'cs'):
+    trapezoid = read_component(data_dir+'/'+name+'_trapezoid_00')
+    adaptive = read_component(data_dir+'/'+name+'_adaptive_00')
+    error = np.abs(adaptive-trapezoid)/np.abs(trapezoid)
+    print(name+': largest relative difference of ext, sca, abs, SSA, g:',
+          ', '.join('%.1e' % e for e in error.max(axis=0)))
+    assert np.all(error <= quad_tol), name+' differs by more than quad_tol'
+
+shutil.rmtree(temp_dir)
+
+print('Test completed successfully')
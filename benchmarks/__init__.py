@@ -0,0 +1,15 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+
+Benchmarks of AeroMix. The modules bench_*.py hold classes in the format of
+airspeed velocity (asv): methods starting with time_ are timed for every
+combination of the class attribute params, after setup and before teardown
+are called with the same parameters. They are run offline from the
+repository directory with
+
+    python -m benchmarks                 compare with benchmarks/baseline.json
+    python -m benchmarks --save          store the results as the baseline
+    python -m benchmarks -b TimeRun      run the benchmarks matching a regex
+"""
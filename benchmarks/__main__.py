@@ -0,0 +1,260 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+
+Runner of the AeroMix benchmarks (see benchmarks/__init__.py). Each
+benchmark is timed as the best of several repeats, each of which calls it
+enough times to last at least --sample-time seconds, unless the class sets
+the asv attributes number or repeat. Results are compared with a stored
+baseline and times above threshold x baseline are reported as regressions.
+"""
+
+import sys
+import os
+import re
+import json
+import time
+import inspect
+import argparse
+import datetime
+import importlib
+import itertools
+import platform
+import numpy as np
+
+benchmark_dir = os.path.dirname(os.path.abspath(__file__))
+baseline_file = os.path.join(benchmark_dir, 'baseline.json')
+
+# Function to find the benchmark classes of the bench_*.py modules
+
+
+def _benchmarkclasses():
+    classes = []
+    for filename in sorted(os.listdir(benchmark_dir)):
+        if filename.startswith('bench_') and filename.endswith('.py'):
+            module = importlib.import_module('benchmarks.'+filename[:-3])
+            for name, cls in inspect.getmembers(module, inspect.isclass):
+                if cls.__module__ == module.__name__:
+                    classes.append((filename[:-3]+'.'+name, cls))
+    return classes
+
+# Function to return the parameter combinations of a benchmark class. A
+# single list of params is one parameter, as in asv.
+
+
+def _paramsets(cls):
+    params = getattr(cls, 'params', None)
+    if params is None:
+        return [()]
+    if not params or not isinstance(params[0], list):
+        params = [params]
+    return list(itertools.product(*params))
+
+# Function to return the name of one benchmark with its parameters
+
+
+def _benchmarkname(name, method, paramset):
+    if not paramset:
+        return name+'.'+method
+    return name+'.'+method+'('+', '.join(repr(p) for p in paramset)+')'
+
+# Function to return the best time (s) of one call of func. The number of
+# calls per repeat is doubled until a repeat lasts sample_time.
+
+
+def _timeit(func, number, repeat, sample_time):
+    if number is None:
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for i in range(number):
+                func()
+            elapsed = time.perf_counter()-start
+            if elapsed >= sample_time or number >= 1 << 20:
+                break
+            number = number*2 if elapsed > 0 else number*16
+        times = [elapsed/number]
+    else:
+        times = []
+    for r in range(repeat-len(times)):
+        start = time.perf_counter()
+        for i in range(number):
+            func()
+        times.append((time.perf_counter()-start)/number)
+    return min(times)
+
+
+def run_benchmarks(pattern=None, sample_time=0.05, repeat=5, out=sys.stdout):
+    """
+    Run the benchmarks.
+
+    Parameters
+    ----------
+    pattern : Optional regular expression. Only the benchmarks whose name,
+        e.g. "bench_run.TimeRun.time_run('urban', 5, 9)", contains a match
+        are run. The default is None, which runs all benchmarks.
+    sample_time : Minimum duration (s) of one repeat. The default is 0.05.
+    repeat : Number of repeats of a benchmark without the class attribute
+        repeat. The default is 5.
+    out : File to which the times are written as they are measured. The
+        default is sys.stdout.
+
+    Returns
+    -------
+    Dictionary of the best time (s) of one call of each benchmark.
+
+    """
+    results = {}
+    for name, cls in _benchmarkclasses():
+        methods = [m for m in sorted(vars(cls)) if m.startswith('time_')]
+        for paramset in _paramsets(cls):
+            names = {m: _benchmarkname(name, m, paramset) for m in methods}
+            names = {m: n for m, n in names.items()
+                     if pattern is None or re.search(pattern, n)}
+            if not names:
+                continue
+            benchmark = cls()
+            if hasattr(benchmark, 'setup'):
+                benchmark.setup(*paramset)
+            try:
+                for method, full_name in names.items():
+                    func = getattr(benchmark, method)
+                    results[full_name] = _timeit(
+                        lambda: func(*paramset), getattr(cls, 'number', None),
+                        getattr(cls, 'repeat', repeat), sample_time)
+                    print('%-72s %10.3f ms' % (full_name,
+                                               1e3*results[full_name]),
+                          file=out, flush=True)
+            finally:
+                if hasattr(benchmark, 'teardown'):
+                    benchmark.teardown(*paramset)
+    return results
+
+
+def machine_info():
+    """Description of the machine and versions the benchmarks ran on."""
+    import scipy
+    import PyMieScatt
+    return {'machine': platform.node(), 'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpu count': os.cpu_count(),
+            'python': platform.python_version(), 'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'PyMieScatt': PyMieScatt.__version__}
+
+
+def compare(results, baseline, threshold=1.25):
+    """
+    Compare benchmark times with a baseline.
+
+    Parameters
+    ----------
+    results : Dictionary of times (s) as returned by run_benchmarks.
+    baseline : Dictionary of the baseline times (s).
+    threshold : Ratio of the time to the baseline time above which a
+        benchmark is a regression and below whose inverse it is an
+        improvement. The default is 1.25.
+
+    Returns
+    -------
+    Lists of (name, baseline time, time, ratio) of the regressions and of
+    the improvements, and the list of names without baseline.
+
+    """
+    regressions = []
+    improvements = []
+    missing = []
+    for name, value in results.items():
+        if name not in baseline:
+            missing.append(name)
+            continue
+        ratio = value/baseline[name]
+        if ratio > threshold:
+            regressions.append((name, baseline[name], value, ratio))
+        elif ratio < 1/threshold:
+            improvements.append((name, baseline[name], value, ratio))
+    return regressions, improvements, missing
+
+
+def main(argv=None):
+    """
+    Run the benchmarks and compare them with the baseline.
+
+    Parameters
+    ----------
+    argv : List of command line arguments. The default is sys.argv[1:].
+
+    Returns
+    -------
+    Exit status, 1 if any benchmark regressed and 0 otherwise.
+
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Run the AeroMix benchmarks and report the times above '
+        'the threshold times the baseline.')
+    parser.add_argument('-b', '--bench', metavar='REGEX',
+                        help='run only the benchmarks matching REGEX')
+    parser.add_argument('--baseline', default=baseline_file,
+                        help='baseline file (default: '
+                        'benchmarks/baseline.json)')
+    parser.add_argument('--save', action='store_true',
+                        help='store the times in the baseline file, keeping '
+                        'the baseline of benchmarks not run')
+    parser.add_argument('-o', '--output',
+                        help='also write the times to this JSON file')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='ratio to the baseline reported as regression '
+                        '(default: 1.25)')
+    parser.add_argument('--sample-time', type=float, default=0.05,
+                        help='minimum duration (s) of one repeat '
+                        '(default: 0.05)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='repeats of each benchmark (default: 5)')
+    args = parser.parse_args(argv)
+    if args.threshold <= 1:
+        parser.error('--threshold should be greater than 1')
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    results = run_benchmarks(args.bench, args.sample_time, args.repeat)
+    record = {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+              'machine': machine_info(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(record, f, indent=1)
+
+    status = 0
+    if baseline is not None:
+        if baseline['machine'] != record['machine']:
+            print('\nThe baseline was measured on another machine or with '
+                  'other versions:', json.dumps(baseline['machine']))
+        regressions, improvements, missing = compare(
+            results, baseline['results'], args.threshold)
+        for title, rows in (('Regressions', regressions),
+                            ('Improvements', improvements)):
+            if rows:
+                print('\n'+title+' (ratio to the baseline of '+baseline[
+                    'date']+'):')
+                for name, old, new, ratio in rows:
+                    print('%-72s %10.3f ms -> %10.3f ms  x%.2f' % (
+                        name, 1e3*old, 1e3*new, ratio))
+        if missing:
+            print('\nNo baseline for '+str(len(missing))+' benchmarks')
+        print('\n'+str(len(regressions))+' regressions beyond x' +
+              str(args.threshold))
+        status = 1 if regressions else 0
+    if args.save:
+        if baseline is not None:
+            record['results'] = {**baseline['results'], **results}
+        with open(args.baseline, 'w') as f:
+            json.dump(record, f, indent=1)
+        print('Baseline saved to '+args.baseline)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
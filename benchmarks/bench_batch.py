@@ -0,0 +1,74 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+
+Benchmarks of the batch and gridded paths: run_batch, run_scenarios and
+run_grid.
+"""
+
+import copy
+import numpy as np
+import AeroMix
+from benchmarks.common import input_dict, presets
+from AeroMix.AeroMix_main import n_layers
+
+
+class TimeRunBatch:
+    """run_batch() of many mixtures with random relative humidities."""
+
+    params = [[100, 10000], [9, 50]]
+    param_names = ['scenarios', 'components']
+
+    def setup(self, scenarios, components):
+        self.input_dict = input_dict('urban', 5, components)
+        rng = np.random.default_rng(1)
+        self.concentrations = rng.uniform(0, 1e3, (scenarios, n_layers,
+                                                   components))
+        self.relative_humidity = rng.uniform(0, 99, (scenarios, n_layers))
+        self.time_run_batch(scenarios, components)
+
+    def time_run_batch(self, scenarios, components):
+        AeroMix.run_batch(self.input_dict, self.concentrations,
+                          self.relative_humidity)
+
+
+class TimeRunScenarios:
+    """run_scenarios() of input dictionaries of all predefined types, one
+    in a hundred with an invalid relative humidity."""
+
+    params = [1000]
+    param_names = ['scenarios']
+
+    def setup(self, scenarios):
+        rng = np.random.default_rng(1)
+        self.inputs = []
+        for s in range(scenarios):
+            var = copy.deepcopy(input_dict(presets[s % len(presets)], 5, 9))
+            var['Layer1 relative humidity'] = float(rng.uniform(0, 99))
+            if s % 100 == 99:
+                var['Layer2 relative humidity'] = 120
+            self.inputs.append(var)
+        AeroMix.run_scenarios(self.inputs[:len(presets)])
+
+    def time_run_scenarios(self, scenarios):
+        AeroMix.run_scenarios(self.inputs)
+
+
+class TimeRunGrid:
+    """run_grid() of a lat x lon x level field in memory."""
+
+    params = [[(30, 30, 20), (100, 100, 20)]]
+    param_names = ['grid']
+
+    def setup(self, grid):
+        self.input_dict = input_dict('urban', 5, 9)
+        rng = np.random.default_rng(1)
+        self.concentrations = rng.uniform(0, 1e3, grid+(9,))
+        self.relative_humidity = rng.uniform(0, 99, grid)
+        AeroMix.run_grid(self.input_dict, self.concentrations[:1],
+                         self.relative_humidity[:1], thickness=0.5)
+
+    def time_run_grid(self, grid):
+        AeroMix.run_grid(self.input_dict, self.concentrations,
+                         self.relative_humidity, thickness=0.5)
@@ -0,0 +1,75 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+
+Benchmarks of reading the component data: parsing the component files,
+the optical array of a relative humidity and the mean particle volume and
+mass of _CalculateMass.
+"""
+
+import os
+from benchmarks.common import (wavelength_sets, component_counts,
+                               input_dict, component_directory, clear_caches)
+from AeroMix.AeroMix_main import _CalculateMass
+from AeroMix.ComponentDatabase import _ParseComponentFile
+from AeroMix.HumidityTensor import _opticalarray, HumidityTensor
+
+
+class TimeParseComponentFile:
+    """Parsing of one text component file."""
+
+    params = ['IS00', 'SSam80', 'SUSO99', 'custom1_00']
+    param_names = ['file']
+
+    def setup(self, name):
+        self.path = os.path.join(component_directory(), name)
+
+    def time_parse(self, name):
+        _ParseComponentFile(self.path)
+
+
+class TimeCalculateMass:
+    """Mean particle volume and mass of all components at one RH level."""
+
+    params = [component_counts, [0, 80], [False, True]]
+    param_names = ['components', 'RH', 'cached']
+
+    def setup(self, components, RH, cached):
+        self.input_dict = input_dict('urban', 5, components)
+        _CalculateMass(self.input_dict, RH)
+
+    def time_calculate_mass(self, components, RH, cached):
+        if not cached:
+            clear_caches()
+        _CalculateMass(self.input_dict, RH)
+
+
+class TimeOpticalArray:
+    """Optical data of all components at one RH level."""
+
+    params = [list(wavelength_sets), component_counts, [False, True]]
+    param_names = ['wavelengths', 'components', 'cached']
+
+    def setup(self, wavelengths, components, cached):
+        self.input_dict = input_dict('urban', wavelengths, components)
+        _opticalarray(self.input_dict, 80)
+
+    def time_optical_array(self, wavelengths, components, cached):
+        if not cached:
+            clear_caches()
+        _opticalarray(self.input_dict, 80)
+
+
+class TimeHumidityTensor:
+    """Reading all RH levels and interpolating to one relative humidity."""
+
+    params = [list(wavelength_sets), component_counts]
+    param_names = ['wavelengths', 'components']
+
+    def setup(self, wavelengths, components):
+        self.input_dict = input_dict('urban', wavelengths, components)
+
+    def time_humidity_tensor(self, wavelengths, components):
+        clear_caches()
+        HumidityTensor(self.input_dict).interpolate(63.5)
@@ -0,0 +1,87 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+
+Benchmarks of creating aerosol components with ext_aerosol and cs_aerosol.
+The radius range of a core-shell component is that of its shell component.
+"""
+
+import os
+import shutil
+import tempfile
+import AeroMix
+from benchmarks.common import quiet
+
+
+class TimeExtAerosol:
+    """ext_aerosol at 61 wavelengths for several radius ranges (µm)."""
+
+    params = [['0.005-1', '0.005-20', '0.1-20'], ['trapezoid', 'adaptive']]
+    param_names = ['radius', 'quadrature']
+
+    def setup(self, radius, quadrature):
+        self.directory = tempfile.mkdtemp(prefix='AeroMix_benchmarks_')
+        self.input_dict = AeroMix.getSampleInputDict_ext()
+        self.input_dict['Output directory'] = self.directory
+        rmin, rmax = radius.split('-')
+        self.input_dict['Minimum radius'] = float(rmin)
+        self.input_dict['Maximum radius'] = float(rmax)
+
+    def teardown(self, radius, quadrature):
+        shutil.rmtree(self.directory, True)
+
+    def time_ext_aerosol(self, radius, quadrature):
+        with quiet():
+            AeroMix.ext_aerosol(self.input_dict, quadrature=quadrature)
+
+
+class TimeCsAerosol:
+    """cs_aerosol of black carbon coated with sea salt, one PyMieScatt call
+    per radius and wavelength."""
+
+    number = 1
+    repeat = 1
+    timeout = 300
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp(prefix='AeroMix_benchmarks_')
+        self.input_dict = AeroMix.getSampleInputDict_cs()
+        self.input_dict['Output directory'] = self.directory
+        self.input_dict['Core'] = 'BC'
+        self.input_dict['Shell'] = 'SSam'
+        self.input_dict['RH'] = 0
+
+    def teardown(self):
+        shutil.rmtree(self.directory, True)
+
+    def time_cs_aerosol(self):
+        with quiet():
+            AeroMix.cs_aerosol(self.input_dict)
+
+
+class TimeCsAerosolMieCache:
+    """cs_aerosol with the efficiencies in a warm MieCache, for shells of
+    radius 0.005-20 µm (SSam) and 0.005-60 µm (SScm)."""
+
+    params = ['SSam', 'SScm']
+    param_names = ['shell']
+    timeout = 300
+
+    def setup(self, shell):
+        self.directory = tempfile.mkdtemp(prefix='AeroMix_benchmarks_')
+        self.input_dict = AeroMix.getSampleInputDict_cs()
+        self.input_dict['Output directory'] = self.directory
+        self.input_dict['Core'] = 'BC'
+        self.input_dict['Shell'] = shell
+        self.input_dict['RH'] = 0
+        self.mie_cache = AeroMix.MieCache(os.path.join(self.directory,
+                                                       'mie.sqlite'))
+        self.time_cs_aerosol(shell)
+
+    def teardown(self, shell):
+        shutil.rmtree(self.directory, True)
+
+    def time_cs_aerosol(self, shell):
+        with quiet():
+            AeroMix.cs_aerosol(self.input_dict, mie_cache=self.mie_cache)
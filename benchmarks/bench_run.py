@@ -0,0 +1,66 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+
+Benchmarks of AeroMix.run and AeroMix.run_layers.
+"""
+
+import numpy as np
+import AeroMix
+from benchmarks.common import (presets, wavelength_sets, component_counts,
+                               input_dict, clear_caches)
+from AeroMix.AeroMix_main import n_layers
+
+
+class TimeRun:
+    """run() with the component data already read by an earlier run."""
+
+    params = [presets, list(wavelength_sets), component_counts]
+    param_names = ['preset', 'wavelengths', 'components']
+
+    def setup(self, preset, wavelengths, components):
+        self.input_dict = input_dict(preset, wavelengths, components)
+        AeroMix.run(self.input_dict)
+
+    def time_run(self, preset, wavelengths, components):
+        AeroMix.run(self.input_dict)
+
+    def time_run_to_dict(self, preset, wavelengths, components):
+        AeroMix.run(self.input_dict).to_dict()
+
+
+class TimeRunCold:
+    """run() reading and interpolating the component files every time."""
+
+    params = [presets, list(wavelength_sets), component_counts]
+    param_names = ['preset', 'wavelengths', 'components']
+
+    def setup(self, preset, wavelengths, components):
+        self.input_dict = input_dict(preset, wavelengths, components)
+
+    def time_run(self, preset, wavelengths, components):
+        clear_caches()
+        AeroMix.run(self.input_dict)
+
+
+class TimeRunLayers:
+    """run_layers() at relative humidities between the RH levels."""
+
+    params = [list(wavelength_sets), component_counts]
+    param_names = ['wavelengths', 'components']
+
+    def setup(self, wavelengths, components):
+        self.input_dict = input_dict('urban', wavelengths, components)
+        rng = np.random.default_rng(1)
+        self.concentrations = rng.uniform(0, 1e3, (n_layers, components))
+        self.relative_humidity = [63.5, 81.2, 50, 0, 0, 0]
+        self.profile_type = [0, 1, 0, 1, 1, 1]
+        self.profile_params = [[0, 2, 8], [2, 2], [2, 12, 8], [12, 35],
+                               [35, 35], [35, 35]]
+        self.time_run_layers(wavelengths, components)
+
+    def time_run_layers(self, wavelengths, components):
+        AeroMix.run_layers(self.input_dict, self.concentrations,
+                           self.relative_humidity, self.profile_type,
+                           self.profile_params)
@@ -0,0 +1,112 @@
+"""
+AeroMix v 1.0.1 | Python package for modeling aerosol optical properties.
+
+Copyright © 2023  Sam P Raj and P R Sinha
+
+Inputs shared by the benchmarks. Everything is created from the component
+data of the package in a temporary directory, so that the benchmarks run
+offline.
+"""
+
+import atexit
+import contextlib
+import functools
+import io
+import os
+import shutil
+import tempfile
+import AeroMix
+from AeroMix.AeroMix_main import _meanvolmass, n_layers
+from AeroMix.ComponentDatabase import component_db
+from AeroMix.HumidityTensor import _cachedtensor
+
+# Predefined aerosol types of getAerosolType
+presets = ['default', 'urban', 'continental clean', 'continental average',
+           'continental polluted', 'desert', 'maritime clean',
+           'maritime polluted', 'maritime tropical', 'antarctic', 'arctic']
+# Wavelengths (µm) of the component files
+file_wavelengths = [
+    0.25, 0.3, 0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.9,
+    1.0, 1.25, 1.5, 1.75, 2.0, 2.5, 3.0, 3.2, 3.39, 3.5, 3.75, 4.0, 4.5, 5.0,
+    5.5, 6.0, 6.2, 6.5, 7.2, 7.9, 8.2, 8.5, 8.7, 9.0, 9.2, 9.5, 9.8, 10.0,
+    10.6, 11.0, 11.5, 12.5, 13.0, 14.0, 14.8, 15.0, 16.4, 17.2, 18.0, 18.5,
+    20.0, 21.3, 22.5, 25.0, 27.9, 30.0, 35.0, 40.0]
+# Wavelengths of the benchmarks by their number
+wavelength_sets = {5: [0.4, 0.5, 0.55, 0.7, 1.0], 61: file_wavelengths}
+# Number of components: the nine default ones, or 41 custom components more
+component_counts = [9, 50]
+# RH levels of the component file names
+file_rh = ['00', '50', '70', '80', '90', '95', '98', '99']
+
+
+@functools.lru_cache(maxsize=None)
+def component_directory():
+    """
+    Copy of the default components with 41 custom components (10 to 50),
+    created with ext_aerosol once per process and removed at exit.
+
+    Returns
+    -------
+    Path to the component file directory.
+
+    """
+    root = tempfile.mkdtemp(prefix='AeroMix_benchmarks_')
+    atexit.register(shutil.rmtree, root, True)
+    AeroMix.CopyAerosolData(root+os.sep)
+    directory = os.path.join(root, 'aerosol_components_AeroMix')
+    ext_input = AeroMix.getSampleInputDict_ext()
+    ext_input['Output directory'] = directory
+    ext_input['Output filename'] = 'custom1'
+    with contextlib.redirect_stdout(io.StringIO()):
+        AeroMix.ext_aerosol(ext_input)
+    source = os.path.join(directory, 'custom1_00')
+    for k in range(1, 42):
+        for rh in file_rh:
+            target = os.path.join(directory, 'custom'+str(k)+'_'+rh)
+            if target != source:
+                shutil.copyfile(source, target)
+    return directory
+
+
+def input_dict(preset, wavelengths, components, mixed_layer_rh=80):
+    """
+    Input dictionary of a predefined aerosol type.
+
+    Parameters
+    ----------
+    preset : Name of the aerosol type (see presets).
+    wavelengths : Number of wavelengths (see wavelength_sets).
+    components : Maximum number of components. Components 10 and higher are
+        custom components of component_directory with one thousandth of the
+        total concentration of the layer each.
+    mixed_layer_rh : Relative humidity (%) of layer 1. The default is 80.
+
+    Returns
+    -------
+    The input dictionary.
+
+    """
+    var = AeroMix.getAerosolType(preset, wavelength_sets[wavelengths],
+                                 mixed_layer_rh, components)
+    if components > 9:
+        var['Component file directory'] = component_directory()
+        for k in range(1, n_layers+1):
+            conc = var['Layer'+str(k)+' component concentration']
+            total = sum(conc.values())
+            for i in range(10, components+1):
+                conc[i] = total*1e-3
+    return var
+
+
+def clear_caches():
+    """Drop the parsed component files and the memoized component data."""
+    component_db.clear()
+    _cachedtensor.cache_clear()
+    _meanvolmass.cache_clear()
+
+
+@contextlib.contextmanager
+def quiet():
+    """Discard the messages printed by ext_aerosol and cs_aerosol."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
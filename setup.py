@@ -26,4 +26,5 @@ setup(
       keywords=['aerosol model mixing state AOD SSA g'],
       install_requires=['numpy', 'scipy', 'PyMieScatt'],
       package_data={'AeroMix': ['aerosol_components/*']},
+      entry_points={'console_scripts': ['aeromix=AeroMix.__main__:main']},
       zip_safe=False)